@@ -0,0 +1,235 @@
+"""
+Buffered activity log writer.
+
+ActivityLog.log_action appends to an in-memory buffer and returns at once; a
+background thread writes the buffer out with one insert_many whenever it
+holds ACTIVITY_FLUSH_SIZE entries or ACTIVITY_FLUSH_INTERVAL_MS has passed,
+whichever comes first. What's still buffered is flushed at exit.
+
+The buffer holds at most ACTIVITY_BUFFER_SIZE entries. When it is full,
+ACTIVITY_FULL_POLICY decides:
+
+- "drop" (default): it behaves as a ring buffer, the oldest entry is
+  overwritten and the request never waits;
+- "block": the request waits up to ACTIVITY_BLOCK_TIMEOUT_MS for a flush to
+  make room, and the new entry is dropped if none does.
+
+Dropped entries are counted in stats(). A batch whose write raises (e.g. a
+network error) is retried once before its entries are counted as failed.
+Entries logged after the writer is closed are written at once, unbuffered.
+
+With ACTIVITY_SINK=cassandra the entries go to the Cassandra account_activity
+table (through Cassandra.ingest) instead of the activity_logs collection,
+which then only holds what was logged before the switch.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from decouple import config
+from pymongo.errors import BulkWriteError
+
+from mongo import get_db
+
+logger = logging.getLogger("activity")
+
+ACTIVITY_SINK = config("ACTIVITY_SINK", default="mongo")
+ACTIVITY_BUFFER_SIZE = config("ACTIVITY_BUFFER_SIZE", default=10000, cast=int)
+ACTIVITY_FLUSH_SIZE = config("ACTIVITY_FLUSH_SIZE", default=500, cast=int)
+ACTIVITY_FLUSH_INTERVAL_MS = config("ACTIVITY_FLUSH_INTERVAL_MS", default=1000, cast=int)
+ACTIVITY_FULL_POLICY = config("ACTIVITY_FULL_POLICY", default="drop")
+ACTIVITY_BLOCK_TIMEOUT_MS = config("ACTIVITY_BLOCK_TIMEOUT_MS", default=100, cast=int)
+ACTIVITY_RETRY_DELAY_MS = config("ACTIVITY_RETRY_DELAY_MS", default=500, cast=int)
+ACTIVITY_CLOSE_SECONDS = config("ACTIVITY_CLOSE_SECONDS", default=5, cast=int)
+
+FULL_POLICIES = ("drop", "block")
+
+
+class MongoActivitySink:
+    def write(self, entries):
+        """Insert entries into activity_logs. Returns the number written."""
+        try:
+            result = get_db()["activity_logs"].insert_many(entries, ordered=False)
+        except BulkWriteError as e:
+            logger.error(f"Failed to write activity log entries: {str(e)}")
+            return e.details.get("nInserted", 0)
+        return len(result.inserted_ids)
+
+
+class CassandraActivitySink:
+    """Writes entries as "account" events, i.e. account_activity rows keyed by username."""
+
+    def write(self, entries):
+        # The Cassandra driver is only needed when this sink is configured
+        from Cassandra.ingest import ingest_events
+
+        user_ids = list({entry["user_id"] for entry in entries})
+        users = {
+            user["_id"]: user
+            for user in get_db()["users"].find({"_id": {"$in": user_ids}}, {"username": 1, "email": 1})
+        }
+        events = []
+        for entry in entries:
+            user = users.get(entry["user_id"], {})
+            events.append({
+                "type": "account",
+                # Users without a username still get a partition of their own
+                "username": user.get("username") or str(entry["user_id"]),
+                "email": user.get("email"),
+                "action_time": entry["timestamp"],
+                "action_type": entry["action"],
+                "device": (entry.get("metadata") or {}).get("device"),
+            })
+        summary = ingest_events(events)
+        for error in summary["rejected"] + summary["failed"]:
+            logger.error(f"Failed to write activity to Cassandra: {error['error']}")
+        return summary["accepted"]
+
+
+SINKS = {
+    "mongo": MongoActivitySink,
+    "cassandra": CassandraActivitySink,
+}
+
+
+class ActivityWriter:
+    def __init__(self, sink, buffer_size=ACTIVITY_BUFFER_SIZE, flush_size=ACTIVITY_FLUSH_SIZE,
+                 flush_interval=ACTIVITY_FLUSH_INTERVAL_MS / 1000, full_policy=ACTIVITY_FULL_POLICY,
+                 block_timeout=ACTIVITY_BLOCK_TIMEOUT_MS / 1000, retry_delay=ACTIVITY_RETRY_DELAY_MS / 1000):
+        if full_policy not in FULL_POLICIES:
+            raise ValueError(f"Unknown ACTIVITY_FULL_POLICY {full_policy!r}, expected one of {FULL_POLICIES}")
+        self.sink = sink
+        self.buffer = deque()
+        self.buffer_size = buffer_size
+        self.flush_size = min(flush_size, buffer_size)
+        self.flush_interval = flush_interval
+        self.full_policy = full_policy
+        self.block_timeout = block_timeout
+        self.retry_delay = retry_delay
+        self.condition = threading.Condition()
+        # Held while writing, so close() can't flush concurrently with the thread
+        self.flush_lock = threading.Lock()
+        self.thread = None
+        self.closed = False
+        self.pid = os.getpid()
+        self.counts = {"written": 0, "dropped": 0, "failed": 0}
+
+    def start(self):
+        with self.condition:
+            if self.thread is None and not self.closed:
+                self.thread = threading.Thread(target=self._run, name="activity-writer", daemon=True)
+                self.thread.start()
+
+    def write(self, entry):
+        """Buffer an entry. Returns False if it was dropped."""
+        self.start()
+        with self.condition:
+            buffered = None if self.closed else self._append(entry)
+        if buffered is None:
+            # Closed: nothing flushes the buffer any more (e.g. logged by another atexit hook)
+            return self._write([entry]) == 1
+        return buffered
+
+    def _append(self, entry):
+        """Buffer an entry, with the condition held. Returns None if the writer was closed meanwhile."""
+        if len(self.buffer) >= self.buffer_size:
+            if self.full_policy == "drop":
+                self.buffer.popleft()
+                self.counts["dropped"] += 1
+            elif not self.condition.wait_for(lambda: len(self.buffer) < self.buffer_size or self.closed,
+                                             self.block_timeout):
+                self.counts["dropped"] += 1
+                return False
+            if self.closed:
+                return None
+        self.buffer.append(entry)
+        if len(self.buffer) >= self.flush_size:
+            self.condition.notify_all()
+        return True
+
+    def _take(self):
+        with self.condition:
+            batch = [self.buffer.popleft() for _ in range(min(self.flush_size, len(self.buffer)))]
+            # Writers blocked on a full buffer
+            self.condition.notify_all()
+        return batch
+
+    def flush(self):
+        """Write out everything buffered so far, flush_size entries per insert."""
+        with self.flush_lock:
+            while True:
+                batch = self._take()
+                if not batch:
+                    return
+                self._write(batch)
+
+    def _write(self, batch):
+        """Write a batch through the sink, retrying once if it raises. Returns the number written."""
+        written = 0
+        for attempt in range(2):
+            try:
+                written = self.sink.write(batch)
+                break
+            except Exception as e:
+                logger.error(f"Failed to write {len(batch)} activity log entries"
+                             f"{', retrying' if attempt == 0 else ''}: {str(e)}")
+                if attempt == 0:
+                    time.sleep(self.retry_delay)
+        with self.condition:
+            self.counts["written"] += written
+            self.counts["failed"] += len(batch) - written
+        return written
+
+    def _run(self):
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            with self.condition:
+                self.condition.wait_for(
+                    lambda: self.closed or len(self.buffer) >= self.flush_size,
+                    max(deadline - time.monotonic(), 0),
+                )
+                closed = self.closed
+            self.flush()
+            deadline = time.monotonic() + self.flush_interval
+            if closed:
+                return
+
+    def close(self, timeout=ACTIVITY_CLOSE_SECONDS):
+        """Flush what is buffered and stop the writer thread."""
+        if self.pid != os.getpid():
+            return
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout)
+        if self.thread is None or not self.thread.is_alive():
+            self.flush()
+        pending = len(self.buffer)
+        if pending:
+            logger.warning(f"Activity writer closed with {pending} entries unwritten")
+
+    def stats(self):
+        with self.condition:
+            return {**self.counts, "buffered": len(self.buffer)}
+
+
+_lock = threading.Lock()
+_pid = None
+_writer = None
+
+
+def get_activity_writer():
+    """This process's activity writer; gunicorn workers each get their own after the fork."""
+    global _pid, _writer
+    with _lock:
+        if _writer is None or _pid != os.getpid():
+            if ACTIVITY_SINK not in SINKS:
+                raise ValueError(f"Unknown ACTIVITY_SINK {ACTIVITY_SINK!r}, expected one of {list(SINKS)}")
+            _writer = ActivityWriter(SINKS[ACTIVITY_SINK]())
+            _pid = os.getpid()
+            atexit.register(_writer.close)
+        return _writer
@@ -1,21 +1,41 @@
+import os
+import sys
+from bson.objectid import ObjectId
 from flask import Flask, jsonify
-from pymongo import MongoClient
+from flask.json.provider import DefaultJSONProvider
 from pymongo.errors import ConnectionFailure
-from decouple import config
 from routes import routes
 from logging_config import logger
 from config import DevelopmentConfig
+from mongo import MONGO_URI, get_db
+from indexes import ensure_indexes_in_background
+
+# The Cassandra package lives next to API/ at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Cassandra.routes import events_routes
+
+class MongoJSONProvider(DefaultJSONProvider):
+    """Serializes ObjectIds in responses (documents, ids in cursors) as strings."""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, ObjectId):
+            return str(o)
+        return DefaultJSONProvider.default(o)
+
 
 app = Flask(__name__)
+app.json = MongoJSONProvider(app)
 
 app.config.from_object(DevelopmentConfig)
 
 try:
-    mongo_uri = config("MONGO_URI", default="mongodb://localhost:27017/app_database")
-    app.config["MONGO_URI"] = mongo_uri
-    client = MongoClient(mongo_uri)
-    db = client.get_database()
-    logger.info("Connected to Mongo")
+    app.config["MONGO_URI"] = MONGO_URI
+    # Shared with the models; the client connects lazily on first use
+    db = get_db()
+    logger.info("Mongo client configured")
+    # Missing indexes are built while the app already serves requests
+    ensure_indexes_in_background(db)
 except ConnectionFailure as e:
     logger.error(f"MongoDB connection failed: {e}")
     db = None
@@ -24,6 +44,7 @@ except Exception as e:
     db = None
 
 app.register_blueprint(routes)
+app.register_blueprint(events_routes)
 
 @app.errorhandler(404)
 def not_found(error):
@@ -37,7 +58,7 @@ def server_error(error):
 def health_check():
     try:
         if db is not None:
-            db.list_collection_names()  
+            db.command("ping")
             return jsonify({"success": True, "message": "API is running and connected to Mongo!"}), 200
         else:
             return jsonify({"success": False, "message": "API is running but MongoDB connection failed."}), 500
@@ -0,0 +1,189 @@
+"""
+Asynchronous notification fan-out.
+
+Routes publish events (a follow, a new post) to a bounded in-process queue
+and return; worker threads turn each event into notifications for its
+recipients and write them with insert_many, FANOUT_BATCH_SIZE at a time.
+A post by a user with a million followers therefore costs its request one
+queue put, not a million inserts.
+
+When the queue is full, publish() blocks the request for up to
+FANOUT_PUBLISH_TIMEOUT_MS for the workers to catch up (backpressure), then
+drops the event: notifications are best effort and the write they describe
+has already succeeded. Dropped events are counted in stats(). Queued events
+live only in memory, so at exit the workers get FANOUT_DRAIN_SECONDS to
+finish them.
+
+    from fanout import publish
+    publish("content", user_id=user_id, content_id=content_id)
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from itertools import islice
+
+from bson.objectid import ObjectId
+from decouple import config
+
+from model import Connection, Notification, User
+
+logger = logging.getLogger("fanout")
+
+FANOUT_QUEUE_SIZE = config("FANOUT_QUEUE_SIZE", default=10000, cast=int)
+FANOUT_WORKERS = config("FANOUT_WORKERS", default=2, cast=int)
+FANOUT_BATCH_SIZE = config("FANOUT_BATCH_SIZE", default=1000, cast=int)
+FANOUT_PUBLISH_TIMEOUT_MS = config("FANOUT_PUBLISH_TIMEOUT_MS", default=100, cast=int)
+FANOUT_DRAIN_SECONDS = config("FANOUT_DRAIN_SECONDS", default=5, cast=int)
+
+STOP = object()
+
+
+def username(user_id):
+    user = User.collection.find_one({"_id": ObjectId(user_id)}, {"username": 1})
+    return (user or {}).get("username") or "Someone"
+
+
+def follow_notifications(follower_id, followed_id):
+    """The followed user hears about their new follower."""
+    message = f"{username(follower_id)} started following you"
+    yield Notification.build(followed_id, message, f"/users/{follower_id}/followers")
+
+
+def content_notifications(user_id, content_id, visibility="public"):
+    """Every follower of the author hears about a new public post."""
+    if visibility == "private":
+        return
+    message = f"{username(user_id)} posted something new"
+    created_at = None
+    for follower_id in Connection.follower_ids(user_id, FANOUT_BATCH_SIZE):
+        notification = Notification.build(follower_id, message, f"/content/{content_id}", created_at)
+        # One timestamp for the whole fan-out
+        created_at = notification["created_at"]
+        yield notification
+
+
+HANDLERS = {
+    "follow": follow_notifications,
+    "content": content_notifications,
+}
+
+
+class FanoutQueue:
+    def __init__(self, maxsize=FANOUT_QUEUE_SIZE, workers=FANOUT_WORKERS, batch_size=FANOUT_BATCH_SIZE,
+                 publish_timeout=FANOUT_PUBLISH_TIMEOUT_MS / 1000, handlers=HANDLERS):
+        self.queue = queue.Queue(maxsize)
+        self.workers = workers
+        self.batch_size = batch_size
+        self.publish_timeout = publish_timeout
+        self.handlers = handlers
+        self.threads = []
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.counts = {"published": 0, "dropped": 0, "failed": 0, "notifications": 0}
+
+    def start(self):
+        with self.lock:
+            if self.threads:
+                return
+            self.threads = [
+                threading.Thread(target=self._run, name=f"fanout-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+        for thread in self.threads:
+            thread.start()
+
+    def _count(self, name, n=1):
+        with self.lock:
+            self.counts[name] += n
+
+    def publish(self, event_type, **event):
+        """
+        Queue an event for the workers. Returns False if it was dropped
+        because the queue stayed full for the whole publish timeout.
+        """
+        if event_type not in self.handlers:
+            raise ValueError(f"Unknown fan-out event {event_type!r}")
+        self.start()
+        try:
+            self.queue.put((event_type, event), timeout=self.publish_timeout)
+        except queue.Full:
+            self._count("dropped")
+            logger.warning(f"Fan-out queue full, dropped {event_type} event")
+            return False
+        self._count("published")
+        return True
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is STOP:
+                    return
+                self.deliver(*item)
+            finally:
+                self.queue.task_done()
+
+    def deliver(self, event_type, event):
+        """Write the notifications of one event, batch_size per insert_many."""
+        try:
+            notifications = self.handlers[event_type](**event)
+            while True:
+                batch = list(islice(notifications, self.batch_size))
+                if not batch:
+                    break
+                self._count("notifications", Notification.send_notifications(batch))
+        except Exception as e:
+            self._count("failed")
+            logger.error(f"Failed to fan out {event_type} event: {str(e)}")
+
+    def join(self):
+        """Wait until every queued event has been delivered."""
+        self.queue.join()
+
+    def stop(self, timeout=FANOUT_DRAIN_SECONDS):
+        """Deliver what is queued, waiting at most `timeout` seconds, and stop the workers."""
+        if not self.threads or self.pid != os.getpid():
+            return
+        deadline = time.monotonic() + timeout
+        for _ in self.threads:
+            try:
+                self.queue.put(STOP, timeout=max(deadline - time.monotonic(), 0))
+            except queue.Full:
+                break
+        for thread in self.threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+        pending = self.queue.qsize()
+        if pending:
+            logger.warning(f"Fan-out stopped with {pending} events undelivered")
+
+    def stats(self):
+        with self.lock:
+            return {**self.counts, "queued": self.queue.qsize()}
+
+
+_lock = threading.Lock()
+_pid = None
+_fanout = None
+
+
+def get_fanout():
+    """This process's fan-out queue; gunicorn workers each get their own after the fork."""
+    global _pid, _fanout
+    with _lock:
+        if _fanout is None or _pid != os.getpid():
+            _fanout = FanoutQueue()
+            _pid = os.getpid()
+            atexit.register(_fanout.stop)
+        return _fanout
+
+
+def publish(event_type, **event):
+    """Queue a fan-out event; never raises, since the write being announced already succeeded."""
+    try:
+        return get_fanout().publish(event_type, **event)
+    except Exception as e:
+        logger.error(f"Failed to publish {event_type} event: {str(e)}")
+        return False
@@ -0,0 +1,138 @@
+"""
+Search across Mongo content and Dgraph posts.
+
+Both stores are queried concurrently, each under its own latency budget: a
+store that errors or misses its budget is reported in `backends` and left
+out, and the response is marked partial instead of failing or waiting.
+
+Scores are not comparable across stores (Mongo's come from the configured
+search backend, Dgraph's anyoftext has none, so posts are scored by the
+share of query terms they contain). Each store's scores are therefore
+divided by that store's best score before the results are merged.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import pymongo
+from decouple import config
+from pymongo.errors import PyMongoError
+
+from search_backends import get_backend, tokenize
+
+logger = logging.getLogger("federated_search")
+
+DGRAPH_URI = config("DGRAPH_URI", default="localhost:9080")
+FEDERATED_MONGO_TIMEOUT_MS = config("FEDERATED_MONGO_TIMEOUT_MS", default=300, cast=int)
+FEDERATED_DGRAPH_TIMEOUT_MS = config("FEDERATED_DGRAPH_TIMEOUT_MS", default=300, cast=int)
+
+DGRAPH_POSTS_QUERY = """
+query posts($terms: string, $first: int) {
+    # content is a fulltext predicate of Comment too
+    posts(func: anyoftext(content, $terms), first: $first) @filter(type(Post)) {
+        uid
+        content
+        created_at
+        author { username }
+    }
+}
+"""
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="federated-search")
+_dgraph_lock = threading.Lock()
+_dgraph_pid = None
+_dgraph_client = None
+
+
+def get_dgraph_client():
+    """This process's Dgraph client; pydgraph is only needed once federated search is used."""
+    global _dgraph_pid, _dgraph_client
+    with _dgraph_lock:
+        if _dgraph_client is None or _dgraph_pid != os.getpid():
+            import pydgraph
+            _dgraph_client = pydgraph.DgraphClient(pydgraph.DgraphClientStub(DGRAPH_URI))
+            _dgraph_pid = os.getpid()
+        return _dgraph_client
+
+
+def search_mongo(query, limit, timeout):
+    with pymongo.timeout(timeout):
+        docs, _ = get_backend().search("content", query, limit)
+    return [
+        {"id": str(doc["_id"]), "text": doc.get("text"), "tags": doc.get("tags", []),
+         "user_id": str(doc["user_id"]) if doc.get("user_id") else None, "score": doc["score"]}
+        for doc in docs
+    ]
+
+
+def search_dgraph(query, limit, timeout):
+    terms = set(tokenize(query))
+    txn = get_dgraph_client().txn(read_only=True, best_effort=True)
+    try:
+        response = txn.query(DGRAPH_POSTS_QUERY, variables={"$terms": query, "$first": str(limit)}, timeout=timeout)
+    finally:
+        txn.discard()
+    posts = json.loads(response.json).get("posts", [])
+    return [
+        {"id": post["uid"], "text": post.get("content"), "created_at": post.get("created_at"),
+         "username": (post.get("author") or {}).get("username"),
+         "score": len(terms & set(tokenize(post.get("content") or ""))) / max(len(terms), 1)}
+        for post in posts
+    ]
+
+
+BACKENDS = {
+    "mongo": (search_mongo, FEDERATED_MONGO_TIMEOUT_MS),
+    "dgraph": (search_dgraph, FEDERATED_DGRAPH_TIMEOUT_MS),
+}
+
+
+def is_timeout(error):
+    if isinstance(error, PyMongoError):
+        return error.timeout
+    # grpc errors from pydgraph
+    code = getattr(error, "code", None)
+    return callable(code) and getattr(code(), "name", "") == "DEADLINE_EXCEEDED"
+
+
+def normalize(results):
+    best = max((result["score"] for result in results), default=0)
+    for result in results:
+        result["score"] = result["score"] / best if best > 0 else 0.0
+    return results
+
+
+def federated_search(query, limit=10, backends=BACKENDS):
+    """
+    Returns (merged results, per-backend status). Results carry their "source"
+    and a score in [0, 1]; the status says "ok", "timeout" or "error" per backend.
+    """
+    started = time.monotonic()
+    futures = {
+        name: _executor.submit(search, query, limit, budget_ms / 1000)
+        for name, (search, budget_ms) in backends.items()
+    }
+    # Each call enforces its own budget; this bounds the wait should a driver overrun it
+    wait(futures.values(), timeout=max(budget for _, budget in backends.values()) / 1000)
+
+    merged, status = [], {}
+    for name, future in futures.items():
+        if not future.done():
+            future.cancel()
+            status[name] = {"status": "timeout"}
+            continue
+        try:
+            results = normalize(future.result())
+        except Exception as e:
+            logger.error(f"Federated search backend {name} failed: {str(e)}")
+            status[name] = {"status": "timeout" if is_timeout(e) else "error"}
+            continue
+        merged.extend({**result, "source": name} for result in results)
+        status[name] = {"status": "ok", "count": len(results)}
+
+    merged.sort(key=lambda result: -result["score"])
+    logger.info(f"Federated search took {(time.monotonic() - started) * 1000:.0f} ms: {status}")
+    return merged[:limit], status
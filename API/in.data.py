@@ -1,7 +1,9 @@
-from pymongo import MongoClient, ASCENDING, DESCENDING
 import logging
 from bson.objectid import ObjectId
 import datetime
+from mongo import get_db
+from indexes import ensure_indexes
+from model import Connection
 
 # Configuración del registro de eventos
 logging.basicConfig(
@@ -10,19 +12,28 @@ logging.basicConfig(
 )
 logger = logging.getLogger("init_db")
 
-# Conexión a MongoDB
-MONGO_URI = "mongodb://localhost:27017/app_database"
-client = MongoClient(MONGO_URI)
-db = client.get_database()
+# Conexión a MongoDB (cliente compartido, ver mongo.py)
+db = get_db()
 
-def create_indexes():
+def migrate_connections():
     try:
-        # users collection
-        db["users"].create_index([("email", ASCENDING)], unique=True)
-        db["users"].create_index([("username", ASCENDING)], unique=True)
-        logger.info("Indexes created for 'users' collection")
+        # El índice único de follows no se puede crear con follows duplicados
+        Connection.remove_duplicates()
+        # Contadores de seguidores de los usuarios que nunca se recontaron; no basta con
+        # follower_count ausente, la API puede haberlo incrementado desde 0 antes de esta migración
+        user_ids = [user["_id"] for user in db["users"].find({"counts_migrated": {"$ne": True}}, {"_id": 1})]
+        Connection.recount(user_ids)
+        logger.info(f"Follow counters backfilled for {len(user_ids)} users")
+
+    except Exception as e:
+        logger.error(f"Error migrating connections: {e}")
+        raise
 
-        # Otros índices...
+def create_indexes():
+    try:
+        # Índices declarados en indexes.py; solo se crean los que faltan
+        created = ensure_indexes(db)
+        logger.info(f"Indexes created: {created or 'none missing'}")
 
     except Exception as e:
         logger.error(f"Error creating indexes: {e}")
@@ -74,6 +85,7 @@ def seed_data():
 
 if __name__ == "__main__":
     logger.info("Initializing database...")
+    migrate_connections()
     create_indexes()
     seed_data()
     logger.info("Database initialization complete.")
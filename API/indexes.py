@@ -0,0 +1,217 @@
+"""
+Index declarations for the collections used by the API.
+
+INDEXES lists, per collection, the indexes the model queries rely on.
+ensure_indexes() compares them with what list_indexes() reports and creates
+only the missing ones, so it is cheap to run on every start;
+ensure_indexes_in_background() does it from a daemon thread so the app does
+not wait for index builds before serving requests. TTL indexes follow the
+settings in retention.py: a changed retention is applied in place with
+collMod, without rebuilding the index, and a retention set to keep forever
+drops the TTL index (DISABLED_TTL). A collection whose build fails (e.g. a
+unique index over duplicates, which in.data.py removes) is logged and the
+others are still processed.
+"""
+import logging
+import threading
+
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+
+from mongo import get_db
+from retention import ACTIVITY_LOG_RETENTION_DAYS, NOTIFICATION_RETENTION_DAYS, expire_after_seconds
+from search_backends import SEARCH_BACKEND, SEARCH_DELETIONS, SEARCH_DELETIONS_RETENTION_DAYS, SEARCH_TYPES
+
+logger = logging.getLogger("indexes")
+
+
+def ttl_index(field, seconds):
+    """A TTL index on `field`, or none at all when `seconds` is None (keep forever)."""
+    if seconds is None:
+        return []
+    return [IndexModel([(field, ASCENDING)], name=f"{field}_ttl", expireAfterSeconds=seconds)]
+
+
+def disabled_ttl(field, seconds):
+    """The name of the TTL index on `field`, to be dropped, when `seconds` is None (keep forever)."""
+    return [f"{field}_ttl"] if seconds is None else []
+
+
+def text_index(kind):
+    """The $text index for a search type, only declared when the "text" search backend is in use."""
+    if SEARCH_BACKEND != "text":
+        return []
+    paths = SEARCH_TYPES[kind]["paths"]
+    return [IndexModel([(path, TEXT) for path in paths], name=f"{kind}_text")]
+
+
+def catch_up_index():
+    """The updated_at index the "local" search backend's catch-up reads through."""
+    if SEARCH_BACKEND != "local":
+        return []
+    return [IndexModel([("updated_at", ASCENDING)], name="updated_at")]
+
+
+INDEXES = {
+    "users": [
+        # Partial, so users without an email (or username) don't collide on null
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True,
+                   partialFilterExpression={"email": {"$type": "string"}}),
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True,
+                   partialFilterExpression={"username": {"$type": "string"}}),
+        *text_index("profiles"),
+        *catch_up_index(),
+    ],
+    "sessions": [
+        # Session.find_session
+        IndexModel([("session_token", ASCENDING)], name="session_token_unique", unique=True),
+        IndexModel([("user_id", ASCENDING)], name="user_id"),
+        # Removes each session once its expires_at has passed
+        *ttl_index("expires_at", 0),
+    ],
+    "password_resets": [
+        # PasswordReset.find_valid_request
+        IndexModel([("reset_token", ASCENDING)], name="reset_token_unique", unique=True),
+        *ttl_index("expires_at", 0),
+    ],
+    "notifications": [
+        # Notification.get_unread_notifications, newest first; _id breaks ties for cursors.
+        # Also covers Notification.count_unread and mark_many_as_read
+        IndexModel([("user_id", ASCENDING), ("is_read", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+                   name="user_id_is_read_created_at_id"),
+        *ttl_index("created_at", expire_after_seconds(NOTIFICATION_RETENTION_DAYS)),
+    ],
+    "activity_logs": [
+        # ActivityLog.get_recent_logs
+        IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+                   name="user_id_timestamp_id"),
+        *ttl_index("timestamp", expire_after_seconds(ACTIVITY_LOG_RETENTION_DAYS)),
+    ],
+    "connections": [
+        # One connection per follow, so following twice is a no-op (Connection.follow_user)
+        IndexModel([("follower_id", ASCENDING), ("followed_id", ASCENDING)],
+                   name="follower_id_followed_id_unique", unique=True),
+        # Connection.get_following and Connection.get_followers, newest first
+        IndexModel([("follower_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+                   name="follower_id_timestamp_id"),
+        IndexModel([("followed_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+                   name="followed_id_timestamp_id"),
+    ],
+    "content": [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="user_id_created_at"),
+        *text_index("content"),
+        *catch_up_index(),
+    ],
+}
+
+if SEARCH_BACKEND == "local":
+    # Deletions for the other processes' search index catch-up
+    # (the TTL index also serves its deleted_at range reads)
+    INDEXES[SEARCH_DELETIONS] = ttl_index("deleted_at", expire_after_seconds(SEARCH_DELETIONS_RETENTION_DAYS))
+
+# TTL indexes to drop: a retention set to 0 after the index was built must stop deleting documents
+DISABLED_TTL = {
+    "notifications": disabled_ttl("created_at", expire_after_seconds(NOTIFICATION_RETENTION_DAYS)),
+    "activity_logs": disabled_ttl("timestamp", expire_after_seconds(ACTIVITY_LOG_RETENTION_DAYS)),
+}
+
+# Options whose value must match for an existing index to count as the declared one
+COMPARED_OPTIONS = ("unique", "expireAfterSeconds", "partialFilterExpression")
+
+
+def _key(index):
+    return tuple(index["key"].items())
+
+
+def update_ttl(collection, current, seconds):
+    collection.database.command(
+        "collMod", collection.name, index={"keyPattern": current["key"], "expireAfterSeconds": seconds}
+    )
+    logger.info(f"TTL of index {current['name']} on {collection.name} changed "
+                f"from {current['expireAfterSeconds']}s to {seconds}s")
+
+
+def missing_indexes(collection, declared):
+    """
+    The declared IndexModels with no index on the same keys in `collection`.
+    Existing TTL indexes whose expiry differs from the declared one are updated.
+    """
+    indexes = list(collection.list_indexes())
+    existing = {_key(index): index for index in indexes}
+    # Text indexes are reported with internal keys (_fts, _ftsx), so they are matched by name
+    by_name = {index["name"]: index for index in indexes}
+    missing = []
+    for model in declared:
+        spec = model.document
+        current = existing.get(_key(spec)) or by_name.get(spec["name"])
+        if current is None:
+            missing.append(model)
+            continue
+        for option in COMPARED_OPTIONS:
+            if current.get(option) == spec.get(option):
+                continue
+            if option == "expireAfterSeconds" and None not in (current.get(option), spec.get(option)):
+                update_ttl(collection, current, spec[option])
+            else:
+                logger.warning(f"Index {current['name']} on {collection.name} has {option}={current.get(option)}, "
+                               f"expected {spec.get(option)}; drop it to rebuild")
+    return missing
+
+
+def drop_disabled_ttl(collection, names):
+    existing = {index["name"] for index in collection.list_indexes()}
+    for name in names:
+        if name in existing:
+            collection.drop_index(name)
+            logger.info(f"Dropped TTL index {name} on {collection.name}: retention is now forever")
+
+
+def ensure_collection_indexes(collection, declared, disabled_ttl=()):
+    """Create the missing declared indexes of one collection and drop its disabled TTL indexes."""
+    missing = missing_indexes(collection, declared)
+    created = []
+    if missing:
+        created = collection.create_indexes(missing)
+        logger.info(f"Created indexes on {collection.name}: {', '.join(created)}")
+    drop_disabled_ttl(collection, disabled_ttl)
+    return created
+
+
+def ensure_indexes(db=None):
+    """
+    Create the missing declared indexes. A collection whose indexes fail to
+    build is logged and skipped. Returns {collection: [created index names]}.
+    """
+    db = db if db is not None else get_db()
+    created = {}
+    for name, declared in INDEXES.items():
+        try:
+            names = ensure_collection_indexes(db[name], declared, DISABLED_TTL.get(name, []))
+        except Exception as e:
+            logger.error(f"Failed to ensure indexes on {name}: {str(e)}")
+            continue
+        if names:
+            created[name] = names
+    return created
+
+
+_started = False
+_lock = threading.Lock()
+
+
+def ensure_indexes_in_background(db=None):
+    """Run ensure_indexes once per process, from a daemon thread."""
+    global _started
+    with _lock:
+        if _started:
+            return None
+        _started = True
+
+    def run():
+        try:
+            ensure_indexes(db)
+        except Exception as e:
+            logger.error(f"Failed to ensure indexes: {str(e)}")
+
+    thread = threading.Thread(target=run, name="ensure-indexes", daemon=True)
+    thread.start()
+    return thread
@@ -1,23 +1,31 @@
-from pymongo import MongoClient
 from bson.objectid import ObjectId
 from cerberus import Validator
+from collections import Counter
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 import datetime
 import logging
-import os
+from mongo import MongoCollection
+from retention import PASSWORD_RESET_TTL, SESSION_TTL
+from pagination import find_page
+from search_backends import index_document, reindex_document, remove_document
+from activity_writer import get_activity_writer
 
 # Logging Configuration
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger("model")
 
-# MongoDB Connection
-MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
-client = MongoClient(MONGO_URI)
-db = client["app_database"]
+OBJECT_ID = {"type": "string", "regex": "^[0-9a-fA-F]{24}$", "required": True}
+
+
+def bulk_write_errors(error):
+    """Map the position of each failed operation of a BulkWriteError to its message."""
+    return {err["index"]: err.get("errmsg", "Write failed") for err in error.details.get("writeErrors", [])}
 
 class UserModel:
     """Handles user-related MongoDB operations."""
 
-    collection = db["users"]
+    collection = MongoCollection("users")
 
     @staticmethod
     def create_user(username, email, hashed_password, profile={}):
@@ -47,6 +55,7 @@ class UserModel:
                 raise ValueError(f"Invalid user data: {validator.errors}")
             result = User.collection.insert_one(user)
             logger.info(f"User created with ID: {result.inserted_id}")
+            index_document("users", user)
             return result
         except Exception as e:
             logger.error(f"Failed to create user: {str(e)}")
@@ -63,6 +72,20 @@ class UserModel:
             logger.error(f"Failed to find user: {str(e)}")
             raise
 
+    @staticmethod
+    def find_by_username(username):
+        """
+        Find a user by username (login, registration).
+        """
+        return User.find_user({"username": username})
+
+    @staticmethod
+    def find_by_email(email):
+        """
+        Find a user by email (registration, password reset).
+        """
+        return User.find_user({"email": email})
+
     @staticmethod
     def update_user(user_id, updates):
         """
@@ -72,6 +95,7 @@ class UserModel:
             updates["updated_at"] = datetime.datetime.utcnow()
             result = User.collection.update_one({"_id": ObjectId(user_id)}, {"$set": updates})
             logger.info(f"User updated: {user_id}")
+            reindex_document("users", ObjectId(user_id))
             return result
         except Exception as e:
             logger.error(f"Failed to update user: {str(e)}")
@@ -85,16 +109,20 @@ class UserModel:
         try:
             result = User.collection.delete_one({"_id": ObjectId(user_id)})
             logger.info(f"User deleted: {user_id}")
+            remove_document("users", ObjectId(user_id))
             return result
         except Exception as e:
             logger.error(f"Failed to delete user: {str(e)}")
             raise
 
 
+# The routes and tests refer to the user model as User
+User = UserModel
+
 class PasswordReset:
     """Handles password reset operations."""
 
-    collection = db["password_resets"]
+    collection = MongoCollection("password_resets")
 
     @staticmethod
     def create_request(user_id, reset_token):
@@ -105,7 +133,7 @@ class PasswordReset:
             reset_request = {
                 "user_id": ObjectId(user_id),
                 "reset_token": reset_token,
-                "expires_at": datetime.datetime.utcnow() + datetime.timedelta(hours=1),
+                "expires_at": datetime.datetime.utcnow() + PASSWORD_RESET_TTL,
                 "is_used": False,
             }
             result = PasswordReset.collection.insert_one(reset_request)
@@ -115,11 +143,44 @@ class PasswordReset:
             logger.error(f"Failed to create password reset request: {str(e)}")
             raise
 
+    @staticmethod
+    def find_valid_request(reset_token):
+        """
+        Find an unused, unexpired password reset request by its token.
+
+        Expired requests are deleted by a TTL index, but the monitor only runs
+        about once a minute, so expiry is checked here as well.
+        """
+        try:
+            return PasswordReset.collection.find_one({
+                "reset_token": reset_token,
+                "is_used": False,
+                "expires_at": {"$gt": datetime.datetime.utcnow()},
+            })
+        except Exception as e:
+            logger.error(f"Failed to find password reset request: {str(e)}")
+            raise
+
+    @staticmethod
+    def mark_used(reset_token):
+        """
+        Mark a password reset request as used so its token cannot be replayed.
+        """
+        try:
+            result = PasswordReset.collection.update_one(
+                {"reset_token": reset_token, "is_used": False}, {"$set": {"is_used": True}}
+            )
+            logger.info("Password reset request marked as used")
+            return result.modified_count
+        except Exception as e:
+            logger.error(f"Failed to mark password reset request as used: {str(e)}")
+            raise
+
 
 class Content:
     """Handles user-generated content operations."""
 
-    collection = db["content"]
+    collection = MongoCollection("content")
 
     @staticmethod
     def create_content(user_id, text, media_url="", tags=[], visibility="public"):
@@ -138,11 +199,71 @@ class Content:
             }
             result = Content.collection.insert_one(content_item)
             logger.info(f"Content created with ID: {result.inserted_id}")
+            index_document("content", content_item)
             return result
         except Exception as e:
             logger.error(f"Failed to create content: {str(e)}")
             raise
 
+    ITEM_SCHEMA = {
+        "user_id": OBJECT_ID,
+        "text": {"type": "string", "required": True, "empty": False},
+        "media_url": {"type": "string"},
+        "tags": {"type": "list", "schema": {"type": "string"}},
+        "visibility": {"type": "string"},
+    }
+
+    @staticmethod
+    def create_contents(items):
+        """
+        Create many content entries with a single unordered insert_many.
+
+        Args:
+            items (list): Dicts with user_id, text and optional media_url, tags and visibility.
+
+        Returns:
+            list: One result per item, in input order: {"index", "content_id"} or {"index", "error"}.
+        """
+        validator = Validator(Content.ITEM_SCHEMA)
+        results = [None] * len(items)
+        documents, positions = [], []
+        now = datetime.datetime.utcnow()
+        for i, item in enumerate(items):
+            if not isinstance(item, dict) or not validator.validate(item):
+                errors = validator.errors if isinstance(item, dict) else "item must be an object"
+                results[i] = {"index": i, "error": f"Invalid content: {errors}"}
+                continue
+            documents.append({
+                "user_id": ObjectId(item["user_id"]),
+                "text": item["text"],
+                "media_url": item.get("media_url", ""),
+                "tags": item.get("tags", []),
+                "created_at": now,
+                "updated_at": now,
+                "visibility": item.get("visibility", "public"),
+            })
+            positions.append(i)
+        if not documents:
+            return results
+
+        failed = {}
+        try:
+            # Unordered: one bad document doesn't stop the others
+            Content.collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            failed = bulk_write_errors(e)
+        except Exception as e:
+            logger.error(f"Failed to create content in bulk: {str(e)}")
+            raise
+        for n, (i, document) in enumerate(zip(positions, documents)):
+            if n in failed:
+                results[i] = {"index": i, "error": failed[n]}
+            else:
+                results[i] = {"index": i, "content_id": str(document["_id"])}
+                index_document("content", document)
+        logger.info(f"Bulk content: {len(documents) - len(failed)} created, {len(items) - len(documents) + len(failed)} failed")
+        return results
+
     @staticmethod
     def find_content(query):
         """
@@ -163,6 +284,7 @@ class Content:
             updates["updated_at"] = datetime.datetime.utcnow()
             result = Content.collection.update_one({"_id": ObjectId(content_id)}, {"$set": updates})
             logger.info(f"Content updated: {content_id}")
+            reindex_document("content", ObjectId(content_id))
             return result
         except Exception as e:
             logger.error(f"Failed to update content: {str(e)}")
@@ -170,31 +292,275 @@ class Content:
 
 
 class Connection:
-    """Handles user connections (follow/unfollow)."""
+    """
+    Handles the follow graph (follow/unfollow).
 
-    collection = db["connections"]
+    A unique index on (follower_id, followed_id) makes following idempotent,
+    and each user's follower_count / following_count is kept up to date
+    with atomic $inc updates whenever a follow is actually created or removed.
+    """
+
+    collection = MongoCollection("connections")
+    ORDER = [("timestamp", -1), ("_id", -1)]
+
+    @staticmethod
+    def _pair(follower_id, followed_id):
+        return {"follower_id": ObjectId(follower_id), "followed_id": ObjectId(followed_id)}
+
+    @staticmethod
+    def _update_counts(deltas):
+        """
+        Apply follower/following count changes in one bulk write.
+
+        Args:
+            deltas (Counter): (user ObjectId, "follower_count" or "following_count") -> change.
+        """
+        by_user = {}
+        for (user_id, field), delta in deltas.items():
+            if delta:
+                by_user.setdefault(user_id, {})[field] = delta
+        if by_user:
+            User.collection.bulk_write(
+                [UpdateOne({"_id": user_id}, {"$inc": inc}) for user_id, inc in by_user.items()], ordered=False
+            )
 
     @staticmethod
     def follow_user(follower_id, followed_id):
         """
-        Create a follow relationship between users.
+        Create a follow relationship between users; following twice is a no-op.
+
+        Returns:
+            bool: True if the follow was created, False if it already existed.
         """
         try:
-            connection = {
-                "follower_id": ObjectId(follower_id),
-                "followed_id": ObjectId(followed_id),
-                "timestamp": datetime.datetime.utcnow(),
-            }
-            result = Connection.collection.insert_one(connection)
-            logger.info(f"User {follower_id} followed user {followed_id}")
-            return result
+            pair = Connection._pair(follower_id, followed_id)
+            try:
+                result = Connection.collection.update_one(
+                    pair, {"$setOnInsert": {"timestamp": datetime.datetime.utcnow()}}, upsert=True
+                )
+                created = result.upserted_id is not None
+            except DuplicateKeyError:
+                # A concurrent upsert of the same pair won the race
+                created = False
+            if created:
+                Connection._update_counts(Counter({
+                    (pair["followed_id"], "follower_count"): 1,
+                    (pair["follower_id"], "following_count"): 1,
+                }))
+                logger.info(f"User {follower_id} followed user {followed_id}")
+            return created
         except Exception as e:
             logger.error(f"Failed to follow user: {str(e)}")
             raise
 
+    @staticmethod
+    def unfollow_user(follower_id, followed_id):
+        """
+        Remove a follow relationship; unfollowing a user not followed is a no-op.
+
+        Returns:
+            bool: True if a follow was removed.
+        """
+        try:
+            pair = Connection._pair(follower_id, followed_id)
+            removed = Connection.collection.delete_one(pair).deleted_count == 1
+            if removed:
+                Connection._update_counts(Counter({
+                    (pair["followed_id"], "follower_count"): -1,
+                    (pair["follower_id"], "following_count"): -1,
+                }))
+                logger.info(f"User {follower_id} unfollowed user {followed_id}")
+            return removed
+        except Exception as e:
+            logger.error(f"Failed to unfollow user: {str(e)}")
+            raise
+
+    @staticmethod
+    def follower_ids(user_id, batch_size=1000):
+        """
+        Stream the ids of the users following `user_id`, read in batches of `batch_size`.
+        """
+        try:
+            cursor = Connection.collection.find(
+                {"followed_id": ObjectId(user_id)}, {"follower_id": 1, "_id": 0}
+            ).batch_size(batch_size)
+            for connection in cursor:
+                yield connection["follower_id"]
+        except Exception as e:
+            logger.error(f"Failed to retrieve follower ids: {str(e)}")
+            raise
+
+    @staticmethod
+    def _with_usernames(docs, field):
+        """Add the username of each connection's `field` user, read with one $in query."""
+        user_ids = [doc[field] for doc in docs]
+        usernames = {
+            user["_id"]: user.get("username")
+            for user in User.collection.find({"_id": {"$in": user_ids}}, {"username": 1})
+        } if user_ids else {}
+        for doc in docs:
+            doc["username"] = usernames.get(doc[field])
+        return docs
+
+    @staticmethod
+    def get_followers(user_id, limit=20, cursor=None):
+        """
+        Retrieve a page of the users following `user_id`, most recent first.
+
+        Returns:
+            tuple: A list of connections and the cursor of the next page (None on the last page).
+        """
+        try:
+            query = {"followed_id": ObjectId(user_id)}
+            docs, next_cursor = find_page(Connection.collection, query, Connection.ORDER, limit, cursor,
+                                          {"follower_id": 1, "timestamp": 1})
+            return Connection._with_usernames(docs, "follower_id"), next_cursor
+        except Exception as e:
+            logger.error(f"Failed to retrieve followers: {str(e)}")
+            raise
+
+    @staticmethod
+    def get_following(user_id, limit=20, cursor=None):
+        """
+        Retrieve a page of the users `user_id` follows, most recent first.
+
+        Returns:
+            tuple: A list of connections and the cursor of the next page (None on the last page).
+        """
+        try:
+            query = {"follower_id": ObjectId(user_id)}
+            docs, next_cursor = find_page(Connection.collection, query, Connection.ORDER, limit, cursor,
+                                          {"followed_id": 1, "timestamp": 1})
+            return Connection._with_usernames(docs, "followed_id"), next_cursor
+        except Exception as e:
+            logger.error(f"Failed to retrieve followed users: {str(e)}")
+            raise
+
+    @staticmethod
+    def remove_duplicates():
+        """
+        Delete duplicate follows left by the old insert-only follow_user,
+        keeping the oldest of each pair, so the unique index can be built.
+
+        Returns:
+            int: Number of connections deleted.
+        """
+        try:
+            duplicates = Connection.collection.aggregate([
+                {"$sort": {"_id": 1}},
+                {"$group": {"_id": {"follower_id": "$follower_id", "followed_id": "$followed_id"},
+                            "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+                {"$match": {"count": {"$gt": 1}}},
+            ], allowDiskUse=True)
+            extra = [doc_id for group in duplicates for doc_id in group["ids"][1:]]
+            deleted = Connection.collection.delete_many({"_id": {"$in": extra}}).deleted_count if extra else 0
+            logger.info(f"Removed {deleted} duplicate connections")
+            return deleted
+        except Exception as e:
+            logger.error(f"Failed to remove duplicate connections: {str(e)}")
+            raise
+
+    @staticmethod
+    def recount(user_ids):
+        """
+        Recompute follower_count and following_count of `user_ids` from the
+        connections, and mark them counts_migrated (see in.data.py).
+        """
+        try:
+            for user_id in user_ids:
+                User.collection.update_one({"_id": user_id}, {"$set": {
+                    "follower_count": Connection.collection.count_documents({"followed_id": user_id}),
+                    "following_count": Connection.collection.count_documents({"follower_id": user_id}),
+                    "counts_migrated": True,
+                }})
+        except Exception as e:
+            logger.error(f"Failed to recount follows: {str(e)}")
+            raise
+
+    ITEM_SCHEMA = {
+        "action": {"type": "string", "allowed": ["follow", "unfollow"], "required": True},
+        "follower_id": OBJECT_ID,
+        "followed_id": OBJECT_ID,
+    }
+
+    @staticmethod
+    def apply_follows(items):
+        """
+        Apply many follow/unfollow actions with a single unordered bulk_write.
+
+        Args:
+            items (list): Dicts with action ("follow" or "unfollow"), follower_id and followed_id.
+
+        Returns:
+            list: One result per item, in input order: {"index", "action"} or {"index", "error"};
+            follows also say whether they "created" a connection (False if it already existed).
+        """
+        validator = Validator(Connection.ITEM_SCHEMA)
+        results = [None] * len(items)
+        operations, positions, pairs = [], [], []
+        now = datetime.datetime.utcnow()
+        for i, item in enumerate(items):
+            if not isinstance(item, dict) or not validator.validate(item):
+                errors = validator.errors if isinstance(item, dict) else "item must be an object"
+                results[i] = {"index": i, "error": f"Invalid follow action: {errors}"}
+                continue
+            if item["follower_id"] == item["followed_id"]:
+                results[i] = {"index": i, "error": "Users cannot follow themselves"}
+                continue
+            pair = Connection._pair(item["follower_id"], item["followed_id"])
+            if item["action"] == "follow":
+                operations.append(UpdateOne(pair, {"$setOnInsert": {"timestamp": now}}, upsert=True))
+            else:
+                operations.append(DeleteOne(pair))
+            positions.append(i)
+            pairs.append(pair)
+        if not operations:
+            return results
+
+        failed = {}
+        try:
+            result = Connection.collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            failed = bulk_write_errors(e)
+            result = None
+            details = e.details
+        except Exception as e:
+            logger.error(f"Failed to apply follows in bulk: {str(e)}")
+            raise
+        else:
+            details = result.bulk_api_result
+
+        # Follows that created a connection are known per operation; removals only as a total
+        deltas = Counter()
+        created = {upsert["index"] for upsert in details.get("upserted", [])}
+        for n in created:
+            pair = pairs[n]
+            deltas[(pair["followed_id"], "follower_count")] += 1
+            deltas[(pair["follower_id"], "following_count")] += 1
+        deletes = [n for n, operation in enumerate(operations) if isinstance(operation, DeleteOne) and n not in failed]
+        if details.get("nRemoved", 0) == len(deletes):
+            for n in deletes:
+                deltas[(pairs[n]["followed_id"], "follower_count")] -= 1
+                deltas[(pairs[n]["follower_id"], "following_count")] -= 1
+            Connection._update_counts(deltas)
+        else:
+            # Some unfollows matched nothing and we can't tell which: recount the users involved
+            Connection._update_counts(deltas)
+            Connection.recount({user_id for n in deletes for user_id in pairs[n].values()})
+
+        for n, i in enumerate(positions):
+            if n in failed:
+                results[i] = {"index": i, "error": failed[n]}
+            elif items[i]["action"] == "follow":
+                results[i] = {"index": i, "action": "follow", "created": n in created}
+            else:
+                results[i] = {"index": i, "action": "unfollow"}
+        logger.info(f"Bulk follows: {len(operations) - len(failed)} applied, {len(items) - len(operations) + len(failed)} failed")
+        return results
+
 class Session:
     """Handles session-related operations."""
-    collection = db["sessions"]
+    collection = MongoCollection("sessions")
 
     @staticmethod
     def create_session(user_id, session_token):
@@ -212,7 +578,7 @@ class Session:
             session = {
                 "user_id": ObjectId(user_id),
                 "session_token": session_token,
-                "expires_at": datetime.datetime.utcnow() + datetime.timedelta(days=7),  # 7-day session expiry
+                "expires_at": datetime.datetime.utcnow() + SESSION_TTL,  # removed by the TTL index once expired
             }
             result = Session.collection.insert_one(session)
             logger.info(f"Session created for user: {user_id}")
@@ -224,7 +590,7 @@ class Session:
     @staticmethod
     def find_session(session_token):
         """
-        Find a session by its token.
+        Find an unexpired session by its token.
 
         Args:
             session_token (str): The token of the session.
@@ -233,36 +599,44 @@ class Session:
             dict: The session document if found.
         """
         try:
-            return Session.collection.find_one({"session_token": session_token})
+            # The TTL monitor runs about once a minute; don't serve a session in that window
+            return Session.collection.find_one(
+                {"session_token": session_token, "expires_at": {"$gt": datetime.datetime.utcnow()}}
+            )
         except Exception as e:
             logger.error(f"Failed to find session: {str(e)}")
             raise
 
     @staticmethod
-    def delete_expired_sessions():
+    def delete_session(session_token):
         """
-        Delete all expired sessions from the database.
+        Delete a session, e.g. on logout.
+
+        Args:
+            session_token (str): The token of the session.
 
         Returns:
-            int: Number of sessions deleted.
+            int: The number of deleted documents.
         """
         try:
-            result = Session.collection.delete_many({"expires_at": {"$lt": datetime.datetime.utcnow()}})
-            logger.info(f"Deleted {result.deleted_count} expired sessions.")
+            result = Session.collection.delete_one({"session_token": session_token})
+            logger.info("Session deleted")
             return result.deleted_count
         except Exception as e:
-            logger.error(f"Failed to delete expired sessions: {str(e)}")
+            logger.error(f"Failed to delete session: {str(e)}")
             raise
 
 
 class ActivityLog:
     """Handles user activity logs."""
-    collection = db["activity_logs"]
+    collection = MongoCollection("activity_logs")
+    ORDER = [("timestamp", -1), ("_id", -1)]
 
     @staticmethod
     def log_action(user_id, action, metadata=None):
         """
-        Log a user's action.
+        Log a user's action. The entry is buffered and written in the
+        background with others (see activity_writer.py).
 
         Args:
             user_id (str): The ID of the user.
@@ -270,41 +644,39 @@ class ActivityLog:
             metadata (dict, optional): Additional details about the action.
 
         Returns:
-            ObjectId: The ID of the created log document.
+            ObjectId: The ID the log document will have, or None if the buffer was full and it was dropped.
         """
         try:
             log_entry = {
+                "_id": ObjectId(),
                 "user_id": ObjectId(user_id),
                 "action": action,
                 "timestamp": datetime.datetime.utcnow(),
                 "metadata": metadata or {},
             }
-            result = ActivityLog.collection.insert_one(log_entry)
-            logger.info(f"Action logged for user: {user_id}, Action: {action}")
-            return result.inserted_id
+            if not get_activity_writer().write(log_entry):
+                return None
+            logger.debug(f"Action logged for user: {user_id}, Action: {action}")
+            return log_entry["_id"]
         except Exception as e:
             logger.error(f"Failed to log action: {str(e)}")
             raise
 
     @staticmethod
-    def get_recent_logs(user_id, limit=10):
+    def get_recent_logs(user_id, limit=10, cursor=None):
         """
-        Retrieve the most recent logs for a user.
+        Retrieve the most recent logs for a user, newest first.
 
         Args:
             user_id (str): The ID of the user.
             limit (int): The number of logs to retrieve.
+            cursor (dict, optional): Decoded cursor of the previous page.
 
         Returns:
-            list: A list of recent activity logs.
+            tuple: A list of activity logs and the cursor of the next page (None on the last page).
         """
         try:
-            logs = list(
-                ActivityLog.collection.find({"user_id": ObjectId(user_id)})
-                .sort("timestamp", -1)
-                .limit(limit)
-            )
-            return logs
+            return find_page(ActivityLog.collection, {"user_id": ObjectId(user_id)}, ActivityLog.ORDER, limit, cursor)
         except Exception as e:
             logger.error(f"Failed to retrieve recent logs: {str(e)}")
             raise
@@ -312,7 +684,42 @@ class ActivityLog:
 
 class Notification:
     """Handles notifications for users."""
-    collection = db["notifications"]
+    collection = MongoCollection("notifications")
+    ORDER = [("created_at", -1), ("_id", -1)]
+
+    @staticmethod
+    def build(user_id, message, action_link, created_at=None):
+        """A new, unread notification document."""
+        return {
+            "user_id": ObjectId(user_id),
+            "message": message,
+            "action_link": action_link,
+            "created_at": created_at or datetime.datetime.utcnow(),
+            "is_read": False,
+        }
+
+    @staticmethod
+    def send_notifications(notifications):
+        """
+        Insert many notifications (see build) with a single unordered insert_many.
+
+        Args:
+            notifications (list): Notification documents.
+
+        Returns:
+            int: The number of inserted notifications.
+        """
+        if not notifications:
+            return 0
+        try:
+            result = Notification.collection.insert_many(notifications, ordered=False)
+            return len(result.inserted_ids)
+        except BulkWriteError as e:
+            logger.error(f"Failed to send {len(e.details.get('writeErrors', []))} notifications: {str(e)}")
+            return e.details.get("nInserted", 0)
+        except Exception as e:
+            logger.error(f"Failed to send notifications: {str(e)}")
+            raise
 
     @staticmethod
     def send_notification(user_id, message, action_link):
@@ -328,13 +735,7 @@ class Notification:
             ObjectId: The ID of the created notification document.
         """
         try:
-            notification = {
-                "user_id": ObjectId(user_id),
-                "message": message,
-                "action_link": action_link,
-                "created_at": datetime.datetime.utcnow(),
-                "is_read": False,
-            }
+            notification = Notification.build(user_id, message, action_link)
             result = Notification.collection.insert_one(notification)
             logger.info(f"Notification sent to user: {user_id}")
             return result.inserted_id
@@ -343,25 +744,74 @@ class Notification:
             raise
 
     @staticmethod
-    def get_unread_notifications(user_id):
+    def get_unread_notifications(user_id, limit=20, cursor=None):
         """
-        Retrieve all unread notifications for a user.
+        Retrieve a page of unread notifications for a user, newest first.
 
         Args:
             user_id (str): The ID of the user.
+            limit (int): The number of notifications to retrieve.
+            cursor (dict, optional): Decoded cursor of the previous page.
 
         Returns:
-            list: A list of unread notifications.
+            tuple: A list of unread notifications and the cursor of the next page (None on the last page).
         """
         try:
-            notifications = list(
-                Notification.collection.find({"user_id": ObjectId(user_id), "is_read": False})
-            )
-            return notifications
+            query = {"user_id": ObjectId(user_id), "is_read": False}
+            return find_page(Notification.collection, query, Notification.ORDER, limit, cursor)
         except Exception as e:
             logger.error(f"Failed to retrieve unread notifications: {str(e)}")
             raise
 
+    # Badges show "99+" beyond this; counting stops there
+    UNREAD_COUNT_CAP = 100
+
+    @staticmethod
+    def count_unread(user_id, cap=UNREAD_COUNT_CAP):
+        """
+        Count a user's unread notifications, up to `cap`.
+
+        The count is covered by the (user_id, is_read, ...) index, so no
+        notification document is read. It is not kept as a counter on the
+        user because TTL expiry deletes notifications without telling us.
+
+        Args:
+            user_id (str): The ID of the user.
+            cap (int): Stop counting at this number.
+
+        Returns:
+            int: The number of unread notifications, at most `cap`.
+        """
+        try:
+            query = {"user_id": ObjectId(user_id), "is_read": False}
+            return Notification.collection.count_documents(query, limit=cap)
+        except Exception as e:
+            logger.error(f"Failed to count unread notifications: {str(e)}")
+            raise
+
+    @staticmethod
+    def mark_many_as_read(user_id, notification_ids=None):
+        """
+        Mark several of a user's notifications as read with a single update_many.
+
+        Args:
+            user_id (str): The ID of the user.
+            notification_ids (list, optional): The notifications to mark; all unread ones if None.
+
+        Returns:
+            int: The number of modified documents.
+        """
+        try:
+            query = {"user_id": ObjectId(user_id), "is_read": False}
+            if notification_ids is not None:
+                query["_id"] = {"$in": [ObjectId(notification_id) for notification_id in notification_ids]}
+            result = Notification.collection.update_many(query, {"$set": {"is_read": True}})
+            logger.info(f"{result.modified_count} notifications marked as read for user: {user_id}")
+            return result.modified_count
+        except Exception as e:
+            logger.error(f"Failed to mark notifications as read: {str(e)}")
+            raise
+
     @staticmethod
     def mark_as_read(notification_id):
         """
@@ -0,0 +1,96 @@
+"""
+Application-scoped MongoDB client.
+
+The app, every model class and the init script share one MongoClient per
+process, built lazily on first use with the pool settings below. PyMongo
+clients are not fork-safe: a gunicorn worker (or any child process) forked
+after the parent touched the client gets a fresh one instead of the
+parent's sockets and monitor threads.
+"""
+import os
+import threading
+
+from decouple import config
+from pymongo import MongoClient
+
+MONGO_URI = config("MONGO_URI", default="mongodb://localhost:27017/app_database")
+# Connections per client (i.e. per gunicorn worker); requests beyond this wait in the queue
+MONGO_MAX_POOL_SIZE = config("MONGO_MAX_POOL_SIZE", default=50, cast=int)
+MONGO_MIN_POOL_SIZE = config("MONGO_MIN_POOL_SIZE", default=5, cast=int)
+MONGO_WAIT_QUEUE_TIMEOUT_MS = config("MONGO_WAIT_QUEUE_TIMEOUT_MS", default=2000, cast=int)
+MONGO_SERVER_SELECTION_TIMEOUT_MS = config("MONGO_SERVER_SELECTION_TIMEOUT_MS", default=5000, cast=int)
+MONGO_CONNECT_TIMEOUT_MS = config("MONGO_CONNECT_TIMEOUT_MS", default=5000, cast=int)
+MONGO_MAX_IDLE_TIME_MS = config("MONGO_MAX_IDLE_TIME_MS", default=60000, cast=int)
+
+_lock = threading.Lock()
+_pid = None
+_client = None
+
+
+def _reset_after_fork():
+    # The parent's client is left alone: closing it here would touch shared sockets
+    global _pid, _client
+    _pid, _client = None, None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def build_client(uri=MONGO_URI):
+    return MongoClient(
+        uri,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+        # Connect on first operation, not at import (e.g. in gunicorn's master)
+        connect=False,
+    )
+
+
+def get_client():
+    """Return this process's shared MongoClient, creating it on first use."""
+    global _pid, _client
+    if _client is not None and _pid == os.getpid():
+        return _client
+    with _lock:
+        if _client is None or _pid != os.getpid():
+            _client = build_client()
+            _pid = os.getpid()
+        return _client
+
+
+def get_db():
+    """The database named in MONGO_URI (app_database by default)."""
+    return get_client().get_database()
+
+
+def close_client():
+    global _client
+    with _lock:
+        if _client is not None and _pid == os.getpid():
+            _client.close()
+        _client = None
+
+
+class MongoCollection:
+    """
+    Class attribute resolving to a collection of the shared database, e.g.
+    `collection = MongoCollection("users")`. Resolved on access so model
+    classes never hold a client created before a fork.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._cached = (None, None)
+
+    def __get__(self, instance, owner):
+        client = get_client()
+        cached_client, collection = self._cached
+        if client is not cached_client:
+            collection = client.get_database()[self.name]
+            self._cached = (client, collection)
+        return collection
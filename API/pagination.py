@@ -0,0 +1,98 @@
+"""
+Keyset (cursor) pagination.
+
+A page is read with the sort keys of the last document of the previous page
+instead of a skip count, e.g. for a (created_at desc, _id desc) order:
+
+    {"$or": [{"created_at": {"$lt": last_created_at}},
+             {"created_at": last_created_at, "_id": {"$lt": last_id}}]}
+
+so with an index on the sort keys every page costs the same as the first.
+Cursors handed to clients are those sort-key values, encoded as opaque
+URL-safe strings; every paginated response carries `next_cursor`, which is
+None on the last page.
+"""
+import base64
+import binascii
+
+from bson import json_util
+from bson.errors import InvalidId
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    """Opaque cursor for a dict of sort-key values (ObjectIds and datetimes included)."""
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """The values of a cursor from encode_cursor, or None for no cursor (first page)."""
+    if cursor is None or cursor == "":
+        return None
+    if not isinstance(cursor, str):
+        raise InvalidCursor("Invalid cursor")
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json_util.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, InvalidId) as e:
+        raise InvalidCursor(f"Invalid cursor: {e}")
+    if not isinstance(values, dict):
+        raise InvalidCursor("Invalid cursor")
+    return values
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE):
+    """Parse a `limit` query argument, capped at MAX_PAGE_SIZE."""
+    if value is None:
+        return default
+    limit = int(value)
+    if limit <= 0:
+        raise ValueError("Limit must be greater than 0")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def after(sort, values):
+    """
+    Filter matching the documents that come after `values` in the `sort`
+    order, a list of (field, 1 or -1) pairs ending with a unique field.
+    """
+    if not values:
+        return {}
+    if any(field not in values for field, _ in sort):
+        raise InvalidCursor("Cursor does not match this listing")
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {previous: values[previous] for previous, _ in sort[:i]}
+        clause[field] = {"$gt" if direction > 0 else "$lt": values[field]}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+
+def cursor_for(doc, sort):
+    return encode_cursor({field: doc[field] for field, _ in sort})
+
+
+def split_page(docs, limit, sort):
+    """
+    Trim a result read with limit + 1 to `limit` documents. Returns
+    (docs, next_cursor), next_cursor being None when nothing follows.
+    """
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    return docs, cursor_for(docs[-1], sort)
+
+
+def find_page(collection, query, sort, limit, cursor_values=None, projection=None):
+    """One page of `collection.find(query)` in `sort` order. Returns (docs, next_cursor)."""
+    keyset = after(sort, cursor_values)
+    if keyset:
+        query = {"$and": [query, keyset]}
+    docs = list(collection.find(query, projection).sort(sort).limit(limit + 1))
+    return split_page(docs, limit, sort)
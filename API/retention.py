@@ -0,0 +1,26 @@
+"""
+How long the API keeps expiring documents.
+
+Sessions and password resets carry their own expires_at, set from the
+lifetimes below; notifications and activity logs are kept for a retention
+period counted from created_at / timestamp. Mongo TTL indexes (declared in
+indexes.py) delete them once expired, so no application code sweeps them.
+A retention of 0 keeps documents forever: the TTL index is then dropped
+if an earlier setting had built it.
+"""
+import datetime
+
+from decouple import config
+
+SESSION_TTL_DAYS = config("SESSION_TTL_DAYS", default=7, cast=int)
+PASSWORD_RESET_TTL_HOURS = config("PASSWORD_RESET_TTL_HOURS", default=1, cast=int)
+NOTIFICATION_RETENTION_DAYS = config("NOTIFICATION_RETENTION_DAYS", default=90, cast=int)
+ACTIVITY_LOG_RETENTION_DAYS = config("ACTIVITY_LOG_RETENTION_DAYS", default=365, cast=int)
+
+SESSION_TTL = datetime.timedelta(days=SESSION_TTL_DAYS)
+PASSWORD_RESET_TTL = datetime.timedelta(hours=PASSWORD_RESET_TTL_HOURS)
+
+
+def expire_after_seconds(days):
+    """TTL index option for a retention in days, or None to keep documents forever."""
+    return days * 24 * 3600 if days > 0 else None
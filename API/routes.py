@@ -1,12 +1,37 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g
 from werkzeug.security import generate_password_hash, check_password_hash
 import uuid
+import datetime
 from model import User, PasswordReset, Session, ActivityLog, Content, Connection, Notification
 from bson.errors import InvalidId
+from retention import SESSION_TTL
+from session_cache import get_verifier, request_token, require_session
+from pagination import InvalidCursor, decode_cursor, page_size, encode_cursor
+from search_backends import get_backend
+from federated_search import federated_search
+from fanout import publish
 
 #create a Blueprint for the routes
 routes = Blueprint('routes', __name__)
 
+MAX_BULK_ITEMS = 1000
+
+def bulk_items():
+    """The items of a bulk request, or an error response."""
+    data = request.json
+    items = data.get('items') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return None, (jsonify({"success": False, "error": "A non-empty list of items is required"}), 400)
+    if len(items) > MAX_BULK_ITEMS:
+        return None, (jsonify({"success": False, "error": f"At most {MAX_BULK_ITEMS} items per request"}), 413)
+    return items, None
+
+def bulk_response(results):
+    failed = sum(1 for result in results if "error" in result)
+    success = failed == 0
+    body = {"success": success, "accepted": len(results) - failed, "failed": failed, "results": results}
+    return jsonify(body), 200 if success else 207
+
 #user registration
 @routes.route('/register', methods=['POST'])
 def register_user():
@@ -32,10 +57,28 @@ def login_user():
     if user and check_password_hash(user['hashed_password'], data['password']):
         session_token = str(uuid.uuid4())
         Session.create_session(user_id=user["_id"], session_token=session_token)
-        return jsonify({"message": "Login successful", "session_token": session_token}), 200
+        expires_at = datetime.datetime.utcnow() + SESSION_TTL
+        token = get_verifier().issue(session_token, user["_id"], expires_at)
+        return jsonify({"message": "Login successful", "session_token": token}), 200
 
     return jsonify({"error": "Invalid username or password"}), 401
 
+#user logout
+@routes.route('/logout', methods=['POST'])
+def logout_user():
+    token = request_token()
+    if not token:
+        return jsonify({"success": False, "error": "Session token is required"}), 400
+    if not get_verifier().logout(token):
+        return jsonify({"success": False, "error": "Invalid or expired session"}), 401
+    return jsonify({"message": "Logged out successfully"}), 200
+
+#current session
+@routes.route('/session', methods=['GET'])
+@require_session
+def get_current_session():
+    return jsonify({"user_id": g.session["user_id"], "expires_at": g.session["expires_at"].isoformat()}), 200
+
 #password reset request
 @routes.route('/password-reset', methods=['POST'])
 def request_password_reset():
@@ -70,25 +113,115 @@ def create_content():
         tags=data.get('tags', []),
         visibility=data.get('visibility', 'public')
     )
+    #followers are notified by the fan-out workers, after the response
+    publish("content", user_id=data['user_id'], content_id=str(content.inserted_id),
+            visibility=data.get('visibility', 'public'))
     return jsonify({"message": "Content created successfully", "content_id": str(content.inserted_id)}), 201
 
-#ollow or unfollow a user
+#create many content entries at once
+@routes.route('/content/bulk', methods=['POST'])
+def create_content_bulk():
+    items, error = bulk_items()
+    if error:
+        return error
+    results = Content.create_contents(items)
+    for result in results:
+        if "content_id" in result:
+            item = items[result["index"]]
+            publish("content", user_id=item['user_id'], content_id=result["content_id"],
+                    visibility=item.get('visibility', 'public'))
+    return bulk_response(results)
+
+#follow or unfollow a user; following twice is a no-op
 @routes.route('/follow', methods=['POST'])
 def follow_user():
     data = request.json
     if data['action'] == "follow":
-        Connection.follow_user(data['follower_id'], data['followed_id'])
-        return jsonify({"message": "Followed successfully"}), 201
+        if Connection.follow_user(data['follower_id'], data['followed_id']):
+            publish("follow", follower_id=data['follower_id'], followed_id=data['followed_id'])
+            return jsonify({"message": "Followed successfully"}), 201
+        return jsonify({"message": "Already following"}), 200
     elif data['action'] == "unfollow":
         Connection.unfollow_user(data['follower_id'], data['followed_id'])
         return jsonify({"message": "Unfollowed successfully"}), 200
     return jsonify({"error": "Invalid action"}), 400
 
-#unread notifications
+#follow or unfollow many users at once
+@routes.route('/follow/bulk', methods=['POST'])
+def follow_users_bulk():
+    items, error = bulk_items()
+    if error:
+        return error
+    results = Connection.apply_follows(items)
+    for result in results:
+        if result.get("created"):
+            item = items[result["index"]]
+            publish("follow", follower_id=item['follower_id'], followed_id=item['followed_id'])
+    return bulk_response(results)
+
+def follow_page(list_connections, user_id, key):
+    try:
+        limit = page_size(request.args.get('limit'))
+        cursor = decode_cursor(request.args.get('cursor'))
+        connections, next_cursor = list_connections(user_id, limit, cursor)
+    except InvalidCursor as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except InvalidId:
+        return jsonify({"success": False, "error": "Invalid user id"}), 400
+    except ValueError:
+        return jsonify({"success": False, "error": "Limit must be a positive integer"}), 400
+    return jsonify({key: connections, "next_cursor": next_cursor}), 200
+
+#users following a user, most recent first
+@routes.route('/users/<user_id>/followers', methods=['GET'])
+def get_followers(user_id):
+    return follow_page(Connection.get_followers, user_id, "followers")
+
+#users a user follows, most recent first
+@routes.route('/users/<user_id>/following', methods=['GET'])
+def get_following(user_id):
+    return follow_page(Connection.get_following, user_id, "following")
+
+#unread notifications, one page at a time
 @routes.route('/notifications/unread/<user_id>', methods=['GET'])
 def get_unread_notifications(user_id):
-    notifications = Notification.get_unread_notifications(user_id)
-    return jsonify({"unread_notifications": notifications}), 200
+    try:
+        limit = page_size(request.args.get('limit'))
+        cursor = decode_cursor(request.args.get('cursor'))
+        notifications, next_cursor = Notification.get_unread_notifications(user_id, limit, cursor)
+    except InvalidCursor as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except InvalidId:
+        return jsonify({"success": False, "error": "Invalid user id"}), 400
+    except ValueError:
+        return jsonify({"success": False, "error": "Limit must be a positive integer"}), 400
+    return jsonify({"unread_notifications": notifications, "next_cursor": next_cursor}), 200
+
+#number of unread notifications, for badges; capped at Notification.UNREAD_COUNT_CAP
+@routes.route('/notifications/unread/<user_id>/count', methods=['GET'])
+def count_unread_notifications(user_id):
+    try:
+        count = Notification.count_unread(user_id)
+    except InvalidId:
+        return jsonify({"success": False, "error": "Invalid user id"}), 400
+    return jsonify({"unread_count": count, "capped": count >= Notification.UNREAD_COUNT_CAP}), 200
+
+#mark the given notifications of a user as read, or all of them with {"all": true}
+@routes.route('/notifications/read-many/<user_id>', methods=['POST'])
+def mark_notifications_as_read(user_id):
+    data = request.json or {}
+    ids = data.get('ids')
+    if data.get('all') is True:
+        ids = None
+    elif not isinstance(ids, list) or not ids:
+        return jsonify({"success": False, "error": "Provide a non-empty list of ids or \"all\": true"}), 400
+    elif len(ids) > MAX_BULK_ITEMS:
+        return jsonify({"success": False, "error": f"At most {MAX_BULK_ITEMS} ids per request"}), 413
+    try:
+        modified = Notification.mark_many_as_read(user_id, ids)
+    except (InvalidId, TypeError):
+        return jsonify({"success": False, "error": "Invalid notification or user id"}), 400
+    return jsonify({"message": "Notifications marked as read", "modified": modified}), 200
 
 #notification as read
 @routes.route('/notifications/read/<notification_id>', methods=['POST'])
@@ -96,55 +229,79 @@ def mark_notification_as_read(notification_id):
     Notification.mark_as_read(notification_id)
     return jsonify({"message": "Notification marked as read"}), 200
 
-#recent activity logs
+#recent activity logs, one page at a time
 @routes.route('/activity/<user_id>', methods=['GET'])
 def get_activity_logs(user_id):
-    logs = ActivityLog.get_recent_logs(user_id, limit=10)
-    return jsonify({"activity_logs": logs}), 200
+    try:
+        limit = page_size(request.args.get('limit'), default=10)
+        cursor = decode_cursor(request.args.get('cursor'))
+        logs, next_cursor = ActivityLog.get_recent_logs(user_id, limit, cursor)
+    except InvalidCursor as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except InvalidId:
+        return jsonify({"success": False, "error": "Invalid user id"}), 400
+    except ValueError:
+        return jsonify({"success": False, "error": "Limit must be a positive integer"}), 400
+    return jsonify({"activity_logs": logs, "next_cursor": next_cursor}), 200
 
 @routes.route('/search', methods=['GET'])
 def search():
     query = request.args.get('query', '').strip()
     search_type = request.args.get('type', 'all')  # 'profiles', 'content', or 'all'
-    limit = int(request.args.get('limit', 10))
-    skip = int(request.args.get('skip', 0))
 
     # Validate input
     if not query:
         return jsonify({"success": False, "error": "Search query is required"}), 400
     if search_type not in ['profiles', 'content', 'all']:
         return jsonify({"success": False, "error": "Invalid search type"}), 400
-    if limit <= 0 or skip < 0:
-        return jsonify({"success": False, "error": "Limit must be greater than 0 and skip must be non-negative"}), 400
+    try:
+        limit = page_size(request.args.get('limit', 10), default=10)
+        # One cursor per result type; a type missing from the cursor has no more pages
+        cursors = decode_cursor(request.args.get('cursor'))
+    except InvalidCursor as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except ValueError:
+        return jsonify({"success": False, "error": "Limit must be greater than 0"}), 400
+
+    types = ['profiles', 'content'] if search_type == 'all' else [search_type]
+    if cursors is not None:
+        types = [t for t in types if t in cursors]
 
-    # Perform search
+    # Perform search with the configured backend (see search_backends.py)
     results = {}
+    next_cursors = {}
     try:
-        if search_type in ['profiles', 'all']:
-            profiles = User.collection.aggregate([
-                {"$search": {"text": {"query": query, "path": ["username", "profile.full_name", "bio"]}}},
-                {"$project": {"username": 1, "profile": 1, "score": {"$meta": "searchScore"}}},
-                {"$sort": {"score": -1}},
-                {"$skip": skip},
-                {"$limit": limit}
-            ])
-            results["profiles"] = list(profiles)
-
-        if search_type in ['content', 'all']:
-            content = Content.collection.aggregate([
-                {"$search": {"text": {"query": query, "path": ["text", "tags"]}}},
-                {"$project": {"text": 1, "tags": 1, "user_id": 1, "score": {"$meta": "searchScore"}}},
-                {"$sort": {"score": -1}},
-                {"$skip": skip},
-                {"$limit": limit}
-            ])
-            results["content"] = list(content)
-
-        return jsonify({"success": True, "data": results}), 200
+        backend = get_backend()
+        for kind in types:
+            results[kind], next_cursors[kind] = backend.search(
+                kind, query, limit, cursors and decode_cursor(cursors[kind]))
+
+        remaining = {t: c for t, c in next_cursors.items() if c}
+        next_cursor = encode_cursor(remaining) if remaining else None
+        return jsonify({"success": True, "data": results, "next_cursor": next_cursor}), 200
 
+    except InvalidCursor as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+#search Mongo content and Dgraph posts together
+@routes.route('/search/federated', methods=['GET'])
+def search_federated():
+    query = request.args.get('query', '').strip()
+    if not query:
+        return jsonify({"success": False, "error": "Search query is required"}), 400
+    try:
+        limit = page_size(request.args.get('limit', 10), default=10)
+    except ValueError:
+        return jsonify({"success": False, "error": "Limit must be greater than 0"}), 400
+
+    results, backends = federated_search(query, limit)
+    if not any(status["status"] == "ok" for status in backends.values()):
+        return jsonify({"success": False, "error": "No search backend available", "backends": backends}), 503
+    partial = any(status["status"] != "ok" for status in backends.values())
+    return jsonify({"success": True, "data": results, "partial": partial, "backends": backends}), 200
+
 #ui
 @routes.route('/ui-preferences/<user_id>', methods=['GET', 'POST'])
 def manage_ui_preferences(user_id):
@@ -0,0 +1,440 @@
+"""
+Pluggable search backends for /search.
+
+SEARCH_BACKEND picks one:
+
+- "atlas": Atlas Search ($search); only available on MongoDB Atlas.
+- "text": standard $text indexes (declared in indexes.py); works on any
+  mongod, including the plain `mongo` container.
+- "local": an in-process inverted index over user profiles and content,
+  ranked with BM25. Documents are indexed as this process's models write
+  them. A periodic catch-up picks up what other processes wrote: documents
+  whose updated_at is past the last catch-up, and deletions, which are
+  recorded in the search_deletions collection. The index is snapshotted to
+  disk (JSON) so a restart doesn't rebuild it from scratch.
+
+Pages are ordered by score, best first. "atlas" pages with $search's
+searchAfter token, so a deep page costs the same as the first. "text" and
+"local" order by (score desc, _id asc) with keyset cursors (see
+pagination.py), but a score only exists once a document has been matched:
+every page still scores all matches and keeps the best ones up to the end of
+the page (a bounded top-k sort), so deep pages of a broad query cost more
+than the first.
+"""
+import atexit
+import datetime
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from bson import json_util
+from bson.objectid import ObjectId
+from decouple import config
+
+from mongo import get_db
+from pagination import InvalidCursor, after, encode_cursor, split_page
+
+logger = logging.getLogger("search")
+
+SEARCH_BACKEND = config("SEARCH_BACKEND", default="text")
+SEARCH_SNAPSHOT_PATH = config("SEARCH_SNAPSHOT_PATH", default="search_index.json")
+SEARCH_REFRESH_SECONDS = config("SEARCH_REFRESH_SECONDS", default=30, cast=int)
+SEARCH_SNAPSHOT_SECONDS = config("SEARCH_SNAPSHOT_SECONDS", default=300, cast=int)
+# Catch-up re-reads this far behind its last run, for clock skew between
+# processes and writes that were in flight when it ran
+SEARCH_CATCH_UP_OVERLAP_SECONDS = config("SEARCH_CATCH_UP_OVERLAP_SECONDS", default=60, cast=int)
+# How long deletions are kept for other processes (0: forever); an older snapshot is rebuilt instead
+SEARCH_DELETIONS_RETENTION_DAYS = config("SEARCH_DELETIONS_RETENTION_DAYS", default=7, cast=int)
+SEARCH_DELETIONS = "search_deletions"
+
+SEARCH_ORDER = [("score", -1), ("_id", 1)]
+
+# What each result type searches and returns
+SEARCH_TYPES = {
+    "profiles": {
+        "collection": "users",
+        "paths": ["username", "profile.full_name", "profile.bio"],
+        "projection": {"username": 1, "profile": 1},
+    },
+    "content": {
+        "collection": "content",
+        "paths": ["text", "tags"],
+        "projection": {"text": 1, "tags": 1, "user_id": 1},
+    },
+}
+KIND_BY_COLLECTION = {spec["collection"]: kind for kind, spec in SEARCH_TYPES.items()}
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if len(token) > 1]
+
+
+def field_values(doc, path):
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return []
+        value = value.get(part)
+    if value is None:
+        return []
+    return [str(v) for v in value] if isinstance(value, list) else [str(value)]
+
+
+def check_cursor(cursor):
+    """A decoded (score, _id) cursor, or InvalidCursor if its values have the wrong types."""
+    if cursor is None:
+        return None
+    score, doc_id = cursor.get("score"), cursor.get("_id")
+    if isinstance(score, bool) or not isinstance(score, (int, float)) or not isinstance(doc_id, ObjectId):
+        raise InvalidCursor("Cursor does not match this listing")
+    return cursor
+
+
+def document_tokens(kind, doc):
+    return [token for path in SEARCH_TYPES[kind]["paths"] for value in field_values(doc, path)
+            for token in tokenize(value)]
+
+
+class SearchBackend:
+    def search(self, kind, query, limit, cursor=None):
+        """One page of results. Returns (docs with a "score", next_cursor)."""
+        raise NotImplementedError
+
+    def index(self, kind, doc):
+        """Called by the models after a document is written."""
+
+    def reindex(self, kind, doc_id):
+        """Called by the models after a document is updated in place."""
+
+    def remove(self, kind, doc_id):
+        """Called by the models after a document is deleted."""
+
+
+class AggregationBackend(SearchBackend):
+    def stages(self, kind, query):
+        """Pipeline stages matching `query` and adding a "score" field."""
+        raise NotImplementedError
+
+    def search(self, kind, query, limit, cursor=None):
+        spec = SEARCH_TYPES[kind]
+        pipeline = self.stages(kind, query) + [{"$sort": dict(SEARCH_ORDER)}]
+        keyset = after(SEARCH_ORDER, check_cursor(cursor))
+        if keyset:
+            pipeline.append({"$match": keyset})
+        pipeline.append({"$limit": limit + 1})
+        docs = list(get_db()[spec["collection"]].aggregate(pipeline))
+        return split_page(docs, limit, SEARCH_ORDER)
+
+
+class AtlasSearchBackend(SearchBackend):
+    """Pages with searchAfter: the cursor is the last result's searchSequenceToken."""
+
+    def search(self, kind, query, limit, cursor=None):
+        spec = SEARCH_TYPES[kind]
+        search = {"text": {"query": query, "path": spec["paths"]}}
+        if cursor is not None:
+            if not isinstance(cursor.get("token"), str):
+                raise InvalidCursor("Cursor does not match this listing")
+            search["searchAfter"] = cursor["token"]
+        pipeline = [
+            {"$search": search},
+            {"$limit": limit + 1},
+            {"$project": {**spec["projection"], "score": {"$meta": "searchScore"},
+                          "token": {"$meta": "searchSequenceToken"}}},
+        ]
+        docs = list(get_db()[spec["collection"]].aggregate(pipeline))
+        next_cursor = None
+        if len(docs) > limit:
+            docs = docs[:limit]
+            next_cursor = encode_cursor({"token": docs[-1]["token"]})
+        for doc in docs:
+            del doc["token"]
+        return docs, next_cursor
+
+
+class TextIndexBackend(AggregationBackend):
+    def stages(self, kind, query):
+        return [
+            {"$match": {"$text": {"$search": query}}},
+            {"$project": {**SEARCH_TYPES[kind]["projection"], "score": {"$meta": "textScore"}}},
+        ]
+
+
+class InvertedIndex:
+    """Term -> {doc id: term frequency} postings with BM25 ranking."""
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.lengths = {}
+        self.terms = {}
+        self.stored = {}
+        self.total_length = 0
+
+    def add(self, doc_id, tokens, stored):
+        self.add_counts(doc_id, Counter(tokens), stored)
+
+    def add_counts(self, doc_id, counts, stored):
+        self.remove(doc_id)
+        for term, count in counts.items():
+            self.postings[term][doc_id] = count
+        self.terms[doc_id] = list(counts)
+        length = sum(counts.values())
+        self.lengths[doc_id] = length
+        self.total_length += length
+        self.stored[doc_id] = stored
+
+    def remove(self, doc_id):
+        if doc_id not in self.lengths:
+            return
+        for term in self.terms.pop(doc_id):
+            postings = self.postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self.postings[term]
+        self.total_length -= self.lengths.pop(doc_id)
+        del self.stored[doc_id]
+
+    def to_document(self):
+        return [
+            {"_id": doc_id, "counts": {term: self.postings[term][doc_id] for term in terms},
+             "stored": self.stored[doc_id]}
+            for doc_id, terms in self.terms.items()
+        ]
+
+    @classmethod
+    def from_document(cls, docs):
+        index = cls()
+        for doc in docs:
+            index.add_counts(doc["_id"], doc["counts"], doc["stored"])
+        return index
+
+    def scores(self, tokens):
+        n = len(self.lengths)
+        if not n:
+            return {}
+        average_length = self.total_length / n
+        scores = defaultdict(float)
+        for term in set(tokens):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                norm = self.K1 * (1 - self.B + self.B * self.lengths[doc_id] / average_length)
+                scores[doc_id] += idf * tf * (self.K1 + 1) / (tf + norm)
+        return scores
+
+
+class LocalSearchBackend(SearchBackend):
+    def __init__(self, snapshot_path=SEARCH_SNAPSHOT_PATH, refresh_seconds=SEARCH_REFRESH_SECONDS,
+                 snapshot_seconds=SEARCH_SNAPSHOT_SECONDS):
+        self.snapshot_path = snapshot_path
+        self.refresh_seconds = refresh_seconds
+        self.snapshot_seconds = snapshot_seconds
+        self.indexes = {kind: InvertedIndex() for kind in SEARCH_TYPES}
+        # When the last catch-up started; the next one reads what changed since
+        self.synced_at = None
+        # Guards the indexes; held only for in-memory work, never across Mongo reads or file I/O
+        self.lock = threading.RLock()
+        # One load / catch-up / snapshot at a time
+        self.refresh_lock = threading.Lock()
+        self.loaded = False
+        self.refreshed_at = 0
+        self.saved_at = time.monotonic()
+        self.dirty = False
+
+    def _stored(self, kind, doc):
+        return {field: doc.get(field) for field in SEARCH_TYPES[kind]["projection"]}
+
+    def index(self, kind, doc):
+        with self.lock:
+            self.indexes[kind].add(doc["_id"], document_tokens(kind, doc), self._stored(kind, doc))
+            self.dirty = True
+
+    def reindex(self, kind, doc_id):
+        doc = get_db()[SEARCH_TYPES[kind]["collection"]].find_one({"_id": doc_id}, self.fields(kind))
+        if doc is None:
+            self.forget(kind, doc_id)
+        else:
+            self.index(kind, doc)
+
+    def remove(self, kind, doc_id):
+        # Other processes learn about the deletion on their next catch-up
+        get_db()[SEARCH_DELETIONS].insert_one({
+            "collection": SEARCH_TYPES[kind]["collection"],
+            "doc_id": doc_id,
+            "deleted_at": datetime.datetime.utcnow(),
+        })
+        self.forget(kind, doc_id)
+
+    def forget(self, kind, doc_id):
+        with self.lock:
+            self.indexes[kind].remove(doc_id)
+            self.dirty = True
+
+    @staticmethod
+    def fields(kind):
+        spec = SEARCH_TYPES[kind]
+        fields = dict(spec["projection"])
+        # e.g. "profile.bio" is already read with "profile"; projecting both is a path collision
+        for path in spec["paths"]:
+            if not any(path == field or path.startswith(field + ".") for field in fields):
+                fields[path] = 1
+        return fields
+
+    def load_snapshot(self):
+        if not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as file:
+                snapshot = json_util.loads(file.read())
+            indexes = {kind: InvertedIndex.from_document(snapshot["indexes"][kind]) for kind in SEARCH_TYPES}
+            synced_at = snapshot["synced_at"]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error(f"Ignoring unreadable search snapshot {self.snapshot_path}: {str(e)}")
+            return False
+        # Deletions this old may already be gone from search_deletions (0 keeps them forever)
+        age = datetime.datetime.utcnow() - synced_at
+        if SEARCH_DELETIONS_RETENTION_DAYS > 0 and age > datetime.timedelta(days=SEARCH_DELETIONS_RETENTION_DAYS):
+            logger.info(f"Ignoring search snapshot {self.snapshot_path} from {synced_at}, rebuilding")
+            return False
+        with self.lock:
+            self.indexes, self.synced_at = indexes, synced_at
+        logger.info(f"Search index loaded from {self.snapshot_path}")
+        return True
+
+    def save_snapshot(self):
+        with self.lock:
+            snapshot = {
+                "indexes": {kind: index.to_document() for kind, index in self.indexes.items()},
+                "synced_at": self.synced_at,
+            }
+            self.dirty = False
+            self.saved_at = time.monotonic()
+        data = json_util.dumps(snapshot)
+        tmp = self.snapshot_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as file:
+            file.write(data)
+        os.replace(tmp, self.snapshot_path)
+
+    def catch_up(self):
+        """
+        Apply what was written, updated or deleted since the last catch-up
+        (or index everything, the first time). Documents are indexed one at a
+        time as they are read, so index() from request threads interleaves
+        with it; a version read before a concurrent write may briefly replace
+        the newer one, until the next catch-up re-reads it (its updated_at is
+        within the overlap).
+        """
+        db = get_db()
+        started = datetime.datetime.utcnow()
+        since = None
+        if self.synced_at is not None:
+            since = self.synced_at - datetime.timedelta(seconds=SEARCH_CATCH_UP_OVERLAP_SECONDS)
+        changed = removed = 0
+        for kind, spec in SEARCH_TYPES.items():
+            query = {"updated_at": {"$gte": since}} if since else {}
+            for doc in db[spec["collection"]].find(query, self.fields(kind)):
+                self.index(kind, doc)
+                changed += 1
+        if since:
+            for deletion in db[SEARCH_DELETIONS].find({"deleted_at": {"$gte": since}}):
+                kind = KIND_BY_COLLECTION.get(deletion["collection"])
+                if kind is not None:
+                    self.forget(kind, deletion["doc_id"])
+                    removed += 1
+        self.synced_at = started
+        self.refreshed_at = time.monotonic()
+        if changed or removed:
+            logger.info(f"Search index caught up on {changed} documents and {removed} deletions")
+
+    def _refresh_if_stale(self):
+        # The first search waits for the index to be loaded; later ones don't
+        # wait for a catch-up another thread is already running
+        if not self.refresh_lock.acquire(blocking=not self.loaded):
+            return
+        try:
+            if not self.loaded:
+                self.load_snapshot()
+                self.catch_up()
+                self.loaded = True
+            elif time.monotonic() - self.refreshed_at >= self.refresh_seconds:
+                self.catch_up()
+            if self.dirty and time.monotonic() - self.saved_at >= self.snapshot_seconds:
+                self.save_snapshot()
+        finally:
+            self.refresh_lock.release()
+
+    def search(self, kind, query, limit, cursor=None):
+        self._refresh_if_stale()
+        index = self.indexes[kind]
+        with self.lock:
+            scores = index.scores(tokenize(query))
+            ranked = [{"_id": doc_id, **index.stored[doc_id], "score": score} for doc_id, score in scores.items()]
+        ranked.sort(key=lambda doc: (-doc["score"], doc["_id"]))
+        if check_cursor(cursor):
+            position = (-cursor["score"], cursor["_id"])
+            ranked = [doc for doc in ranked if (-doc["score"], doc["_id"]) > position]
+        return split_page(ranked[:limit + 1], limit, SEARCH_ORDER)
+
+
+BACKENDS = {
+    "atlas": AtlasSearchBackend,
+    "text": TextIndexBackend,
+    "local": LocalSearchBackend,
+}
+
+_backend = None
+_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _lock:
+            if _backend is None:
+                if SEARCH_BACKEND not in BACKENDS:
+                    raise ValueError(f"Unknown SEARCH_BACKEND {SEARCH_BACKEND!r}, expected one of {list(BACKENDS)}")
+                _backend = BACKENDS[SEARCH_BACKEND]()
+                if isinstance(_backend, LocalSearchBackend):
+                    atexit.register(_save_on_exit, _backend)
+    return _backend
+
+
+def _save_on_exit(backend):
+    if backend.loaded and backend.dirty:
+        backend.save_snapshot()
+
+
+def index_document(collection_name, doc):
+    """Model hook: a document of `collection_name` was inserted or updated."""
+    try:
+        get_backend().index(KIND_BY_COLLECTION[collection_name], doc)
+    except Exception as e:
+        # Search is best effort; the write itself already succeeded
+        logger.error(f"Failed to index {collection_name} document: {str(e)}")
+
+
+def reindex_document(collection_name, doc_id):
+    """Model hook: a document of `collection_name` was updated."""
+    try:
+        get_backend().reindex(KIND_BY_COLLECTION[collection_name], doc_id)
+    except Exception as e:
+        logger.error(f"Failed to reindex {collection_name} document: {str(e)}")
+
+
+def remove_document(collection_name, doc_id):
+    """Model hook: a document of `collection_name` was deleted."""
+    try:
+        get_backend().remove(KIND_BY_COLLECTION[collection_name], doc_id)
+    except Exception as e:
+        logger.error(f"Failed to remove {collection_name} document from the search index: {str(e)}")
@@ -0,0 +1,170 @@
+"""
+Session token verification for authenticated requests.
+
+SessionVerifier sits in front of the sessions collection with a bounded LRU
+cache: a valid token is served from memory for up to SESSION_CACHE_TTL_SECONDS
+(never past the session's own expires_at), and an unknown or expired token is
+remembered as invalid for SESSION_NEGATIVE_TTL_SECONDS, so repeated bad tokens
+don't reach Mongo either. Logging out deletes the session and drops it from
+this process's cache at once; other processes notice within the cache TTL.
+
+When SESSION_JWT_SECRET is set, login hands out a signed JWT carrying the
+session token and its expiry instead of the bare token. Forged, tampered or
+expired tokens are then rejected without any I/O; a valid one still goes
+through the cached session lookup above, so a logout in any process is
+honoured everywhere within the cache TTL, as with bare tokens.
+
+    @routes.route('/me')
+    @require_session
+    def me():
+        return jsonify({"user_id": g.session["user_id"]})
+"""
+import datetime
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+import jwt
+from decouple import config
+from flask import g, jsonify, request
+
+from model import Session
+
+SESSION_CACHE_SIZE = config("SESSION_CACHE_SIZE", default=10000, cast=int)
+SESSION_CACHE_TTL_SECONDS = config("SESSION_CACHE_TTL_SECONDS", default=60, cast=int)
+SESSION_NEGATIVE_TTL_SECONDS = config("SESSION_NEGATIVE_TTL_SECONDS", default=30, cast=int)
+SESSION_JWT_SECRET = config("SESSION_JWT_SECRET", default="")
+JWT_ALGORITHM = "HS256"
+
+INVALID = object()
+
+
+class TTLCache:
+    """Bounded LRU of key -> value, each entry expiring after its own TTL."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        if ttl <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+
+class SessionVerifier:
+    def __init__(self, maxsize=SESSION_CACHE_SIZE, ttl=SESSION_CACHE_TTL_SECONDS,
+                 negative_ttl=SESSION_NEGATIVE_TTL_SECONDS, secret=SESSION_JWT_SECRET):
+        self.cache = TTLCache(maxsize)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.secret = secret
+
+    def issue(self, session_token, user_id, expires_at):
+        """The token handed to the client: a signed JWT if a secret is configured, else the session token."""
+        if not self.secret:
+            return session_token
+        claims = {"sid": session_token, "sub": str(user_id), "exp": expires_at}
+        return jwt.encode(claims, self.secret, algorithm=JWT_ALGORITHM)
+
+    def session_token(self, token):
+        """The session token behind a client token, or None if a JWT fails verification."""
+        if not self.secret:
+            return token
+        try:
+            return jwt.decode(token, self.secret, algorithms=[JWT_ALGORITHM])["sid"]
+        except jwt.InvalidTokenError:
+            return None
+
+    def verify(self, token):
+        """
+        Return {"session_token", "user_id", "expires_at"} for a valid token, or None.
+        """
+        if not token:
+            return None
+        token = self.session_token(token)
+        if token is None:
+            return None
+        cached = self.cache.get(token)
+        if cached is INVALID:
+            return None
+        if cached is not None:
+            return cached
+
+        # A logged-out session has been deleted, whichever process handled the logout
+        session = Session.find_session(token)
+        if session is None:
+            self.cache.set(token, INVALID, self.negative_ttl)
+            return None
+        verified = {
+            "session_token": token,
+            "user_id": str(session["user_id"]),
+            "expires_at": session["expires_at"],
+        }
+        remaining = (session["expires_at"] - datetime.datetime.utcnow()).total_seconds()
+        self.cache.set(token, verified, min(self.ttl, remaining))
+        return verified
+
+    def invalidate(self, session_token):
+        """Forget a session in this process, e.g. on logout."""
+        self.cache.pop(session_token)
+        self.cache.set(session_token, INVALID, self.negative_ttl)
+
+    def logout(self, token):
+        """Delete the session behind `token`. Returns False if the token was not valid."""
+        session_token = self.session_token(token)
+        if session_token is None:
+            return False
+        deleted = Session.delete_session(session_token)
+        self.invalidate(session_token)
+        return deleted > 0
+
+
+_verifier = None
+
+
+def get_verifier():
+    global _verifier
+    if _verifier is None:
+        _verifier = SessionVerifier()
+    return _verifier
+
+
+def request_token():
+    """The client token from `Authorization: Bearer <token>`, or None."""
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    return token.strip() if scheme.lower() == "bearer" and token.strip() else None
+
+
+def require_session(view):
+    """Reject requests without a valid session token; the session is available as g.session."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        session = get_verifier().verify(request_token())
+        if session is None:
+            return jsonify({"success": False, "error": "Invalid or expired session"}), 401
+        g.session = session
+        return view(*args, **kwargs)
+    return wrapper
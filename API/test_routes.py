@@ -2,7 +2,15 @@ import pytest
 from bson.objectid import ObjectId
 import datetime
 from app import app  
-from model import User, Content, Notification, Connection
+from model import User, Content, Notification, Connection, ActivityLog
+from fanout import get_fanout
+from activity_writer import get_activity_writer
+from pagination import encode_cursor
+from indexes import ensure_indexes
+import session_cache
+from werkzeug.security import generate_password_hash
+from session_cache import SessionVerifier
+from model import Session
 
 @pytest.fixture
 def client():
@@ -181,3 +189,239 @@ def test_mark_notification_as_read(client):
 
     notification = Notification.collection.find_one({"_id": ObjectId(notification_id)})
     assert notification["is_read"] is True
+
+def test_ingest_events_requires_list(client):
+    response = client.post('/events', json={"events": []})
+    data = response.get_json()
+
+    assert response.status_code == 400
+    assert data["success"] is False
+    assert "error" in data
+
+def test_search_suggest_missing_prefix(client):
+    response = client.get('/search/suggest')
+    data = response.get_json()
+
+    assert response.status_code == 400
+    assert data["success"] is False
+    assert "error" in data
+
+def test_logout_requires_token(client):
+    response = client.post('/logout')
+    data = response.get_json()
+
+    assert response.status_code == 400
+    assert data["success"] is False
+
+def test_current_session_rejects_invalid_token(client):
+    response = client.get('/session', headers={"Authorization": "Bearer not-a-session"})
+    data = response.get_json()
+
+    assert response.status_code == 401
+    assert data["success"] is False
+
+def test_unread_notifications_invalid_cursor(client):
+    user_id = str(ObjectId())
+    response = client.get(f'/notifications/unread/{user_id}', query_string={"cursor": "not-a-cursor"})
+    data = response.get_json()
+
+    assert response.status_code == 400
+    assert data["success"] is False
+
+@pytest.mark.parametrize("path", ['/notifications/unread/not-an-id', '/activity/not-an-id'])
+def test_paged_routes_reject_invalid_user_id(client, path):
+    response = client.get(path)
+    data = response.get_json()
+
+    assert response.status_code == 400
+    assert data == {"success": False, "error": "Invalid user id"}
+
+def test_federated_search_missing_query(client):
+    response = client.get('/search/federated')
+    data = response.get_json()
+
+    assert response.status_code == 400
+    assert data["success"] is False
+
+def test_bulk_content_requires_items(client):
+    response = client.post('/content/bulk', json={"items": []})
+    data = response.get_json()
+
+    assert response.status_code == 400
+    assert data["success"] is False
+
+def test_bulk_content_reports_invalid_items(client):
+    user_id = str(User.collection.insert_one({"username": "poster"}).inserted_id)
+    response = client.post('/content/bulk', json={"items": [
+        {"user_id": user_id, "text": "First bulk post"},
+        {"user_id": "not-an-id", "text": "Second bulk post"},
+    ]})
+    data = response.get_json()
+
+    assert response.status_code == 207
+    assert data["accepted"] == 1
+    assert "content_id" in data["results"][0]
+    assert "error" in data["results"][1]
+
+def test_follow_twice_is_idempotent(client):
+    follower_id = str(User.collection.insert_one({"username": "follower"}).inserted_id)
+    followed_id = str(User.collection.insert_one({"username": "followed"}).inserted_id)
+    follow = {"action": "follow", "follower_id": follower_id, "followed_id": followed_id}
+
+    assert client.post('/follow', json=follow).status_code == 201
+    response = client.post('/follow', json=follow)
+
+    assert response.status_code == 200
+    assert response.get_json()["message"] == "Already following"
+    assert Connection.collection.count_documents({"followed_id": ObjectId(followed_id)}) == 1
+    assert User.collection.find_one({"_id": ObjectId(followed_id)})["follower_count"] == 1
+
+    response = client.get(f'/users/{followed_id}/followers')
+    data = response.get_json()
+    assert response.status_code == 200
+    assert [f["username"] for f in data["followers"]] == ["follower"]
+    assert data["next_cursor"] is None
+
+def test_content_notifies_followers(client):
+    author_id = User.collection.insert_one({"username": "author"}).inserted_id
+    follower_id = User.collection.insert_one({"username": "reader"}).inserted_id
+    Connection.collection.insert_one({"follower_id": follower_id, "followed_id": author_id})
+
+    response = client.post('/content', json={"user_id": str(author_id), "text": "Fan-out post"})
+    assert response.status_code == 201
+    get_fanout().join()
+
+    notification = Notification.collection.find_one({"user_id": follower_id})
+    assert notification["message"] == "author posted something new"
+    assert notification["is_read"] is False
+
+def test_count_and_mark_many_as_read(client):
+    user_id = ObjectId()
+    ids = Notification.collection.insert_many([
+        {"user_id": user_id, "message": f"Note {i}", "is_read": False, "created_at": datetime.datetime.utcnow()}
+        for i in range(3)
+    ]).inserted_ids
+
+    response = client.get(f'/notifications/unread/{user_id}/count')
+    assert response.get_json()["unread_count"] == 3
+
+    response = client.post(f'/notifications/read-many/{user_id}', json={"ids": [str(ids[0])]})
+    assert response.get_json()["modified"] == 1
+
+    response = client.post(f'/notifications/read-many/{user_id}', json={"all": True})
+    assert response.get_json()["modified"] == 2
+    assert client.get(f'/notifications/unread/{user_id}/count').get_json()["unread_count"] == 0
+
+def test_buffered_activity_logs(client):
+    user_id = str(ObjectId())
+    log_id = ActivityLog.log_action(user_id, "login", {"device": "Mobile"})
+    get_activity_writer().flush()
+
+    response = client.get(f'/activity/{user_id}')
+    data = response.get_json()
+
+    assert response.status_code == 200
+    assert [log["_id"] for log in data["activity_logs"]] == [str(log_id)]
+
+def test_bulk_follow_notifies_followed_users(client):
+    follower_id = str(User.collection.insert_one({"username": "bulk_follower"}).inserted_id)
+    followed_id = User.collection.insert_one({"username": "bulk_followed"}).inserted_id
+
+    response = client.post('/follow/bulk', json={"items": [
+        {"action": "follow", "follower_id": follower_id, "followed_id": str(followed_id)},
+    ]})
+    assert response.status_code == 200
+    assert response.get_json()["results"][0]["created"] is True
+    get_fanout().join()
+
+    notification = Notification.collection.find_one({"user_id": followed_id})
+    assert notification["message"] == "bulk_follower started following you"
+
+def test_search_cursor_with_wrong_value_types(client):
+    cursor = encode_cursor({"content": encode_cursor({"score": "high", "_id": str(ObjectId())})})
+    response = client.get('/search', query_string={"query": "post", "type": "content", "cursor": cursor})
+    data = response.get_json()
+
+    assert response.status_code == 400
+    assert data["success"] is False
+
+def test_users_without_email_do_not_collide_on_unique_index(client):
+    ensure_indexes()
+    User.collection.insert_one({"username": "no_email_1"})
+    User.collection.insert_one({"username": "no_email_2"})
+
+    assert User.collection.count_documents({"email": {"$exists": False}}) == 2
+
+JWT_SECRET = "test-secret-0123456789abcdef0123456789"
+
+def create_session_for(username="session_user"):
+    user_id = User.collection.insert_one({"username": username}).inserted_id
+    token = str(ObjectId())
+    Session.create_session(user_id, token)
+    return user_id, token
+
+def test_session_verifier_serves_valid_tokens_from_cache(client):
+    user_id, token = create_session_for()
+    verifier = SessionVerifier(ttl=60)
+
+    assert verifier.verify(token)["user_id"] == str(user_id)
+    # Gone from Mongo, still cached for up to the TTL
+    Session.collection.delete_one({"session_token": token})
+    assert verifier.verify(token)["user_id"] == str(user_id)
+    assert SessionVerifier(ttl=60).verify(token) is None
+
+def test_session_verifier_caches_invalid_tokens(client):
+    verifier = SessionVerifier(negative_ttl=30)
+    token = str(ObjectId())
+
+    assert verifier.verify(token) is None
+    Session.create_session(ObjectId(), token)
+    assert verifier.verify(token) is None
+    assert SessionVerifier(negative_ttl=30).verify(token) is not None
+
+def test_session_verifier_logout_invalidates_cached_session(client):
+    _, token = create_session_for()
+    verifier = SessionVerifier(ttl=60)
+    assert verifier.verify(token) is not None
+
+    assert verifier.logout(token) is True
+    assert verifier.verify(token) is None
+    assert Session.collection.find_one({"session_token": token}) is None
+    assert verifier.logout(token) is False
+
+def test_session_verifier_jwt_round_trip(client):
+    user_id, token = create_session_for()
+    verifier = SessionVerifier(secret=JWT_SECRET)
+    expires_at = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+
+    issued = verifier.issue(token, user_id, expires_at)
+
+    assert issued != token
+    assert verifier.verify(issued)["session_token"] == token
+    assert verifier.verify(issued[:-2] + ("A" if issued[-2] != "A" else "B") + issued[-1]) is None
+    assert SessionVerifier(secret=JWT_SECRET[::-1]).verify(issued) is None
+    assert verifier.logout(issued) is True
+    assert verifier.verify(issued) is None
+
+def test_login_session_and_logout_with_jwt(client, monkeypatch):
+    monkeypatch.setattr(session_cache, "_verifier", SessionVerifier(secret=JWT_SECRET))
+    User.collection.insert_one({"username": "jwt_user", "hashed_password": generate_password_hash("pw123456")})
+
+    response = client.post('/login', json={"username": "jwt_user", "password": "pw123456"})
+    assert response.status_code == 200
+    token = response.get_json()["session_token"]
+    assert token.count(".") == 2
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.get('/session', headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()["user_id"] == str(User.find_by_username("jwt_user")["_id"])
+    assert client.post('/logout', headers=headers).status_code == 200
+    assert client.get('/session', headers=headers).status_code == 401
+
+def test_login_rejects_wrong_password(client):
+    User.collection.insert_one({"username": "login_user", "hashed_password": generate_password_hash("right-password")})
+
+    response = client.post('/login', json={"username": "login_user", "password": "wrong-password"})
+
+    assert response.status_code == 401
@@ -0,0 +1,127 @@
+import pytest
+from bson.objectid import ObjectId
+import datetime
+import threading
+from mongo import get_db
+from pagination import decode_cursor
+from search_backends import SEARCH_DELETIONS, InvertedIndex, LocalSearchBackend, document_tokens
+
+@pytest.fixture
+def db():
+    db = get_db()
+    for name in ("users", "content", SEARCH_DELETIONS):
+        db[name].delete_many({})
+    yield db
+    for name in ("users", "content", SEARCH_DELETIONS):
+        db[name].delete_many({})
+
+@pytest.fixture
+def backend(tmp_path):
+    return LocalSearchBackend(snapshot_path=str(tmp_path / "search_index.json"), refresh_seconds=0)
+
+def insert_content(db, text, **fields):
+    now = datetime.datetime.utcnow()
+    doc = {"user_id": ObjectId(), "text": text, "tags": [], "created_at": now, "updated_at": now, **fields}
+    doc["_id"] = db["content"].insert_one(doc).inserted_id
+    return doc
+
+# InvertedIndex
+
+def test_inverted_index_ranks_by_bm25():
+    index = InvertedIndex()
+    index.add("often", ["mongo", "mongo", "mongo", "index"], {})
+    index.add("once", ["mongo", "cassandra", "index", "scan"], {})
+    index.add("never", ["cassandra", "scan"], {})
+
+    scores = index.scores(["mongo"])
+
+    assert set(scores) == {"often", "once"}
+    assert scores["often"] > scores["once"] > 0
+    # A term every document has is worth less than a rare one
+    assert index.scores(["scan"])["never"] < index.scores(["mongo"])["often"]
+
+def test_inverted_index_remove_and_replace():
+    index = InvertedIndex()
+    index.add(1, ["alpha", "beta"], {"text": "alpha beta"})
+    index.add(2, ["beta"], {"text": "beta"})
+    index.add(1, ["gamma"], {"text": "gamma"})
+
+    assert index.scores(["alpha"]) == {}
+    assert set(index.scores(["gamma"])) == {1}
+    index.remove(2)
+    assert index.scores(["beta"]) == {}
+    assert index.total_length == 1
+    assert "beta" not in index.postings
+
+def test_inverted_index_document_round_trip():
+    index = InvertedIndex()
+    index.add(1, document_tokens("content", {"text": "Scaling Mongo reads", "tags": ["mongo"]}), {"text": "x"})
+    index.add(2, document_tokens("content", {"text": "Cassandra scans", "tags": []}), {"text": "y"})
+
+    restored = InvertedIndex.from_document(index.to_document())
+
+    assert restored.scores(["mongo", "scans"]) == index.scores(["mongo", "scans"])
+    assert restored.stored == index.stored
+    assert restored.total_length == index.total_length
+
+# LocalSearchBackend
+
+def test_local_search_pages_with_cursor(db, backend):
+    ids = [insert_content(db, "post " + "mongo " * (i + 1))["_id"] for i in range(3)]
+
+    first, cursor = backend.search("content", "mongo", 2)
+    second, last_cursor = backend.search("content", "mongo", 2, decode_cursor(cursor))
+
+    assert [doc["_id"] for doc in first] == [ids[2], ids[1]]
+    assert [doc["_id"] for doc in second] == [ids[0]]
+    assert last_cursor is None
+    assert first[0]["score"] > first[1]["score"] > second[0]["score"]
+
+def test_local_search_catches_up_on_writes_and_deletions(db, backend):
+    kept = insert_content(db, "search me")
+    deleted = insert_content(db, "search me too")
+    assert len(backend.search("content", "search", 10)[0]) == 2
+
+    # Written and deleted by another process: only Mongo knows
+    later = datetime.datetime.utcnow()
+    db["content"].update_one({"_id": kept["_id"]}, {"$set": {"text": "edited elsewhere", "updated_at": later}})
+    db["content"].delete_one({"_id": deleted["_id"]})
+    db[SEARCH_DELETIONS].insert_one({"collection": "content", "doc_id": deleted["_id"], "deleted_at": later})
+    backend.catch_up()
+
+    assert backend.search("content", "search", 10)[0] == []
+    assert [doc["_id"] for doc in backend.search("content", "elsewhere", 10)[0]] == [kept["_id"]]
+
+def test_local_search_snapshot_round_trip(db, backend, tmp_path):
+    doc = insert_content(db, "snapshot me")
+    backend.search("content", "snapshot", 10)
+    backend.save_snapshot()
+
+    restored = LocalSearchBackend(snapshot_path=backend.snapshot_path)
+    assert restored.load_snapshot()
+    # Stored with millisecond precision, so at most 1ms earlier
+    assert datetime.timedelta(0) <= backend.synced_at - restored.synced_at < datetime.timedelta(milliseconds=1)
+    assert [d["_id"] for d in restored.search("content", "snapshot", 10)[0]] == [doc["_id"]]
+
+def test_local_index_is_not_blocked_by_a_running_catch_up(db, backend, monkeypatch):
+    backend.search("content", "anything", 10)
+    started, release = threading.Event(), threading.Event()
+
+    def slow_catch_up():
+        started.set()
+        release.wait(5)
+    monkeypatch.setattr(backend, "catch_up", slow_catch_up)
+    thread = threading.Thread(target=backend.search, args=("content", "anything", 10))
+    thread.start()
+    started.wait(5)
+
+    doc = {"_id": ObjectId(), "text": "indexed during catch-up", "tags": [], "user_id": ObjectId()}
+    indexed = threading.Thread(target=backend.index, args=("content", doc))
+    indexed.start()
+    indexed.join(1)
+    finished = not indexed.is_alive()
+    release.set()
+    thread.join(5)
+
+    assert finished
+    assert [d["_id"] for d in backend.search("content", "during", 10)[0]] == [doc["_id"]]
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Search autocomplete built from search_activity.
+
+Normalized queries are counted per day in activity_counts (metric
+"searches", dimension "query", see rollups.ROLLUPS). `build` sums the last
+`days` days, keeps the top-K completions of every prefix and writes them to
+search_autocomplete (prefix -> ranked completions). Rows carry a TTL so
+prefixes that fall out of the window disappear without explicit deletes.
+
+Suggester keeps the whole table in a dict in memory, so a lookup is a single
+dict access; it reloads it once it is older than `refresh_seconds`.
+
+    python -m Cassandra.autocomplete --days 7 --top 10
+"""
+import argparse
+import heapq
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from cassandra.query import SimpleStatement
+
+from .connection import bind, execute_with_backpressure, get_session
+from .rollups import read_counts
+from .search_terms import normalize_query
+
+AUTOCOMPLETE_TABLE = "search_autocomplete"
+
+CREATE_AUTOCOMPLETE_TABLE = f"""
+CREATE TABLE IF NOT EXISTS {AUTOCOMPLETE_TABLE} (
+    prefix TEXT PRIMARY KEY,
+    completions LIST<TEXT>,
+    scores LIST<BIGINT>
+);
+"""
+
+UPSERT = f"INSERT INTO {AUTOCOMPLETE_TABLE} (prefix, completions, scores) VALUES (?, ?, ?) USING TTL ?"
+
+DEFAULT_DAYS = 7
+DEFAULT_TOP_K = 10
+MIN_PREFIX_LENGTH = 1
+MAX_PREFIX_LENGTH = 20
+# Rows outlive a daily rebuild comfortably, but not a stopped one
+ROW_TTL_SECONDS = 3 * 24 * 3600
+
+
+def create_autocomplete_tables(session):
+    session.execute(CREATE_AUTOCOMPLETE_TABLE)
+
+
+def query_counts(session, days=DEFAULT_DAYS, today=None):
+    """Sum the per-day query counts of the last `days` days."""
+    today = today or datetime.utcnow().date()
+    totals = Counter()
+    for offset in range(days):
+        totals.update(read_counts(session, "searches", today - timedelta(days=offset), "query"))
+    return totals
+
+
+def top_completions(counts, k=DEFAULT_TOP_K, max_prefix_length=MAX_PREFIX_LENGTH):
+    """Map every prefix of every query to its `k` most frequent queries."""
+    by_prefix = defaultdict(list)
+    for query, count in counts.items():
+        for length in range(MIN_PREFIX_LENGTH, min(len(query), max_prefix_length) + 1):
+            heap = by_prefix[query[:length]]
+            # Bounded min-heap: keeps the k best (count, query) pairs
+            if len(heap) < k:
+                heapq.heappush(heap, (count, query))
+            elif (count, query) > heap[0]:
+                heapq.heapreplace(heap, (count, query))
+    return {
+        prefix: sorted(heap, key=lambda item: (-item[0], item[1]))
+        for prefix, heap in by_prefix.items()
+    }
+
+
+def build(session=None, days=DEFAULT_DAYS, k=DEFAULT_TOP_K):
+    session = session or get_session()
+    create_autocomplete_tables(session)
+    completions = top_completions(query_counts(session, days), k)
+    statements = (
+        (bind(session, UPSERT, (prefix, [q for _, q in ranked], [c for c, _ in ranked], ROW_TTL_SECONDS)), [])
+        for prefix, ranked in completions.items()
+    )
+    failures = execute_with_backpressure(session, statements)
+    print(f"Autocomplete built: {len(completions)} prefixes ({len(failures)} failed writes).")
+    return completions
+
+
+class Suggester:
+    """In-memory copy of search_autocomplete for constant-time lookups."""
+
+    def __init__(self, session=None, refresh_seconds=300):
+        self.session = session
+        self.refresh_seconds = refresh_seconds
+        self.completions = {}
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        session = self.session or get_session()
+        statement = SimpleStatement(f"SELECT prefix, completions FROM {AUTOCOMPLETE_TABLE}", fetch_size=5000)
+        completions = {row.prefix: list(row.completions or []) for row in session.execute(statement)}
+        # Swap the whole dict so concurrent readers never see a partial load
+        self.completions = completions
+        self.loaded_at = time.monotonic()
+
+    def _reload(self):
+        try:
+            self.load()
+        finally:
+            self.lock.release()
+
+    def _refresh_if_stale(self):
+        if self.loaded_at is not None and time.monotonic() - self.loaded_at < self.refresh_seconds:
+            return
+        if self.loaded_at is None:
+            # First use: nothing to serve yet, load synchronously
+            self.lock.acquire()
+            if self.loaded_at is None:
+                self._reload()
+            else:
+                self.lock.release()
+        elif self.lock.acquire(blocking=False):
+            # Stale: keep serving the current copy while one thread reloads it
+            threading.Thread(target=self._reload, daemon=True).start()
+
+    def suggest(self, prefix, limit=DEFAULT_TOP_K):
+        self._refresh_if_stale()
+        prefix = normalize_query(prefix)
+        if not prefix:
+            return []
+        completions = self.completions.get(prefix[:MAX_PREFIX_LENGTH], [])
+        if len(prefix) > MAX_PREFIX_LENGTH:
+            completions = [query for query in completions if query.startswith(prefix)]
+        return completions[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the search autocomplete table from recent searches.")
+    parser.add_argument("--keyspace", default="social_media")
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS)
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP_K)
+    args = parser.parse_args()
+    build(get_session(args.keyspace), args.days, args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+import os
+from datetime import datetime, timedelta
+
+# How far back the interactive menu reads bucketed tables; queries.fetch_page
+# itself needs an explicit start for them
+BUCKET_LOOKBACK_DAYS = int(os.getenv("CASSANDRA_BUCKET_LOOKBACK_DAYS", "30"))
+
+
+def default_window(start=None, end=None):
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(days=BUCKET_LOOKBACK_DAYS)
+    return start, end
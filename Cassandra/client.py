@@ -1,13 +1,11 @@
 import os
 from . import model
-from cassandra.cluster import Cluster
-import uuid
+from .connection import get_session
 
 # Connect to Cassandra
 def connect_to_cassandra(keyspace='social_media'):
-    cluster = Cluster(['127.0.0.1'])
-    session = cluster.connect()
-    session.set_keyspace(keyspace)
+    session = get_session(keyspace)
+    model.prepare_statements(session)
     return session
 
 # Menu functions
@@ -27,7 +25,8 @@ def print_menu():
         12: "Retrieve Search Activity",
         13: "Insert Friend Request",
         14: "Retrieve Friend Requests",
-        15: "Exit"
+        15: "Retrieve Received Friend Requests",
+        16: "Exit"
     }
     
     for key in menu_options.keys():
@@ -67,6 +66,8 @@ def handle_user_input(session):
         elif choice == '14':
             model.retrieve_friend_requests(session)
         elif choice == '15':
+            model.retrieve_received_friend_requests(session)
+        elif choice == '16':
             print("Exiting program...")
             break
         else:
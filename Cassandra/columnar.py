@@ -0,0 +1,124 @@
+"""
+Columnar result pages for large scans.
+
+The driver's default named_tuple_factory builds one namedtuple per row.
+column_batch_factory is a row factory that turns each page the driver
+receives into a single ColumnBatch: one NumPy array per column, built by
+transposing the page's raw tuples. Timestamp columns become datetime64[ms]
+arrays (nulls as NaT) and integer columns without nulls int64 arrays, so
+comparisons and counts over them run in NumPy; everything else (text, UUIDs,
+collections, integer columns with nulls) stays an object array. Iterating a result set executed with the
+COLUMNAR_PROFILE execution profile (see connection.py) therefore yields one
+batch per page, and the next page is fetched on demand as usual.
+
+Aggregators (aggregators.py) and the exporter (export.py) work on whole
+columns of a batch instead of on individual rows.
+"""
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+
+from .convert import parse_timestamp
+
+
+def object_array(values):
+    # Filled element by element so sequences (collections) stay single values
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def typed_array(values):
+    """The page values of one column, in the narrowest array type that holds them all."""
+    types = set(map(type, values))
+    nullable = type(None) in types
+    types.discard(type(None))
+    if types == {datetime}:
+        # Naive UTC datetimes, as the driver returns them; None becomes NaT
+        return np.array(values, dtype="datetime64[ms]")
+    if types == {int} and not nullable:
+        try:
+            return np.array(values, dtype=np.int64)
+        except OverflowError:
+            pass
+    return object_array(values)
+
+
+class ColumnBatch:
+    """One page of rows, held as an array per column."""
+
+    __slots__ = ("columns", "arrays")
+
+    def __init__(self, columns, arrays):
+        self.columns = list(columns)
+        self.arrays = arrays
+
+    @classmethod
+    def from_rows(cls, columns, rows):
+        if not rows:
+            return cls(columns, {col: object_array([]) for col in columns})
+        return cls(columns, {col: typed_array(values) for col, values in zip(columns, zip(*rows))})
+
+    @classmethod
+    def concat(cls, batches):
+        columns = batches[0].columns
+        arrays = {}
+        for col in columns:
+            parts = [batch.arrays[col] for batch in batches]
+            if len({part.dtype for part in parts}) == 1:
+                arrays[col] = np.concatenate(parts)
+            else:
+                # e.g. an int64 page and a page with nulls, which NumPy would turn into floats
+                arrays[col] = typed_array([value for part in parts for value in part.tolist()])
+        return cls(columns, arrays)
+
+    def __len__(self):
+        return len(self.arrays[self.columns[0]]) if self.columns else 0
+
+    def __getitem__(self, column):
+        return self.arrays[column]
+
+    def select(self, mask):
+        """The rows where the boolean array `mask` is true."""
+        return ColumnBatch(self.columns, {col: array[mask] for col, array in self.arrays.items()})
+
+    def tuples(self):
+        # tolist() turns NumPy scalars back into the driver's values (int, datetime, None for NaT)
+        return zip(*(self.arrays[col].tolist() for col in self.columns))
+
+    def rows(self):
+        """Rows as named tuples, for code that still works one row at a time."""
+        row = namedtuple("Row", self.columns)
+        return map(row._make, self.tuples())
+
+
+def column_batch_factory(colnames, rows):
+    # A one-element list: the driver iterates it, yielding one batch per page
+    return [ColumnBatch.from_rows(colnames, rows)] if rows else []
+
+
+def not_null(array):
+    if array.dtype.kind == "M":
+        return ~np.isnat(array)
+    if array.dtype != object:
+        return np.ones(len(array), dtype=bool)
+    return np.not_equal(array, None)
+
+
+def between(array, start=None, end=None):
+    """Boolean mask of the non-null values with start <= value < end."""
+    mask = not_null(array)
+    if start is not None or end is not None:
+        values = array[mask]
+        if values.dtype.kind == "M":
+            # NumPy has no time zones: aware bounds become naive UTC like the stored values
+            start = None if start is None else np.datetime64(parse_timestamp(start), "ms")
+            end = None if end is None else np.datetime64(parse_timestamp(end), "ms")
+        keep = np.ones(len(values), dtype=bool)
+        if start is not None:
+            keep &= values >= start
+        if end is not None:
+            keep &= values < end
+        mask[mask] = keep
+    return mask
@@ -0,0 +1,156 @@
+"""
+Process-wide Cassandra cluster/session factory and prepared-statement registry.
+
+Every Cassandra call path (menus, seeding, query and ingestion APIs) goes
+through get_session() so the process holds a single Cluster, configured once,
+and prepares each statement once. The cluster is shut down at exit, and a
+process forked after connecting (e.g. a multiprocessing worker) builds its own.
+"""
+import atexit
+import os
+import threading
+
+from cassandra.cluster import EXEC_PROFILE_DEFAULT, Cluster, ExecutionProfile
+from cassandra.policies import DCAwareRoundRobinPolicy, TokenAwarePolicy
+
+from .columnar import column_batch_factory
+
+CASSANDRA_HOSTS = os.getenv("CASSANDRA_HOSTS", "127.0.0.1").split(",")
+CASSANDRA_PORT = int(os.getenv("CASSANDRA_PORT", "9042"))
+# None lets the driver use the datacenter of the first contact point
+CASSANDRA_LOCAL_DC = os.getenv("CASSANDRA_LOCAL_DC") or None
+PROTOCOL_VERSION = 4
+REQUEST_TIMEOUT = float(os.getenv("CASSANDRA_REQUEST_TIMEOUT", "10"))
+# With protocol v4 the driver multiplexes requests over one connection per
+# host, so pool sizing is the executor pool plus the in-flight request cap
+# used by the concurrent write paths.
+EXECUTOR_THREADS = int(os.getenv("CASSANDRA_EXECUTOR_THREADS", "4"))
+MAX_IN_FLIGHT = int(os.getenv("CASSANDRA_MAX_IN_FLIGHT", "256"))
+# Execution profile whose result pages come back as columnar.ColumnBatch
+COLUMNAR_PROFILE = "columnar"
+
+_lock = threading.RLock()
+_pid = None
+_cluster = None
+_sessions = {}
+_prepared = {}
+
+
+def load_balancing_policy():
+    # Route to a replica of the partition; remote datacenters are never used
+    # (used_hosts_per_remote_dc=0), so no connections are opened to them
+    return TokenAwarePolicy(DCAwareRoundRobinPolicy(local_dc=CASSANDRA_LOCAL_DC))
+
+
+def build_cluster():
+    profile = ExecutionProfile(
+        load_balancing_policy=load_balancing_policy(),
+        request_timeout=REQUEST_TIMEOUT,
+    )
+    columnar = ExecutionProfile(
+        load_balancing_policy=load_balancing_policy(),
+        request_timeout=REQUEST_TIMEOUT,
+        row_factory=column_batch_factory,
+    )
+    return Cluster(
+        CASSANDRA_HOSTS,
+        port=CASSANDRA_PORT,
+        protocol_version=PROTOCOL_VERSION,
+        execution_profiles={EXEC_PROFILE_DEFAULT: profile, COLUMNAR_PROFILE: columnar},
+        executor_threads=EXECUTOR_THREADS,
+    )
+
+
+def _reset_after_fork():
+    # Connections inherited from the parent are unusable; drop them without shutdown
+    global _pid, _cluster
+    _pid, _cluster = os.getpid(), None
+    _sessions.clear()
+    _prepared.clear()
+
+
+def get_cluster():
+    global _cluster
+    with _lock:
+        if _pid != os.getpid():
+            _reset_after_fork()
+        if _cluster is None:
+            _cluster = build_cluster()
+        return _cluster
+
+
+def get_session(keyspace='social_media'):
+    """
+    Return the shared session for `keyspace` (None for a session without a
+    keyspace, e.g. to create one).
+    """
+    with _lock:
+        cluster = get_cluster()
+        session = _sessions.get(keyspace)
+        if session is None or session.is_shutdown:
+            session = cluster.connect(keyspace) if keyspace else cluster.connect()
+            _sessions[keyspace] = session
+        return session
+
+
+def prepare(session, query):
+    """Prepare `query` once per session and process; later calls hit the registry."""
+    key = (id(session), query)
+    statement = _prepared.get(key)
+    if statement is None:
+        with _lock:
+            statement = _prepared.get(key)
+            if statement is None:
+                statement = session.prepare(query)
+                _prepared[key] = statement
+    return statement
+
+
+def bind(session, query, values, fetch_size=None):
+    bound = prepare(session, query).bind(values)
+    if fetch_size is not None:
+        bound.fetch_size = fetch_size
+    return bound
+
+
+def execute_with_backpressure(session, statements, max_in_flight=MAX_IN_FLIGHT):
+    """
+    Run (statement, event indexes) pairs with execute_async, never more than
+    `max_in_flight` at once. Returns a list of (event indexes, error) failures.
+    """
+    slots = threading.Semaphore(max_in_flight)
+    failures = []
+    lock = threading.Lock()
+
+    def on_success(_):
+        slots.release()
+
+    def on_error(error, indexes):
+        with lock:
+            failures.append((indexes, error))
+        slots.release()
+
+    for statement, indexes in statements:
+        slots.acquire()
+        future = session.execute_async(statement)
+        future.add_callbacks(on_success, on_error, errback_args=(indexes,))
+
+    # Wait for every outstanding request by draining all the slots
+    for _ in range(max_in_flight):
+        slots.acquire()
+    for _ in range(max_in_flight):
+        slots.release()
+    return failures
+
+
+def shutdown():
+    global _cluster
+    with _lock:
+        if _cluster is not None and _pid == os.getpid():
+            _cluster.shutdown()
+        _cluster = None
+        _sessions.clear()
+        _prepared.clear()
+
+
+atexit.register(shutdown)
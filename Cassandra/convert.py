@@ -0,0 +1,121 @@
+import uuid
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from .schema import column_types
+
+# Rows per pandas chunk when converting CSV files; keeps memory flat for big files
+DEFAULT_CHUNKSIZE = 50_000
+
+
+# Scalar parsers, used for single values (e.g. events coming from the API)
+
+def parse_timestamp(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    # The driver treats naive datetimes as UTC
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_uuid(value):
+    if value is None or value == "":
+        return None
+    return value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+
+
+def parse_int(value):
+    if value is None or value == "":
+        return None
+    return int(value)
+
+
+def parse_text(value):
+    return None if value is None else str(value)
+
+
+SCALAR_PARSERS = {
+    "TIMESTAMP": parse_timestamp,
+    "UUID": parse_uuid,
+    "INT": parse_int,
+    "TEXT": parse_text,
+}
+
+
+# Column parsers, applied once per column on a whole pandas Series
+
+def _missing(series):
+    return series.isna() | (series == "")
+
+
+def parse_timestamp_column(series):
+    missing = _missing(series)
+    parsed = pd.to_datetime(series.mask(missing), utc=True, format="ISO8601")
+    values = parsed.dt.tz_convert(None).dt.to_pydatetime()
+    return [None if is_missing else value for value, is_missing in zip(values, missing)]
+
+
+def parse_uuid_column(series):
+    return [None if not value else uuid.UUID(value) for value in series.tolist()]
+
+
+def parse_int_column(series):
+    parsed = pd.to_numeric(series.mask(_missing(series)), errors="raise").astype("Int64")
+    return [None if value is pd.NA else int(value) for value in parsed.tolist()]
+
+
+def parse_text_column(series):
+    return series.tolist()
+
+
+COLUMN_PARSERS = {
+    "TIMESTAMP": parse_timestamp_column,
+    "UUID": parse_uuid_column,
+    "INT": parse_int_column,
+    "TEXT": parse_text_column,
+}
+
+
+def row_converter(table, columns):
+    """
+    Build a converter for a dict-like row of raw values. Parsers are looked up
+    once from the table definition, not per value.
+    """
+    types = column_types(table)
+    parsers = [SCALAR_PARSERS[types[col]] for col in columns]
+
+    def convert(row):
+        return tuple(parse(row.get(col)) for parse, col in zip(parsers, columns))
+
+    return convert
+
+
+def convert_frame(table, frame, columns):
+    """
+    Convert a DataFrame of raw strings into a list of typed tuples, parsing
+    each column in a single vectorized pass.
+    """
+    types = column_types(table)
+    converted = [COLUMN_PARSERS[types[col]](frame[col]) for col in columns]
+    return list(zip(*converted))
+
+
+def iter_csv_rows(table, csv_file, columns, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Yield typed tuples, in `columns` order, for every row of a CSV file.
+    """
+    reader = pd.read_csv(
+        csv_file,
+        usecols=columns,
+        dtype=str,
+        keep_default_na=False,
+        chunksize=chunksize,
+    )
+    for chunk in reader:
+        yield from convert_frame(table, chunk, columns)
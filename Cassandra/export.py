@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Export Cassandra tables to Parquet (or gzip-compressed CSV) for offline analytics.
+
+Each table is scanned over parallel token ranges (see scan.py), read as
+columnar pages. Every range becomes its own part file, written one row group
+at a time, so memory is bounded by `row_group_size` rows per worker whatever
+the table size.
+Completed ranges are recorded in a per-table checkpoint file; re-running an
+interrupted export skips them and redoes only the unfinished ones.
+
+    python -m Cassandra.export --tables post_activity login_activity --out exports
+"""
+import argparse
+import csv
+import gzip
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from cassandra.util import Date
+
+from .columnar import ColumnBatch
+from .connection import get_session
+from .scan import DEFAULT_FETCH_SIZE, DEFAULT_SPLITS, scan_batches, token_ranges
+from .schema import TABLES, active_table, column_names, column_types
+
+PARQUET = "parquet"
+CSV = "csv"
+DEFAULT_ROW_GROUP_SIZE = 50_000
+CHECKPOINT_FILE = "_checkpoint.json"
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow), or use --format csv")
+    return pyarrow
+
+
+def arrow_schema(table, columns):
+    pa = _pyarrow()
+    arrow_types = {
+        "TEXT": pa.string(),
+        "TIMESTAMP": pa.timestamp("ms"),
+        "UUID": pa.string(),
+        "INT": pa.int32(),
+        "DATE": pa.date32(),
+    }
+    types = column_types(table)
+    return pa.schema([(col, arrow_types[types[col]]) for col in columns])
+
+
+# Columns whose driver values _plain converts before they reach Arrow
+CONVERTED_TYPES = ("UUID", "DATE")
+
+
+def _plain(value):
+    # UUIDs are exported as text; DATE columns (e.g. day_bucket) come back as
+    # the driver's util.Date, which Arrow can't convert
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, Date):
+        return value.date()
+    return value
+
+
+class ParquetPartWriter:
+    extension = ".parquet"
+
+    def __init__(self, path, table, columns):
+        pa = _pyarrow()
+        self.schema = arrow_schema(table, columns)
+        self.columns = columns
+        self.converted_columns = {col for col, cql_type in column_types(table).items() if cql_type in CONVERTED_TYPES}
+        self.writer = pa.parquet.ParquetWriter(path, self.schema, compression="snappy")
+
+    def write(self, batch):
+        pa = _pyarrow()
+        arrays = [
+            pa.array([_plain(v) for v in batch[col]] if col in self.converted_columns else batch[col],
+                     type=self.schema.field(col).type, from_pandas=True)
+            for col in self.columns
+        ]
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+class CsvPartWriter:
+    extension = ".csv.gz"
+
+    def __init__(self, path, table, columns):
+        self.file = gzip.open(path, "wt", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write(self, batch):
+        self.writer.writerows([_plain(value) for value in row] for row in batch.tuples())
+
+    def close(self):
+        self.file.close()
+
+
+WRITERS = {PARQUET: ParquetPartWriter, CSV: CsvPartWriter}
+
+
+class Checkpoint:
+    """Set of completed token-range indexes, persisted atomically after each range."""
+
+    def __init__(self, path, splits):
+        self.path = path
+        self.lock = threading.Lock()
+        self.done = set()
+        if os.path.exists(path):
+            with open(path) as file:
+                state = json.load(file)
+            # Range boundaries depend on the split count; a different one starts over
+            if state.get("splits") == splits:
+                self.done = set(state["done"])
+        self.splits = splits
+
+    def mark_done(self, index):
+        with self.lock:
+            self.done.add(index)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as file:
+                json.dump({"splits": self.splits, "done": sorted(self.done)}, file)
+            os.replace(tmp, self.path)
+
+
+def export_range(session, table_name, index, token_range, directory, file_format, row_group_size, fetch_size):
+    table = active_table(table_name)
+    columns = column_names(table)
+    writer_class = WRITERS[file_format]
+    path = os.path.join(directory, f"part-{index:05d}{writer_class.extension}")
+    # Written under a temporary name so a crash never leaves a complete-looking part
+    writer = writer_class(path + ".tmp", table, columns)
+    written = 0
+    try:
+        batches, pending = [], 0
+        for batch in scan_batches(session, table_name, token_range, columns, fetch_size):
+            batches.append(batch)
+            pending += len(batch)
+            if pending >= row_group_size:
+                writer.write(ColumnBatch.concat(batches))
+                written += pending
+                batches, pending = [], 0
+        if batches:
+            writer.write(ColumnBatch.concat(batches))
+            written += pending
+    finally:
+        writer.close()
+    os.replace(path + ".tmp", path)
+    return written
+
+
+def export_table(table_name, out_dir, file_format=PARQUET, splits=DEFAULT_SPLITS, workers=8,
+                 row_group_size=DEFAULT_ROW_GROUP_SIZE, fetch_size=DEFAULT_FETCH_SIZE, session=None):
+    session = session or get_session()
+    directory = os.path.join(out_dir, active_table(table_name).name)
+    os.makedirs(directory, exist_ok=True)
+    checkpoint = Checkpoint(os.path.join(directory, CHECKPOINT_FILE), splits)
+    pending = [(i, r) for i, r in enumerate(token_ranges(splits)) if i not in checkpoint.done]
+
+    def run(item):
+        index, token_range = item
+        count = export_range(session, table_name, index, token_range, directory, file_format, row_group_size, fetch_size)
+        checkpoint.mark_done(index)
+        return count
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        exported = sum(executor.map(run, pending))
+    print(f"Exported {exported} rows of {table_name} to {directory} "
+          f"({len(pending)} ranges, {splits - len(pending)} already done).")
+    return exported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export Cassandra tables to Parquet or compressed CSV.")
+    parser.add_argument("--keyspace", default="social_media")
+    parser.add_argument("--tables", nargs="+", default=list(TABLES), choices=list(TABLES))
+    parser.add_argument("--out", default="exports")
+    parser.add_argument("--format", choices=list(WRITERS), default=PARQUET)
+    parser.add_argument("--splits", type=int, default=DEFAULT_SPLITS)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_SIZE)
+    args = parser.parse_args()
+
+    session = get_session(args.keyspace)
+    for table_name in args.tables:
+        export_table(table_name, args.out, args.format, args.splits, args.workers, args.row_group_size,
+                     session=session)
+
+
+if __name__ == "__main__":
+    main()
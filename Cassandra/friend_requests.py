@@ -0,0 +1,75 @@
+"""
+Receiver-side friend request reads and status changes.
+
+friend_requests is keyed by sender; the friend_requests_by_receiver and
+friend_requests_by_receiver_status views (see schema.VIEWS) are written on
+every insert so that a user's inbox, or only its pending part, is a
+single-partition read.
+"""
+from cassandra.query import BatchStatement
+
+from .connection import bind
+from .queries import DEFAULT_FETCH_SIZE, fetch_page
+from .schema import BUCKET_COLUMN, active_table, day_bucket
+
+BY_RECEIVER = "friend_requests_by_receiver"
+BY_RECEIVER_STATUS = "friend_requests_by_receiver_status"
+PENDING = "Pending"
+
+
+def fetch_inbox(session, receiver_username, status=None, columns=None, start=None, end=None,
+                fetch_size=DEFAULT_FETCH_SIZE, paging_state=None):
+    """Requests sent to `receiver_username`, newest first, optionally only those with `status`."""
+    if status is None:
+        return fetch_page(session, BY_RECEIVER, receiver_username, columns, start, end, fetch_size, paging_state)
+    return fetch_page(session, BY_RECEIVER_STATUS, (receiver_username, status), columns, start, end,
+                      fetch_size, paging_state)
+
+
+def fetch_pending(session, receiver_username, **kwargs):
+    return fetch_inbox(session, receiver_username, status=PENDING, **kwargs)
+
+
+def update_status(session, sender_username, receiver_username, request_time, new_status):
+    """
+    Change a request's status in the source table and both views. The row
+    moves from the (receiver, old status) partition to (receiver, new status),
+    so all writes go in one logged batch. Setting the status a request
+    already has writes nothing. Returns False if the request does not exist.
+    """
+    request_key = (receiver_username, request_time, sender_username)
+    current = session.execute(bind(
+        session,
+        f"SELECT status, request_location FROM {BY_RECEIVER} "
+        "WHERE receiver_username = ? AND request_time = ? AND sender_username = ?",
+        request_key,
+    )).one()
+    if current is None:
+        return False
+    if current.status == new_status:
+        # Nothing moves, and the DELETE below would shadow the INSERT of the same
+        # row: both get the batch's timestamp, and a tombstone wins a tie
+        return True
+
+    source = active_table("friend_requests")
+    source_key = {"sender_username": sender_username, "request_time": request_time}
+    if source.bucket_source:
+        source_key[BUCKET_COLUMN] = day_bucket(request_time)
+    key_columns = source.partition_key + source.clustering_key
+    where = " AND ".join(f"{col} = ?" for col in key_columns)
+
+    batch = BatchStatement()
+    batch.add(bind(session, f"UPDATE {source.name} SET status = ? WHERE {where}",
+                   (new_status,) + tuple(source_key[col] for col in key_columns)))
+    batch.add(bind(session, f"UPDATE {BY_RECEIVER} SET status = ? "
+                            "WHERE receiver_username = ? AND request_time = ? AND sender_username = ?",
+                   (new_status,) + request_key))
+    batch.add(bind(session, f"DELETE FROM {BY_RECEIVER_STATUS} "
+                            "WHERE receiver_username = ? AND status = ? AND request_time = ? AND sender_username = ?",
+                   (receiver_username, current.status, request_time, sender_username)))
+    batch.add(bind(session, f"INSERT INTO {BY_RECEIVER_STATUS} "
+                            "(sender_username, receiver_username, request_time, status, request_location) "
+                            "VALUES (?, ?, ?, ?, ?)",
+                   (sender_username, receiver_username, request_time, new_status, current.request_location)))
+    session.execute(batch)
+    return True
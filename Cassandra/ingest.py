@@ -0,0 +1,168 @@
+"""
+Programmatic ingestion of activity events into the Cassandra tables.
+
+Events are plain dicts with a `type` and the table's columns, e.g.
+
+    {"type": "login", "username": "user1", "email": "user1@example.com",
+     "device": "Mobile", "ip": "10.0.0.1", "location": "USA"}
+
+The event timestamp defaults to now and `post_id` to a fresh UUID. Valid
+events are grouped by partition, written as one UNLOGGED batch per partition
+(chunked to MAX_BATCH_ROWS) through execute_async, with at most
+MAX_IN_FLIGHT requests outstanding; further submissions block until a slot
+frees up. Written logins are then run through the login anomaly detector.
+"""
+import uuid
+from collections import defaultdict
+from datetime import datetime
+
+from cassandra.query import UNSET_VALUE, BatchStatement, BatchType
+
+from . import login_anomalies, rollups
+from .connection import MAX_IN_FLIGHT, execute_with_backpressure, get_session, prepare
+from .convert import SCALAR_PARSERS
+from .schema import TABLES, bucket_values, column_names, column_types, insert_cql, row_columns, write_targets
+
+EVENT_TABLES = {
+    "login": "login_activity",
+    "account": "account_activity",
+    "profile_change": "profile_changes",
+    "post": "post_activity",
+    "error": "error_logs",
+    "search": "search_activity",
+    "friend_request": "friend_requests",
+}
+
+# Rows per UNLOGGED batch; single-partition batches this size stay well under
+# the server's batch size warning threshold
+MAX_BATCH_ROWS = 50
+MAX_EVENTS_PER_REQUEST = 10_000
+
+
+class InvalidEvent(ValueError):
+    pass
+
+
+def validate_event(event):
+    """
+    Validate one event and return (table_name, typed values in column order).
+    """
+    if not isinstance(event, dict):
+        raise InvalidEvent("Event must be an object")
+    # Anything but a string (e.g. a list) can't be a type, nor looked up in EVENT_TABLES
+    table_name = EVENT_TABLES.get(event.get("type")) if isinstance(event.get("type"), str) else None
+    if table_name is None:
+        raise InvalidEvent(f"Unknown event type: {event.get('type')!r}")
+    table = TABLES[table_name]
+    types = column_types(table)
+
+    unknown = set(event) - set(types) - {"type"}
+    if unknown:
+        raise InvalidEvent(f"Unknown fields for {event['type']}: {sorted(unknown)}")
+
+    # Every table the event is written to needs its key columns, views included
+    keys = {column for target in write_targets(table_name)
+            for column in target.partition_key + target.clustering_key}
+    values = []
+    for column in column_names(table):
+        raw = event.get(column)
+        try:
+            value = SCALAR_PARSERS[types[column]](raw)
+        except (ValueError, TypeError) as e:
+            raise InvalidEvent(f"Invalid {column}: {e}")
+        if value is None:
+            if column == table.clustering_key[0]:
+                value = datetime.utcnow()
+            elif column == "post_id":
+                value = uuid.uuid4()
+            elif column in keys:
+                raise InvalidEvent(f"Missing required field: {column}")
+        values.append(value)
+    return table_name, tuple(values)
+
+
+def partition_rows(rows):
+    """
+    Group (index, table_name, values) rows by target partition. Yields
+    (table, written columns, [(index, written values)]) per partition; rows are
+    also routed to the table's denormalized views (e.g. friend requests by
+    receiver). Missing values are bound as UNSET_VALUE, which writes nothing,
+    rather than None, which would write a cell tombstone.
+    """
+    partitions = defaultdict(list)
+    targets = {}
+    for index, table_name, values in rows:
+        columns = column_names(TABLES[table_name])
+        for table in write_targets(table_name):
+            written = bucket_values(table, columns, values)
+            written_columns = row_columns(table, columns)
+            key = tuple(written[written_columns.index(col)] for col in table.partition_key)
+            targets[table.name] = (table, written_columns)
+            written = tuple(UNSET_VALUE if value is None else value for value in written)
+            partitions[(table.name, key)].append((index, written))
+
+    for (name, _), members in partitions.items():
+        table, written_columns = targets[name]
+        yield table, written_columns, members
+
+
+def partition_batches(session, rows):
+    """
+    Yield (UNLOGGED batch, event indexes) pairs, one or more per partition
+    (see partition_rows).
+    """
+    for table, written_columns, members in partition_rows(rows):
+        insert = prepare(session, insert_cql(table, written_columns))
+        for start in range(0, len(members), MAX_BATCH_ROWS):
+            chunk = members[start:start + MAX_BATCH_ROWS]
+            batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+            for _, written in chunk:
+                batch.add(insert, written)
+            yield batch, [index for index, _ in chunk]
+
+
+def ingest_events(events, session=None, max_in_flight=MAX_IN_FLIGHT):
+    """
+    Validate and write a batch of events.
+
+    Returns a summary with the number of events written and, per event index,
+    validation (`rejected`) and write (`failed`) errors.
+    """
+    session = session or get_session()
+    rows, rejected = [], []
+    for index, event in enumerate(events):
+        try:
+            table_name, values = validate_event(event)
+        except InvalidEvent as e:
+            rejected.append({"index": index, "error": str(e)})
+            continue
+        rows.append((index, table_name, values))
+
+    failures = execute_with_backpressure(session, partition_batches(session, rows), max_in_flight)
+    # An event fails if any of its writes (source table or view) failed
+    failed = {index: str(error) for indexes, error in failures for index in indexes}
+
+    written = defaultdict(list)
+    for index, table_name, values in rows:
+        if index not in failed:
+            written[table_name].append(values)
+    for table_name, values in written.items():
+        rollups.record(session, table_name, values)
+
+    anomalies = []
+    detector = login_anomalies.get_detector()
+    columns = column_names(TABLES["login_activity"])
+    for index, table_name, values in rows:
+        if table_name != "login_activity" or index in failed:
+            continue
+        login = dict(zip(columns, values))
+        for anomaly, details in detector.observe(login["username"], login["login_time"], login["device"],
+                                                 login["ip"], login["location"]):
+            anomalies.append({"index": index, "username": login["username"], "anomaly": anomaly, "details": details})
+
+    return {
+        "accepted": len(rows) - len(failed),
+        "rejected": rejected,
+        "failed": [{"index": index, "error": failed[index]} for index in sorted(failed)],
+        "anomalies": anomalies,
+    }
@@ -1,135 +1,72 @@
 #!/usr/bin/env python3
-from cassandra.cluster import Cluster
-import csv
-import uuid
+from .connection import get_session, prepare
+from .autocomplete import create_autocomplete_tables
+from .login_anomalies import create_anomaly_tables
+from .rollups import ROLLUPS, create_rollup_tables, recompute
+from .convert import iter_csv_rows
+from .schema import (RETENTION, alter_retention_cql, all_tables, bucket_values, create_table_cql, insert_cql,
+                     logical_name, row_columns, write_targets)
 
 # Step 1: Connect to Cassandra DB
 
 
 def connect_to_cassandra(keyspace):
-    cluster = Cluster(['localhost'], protocol_version=4,  # Try explicit protocol version
-                      port=9042, 
-                      )
-    session = cluster.connect()
+    session = get_session(None)
     CREATE_KEYSPACE = """
         CREATE KEYSPACE IF NOT EXISTS {}
         WITH replication = {{ 'class': 'SimpleStrategy', 'replication_factor': {} }}
     """
     session.execute(CREATE_KEYSPACE.format(keyspace, 1))
-    session.set_keyspace(keyspace)
-    return session
+    return get_session(keyspace)
 
 # Step 2: Create tables
 
 
-def create_tables(session):
-    queries = [
-        """
-        CREATE TABLE IF NOT EXISTS login_activity (
-            username TEXT,
-            login_time TIMESTAMP,
-            email TEXT,
-            device TEXT,
-            ip TEXT,
-            location TEXT,
-            PRIMARY KEY ((username), login_time)
-        );
-        """,
-        """
-        CREATE TABLE IF NOT EXISTS account_activity (
-            username TEXT,
-            action_time TIMESTAMP,
-            email TEXT,
-            action_type TEXT,
-            device TEXT,
-            PRIMARY KEY ((username), action_time)
-        );
-        """,
-        """
-        CREATE TABLE IF NOT EXISTS profile_changes (
-            username TEXT,
-            change_time TIMESTAMP,
-            profile_change TEXT,
-            old_value TEXT,
-            new_value TEXT,
-            change_type TEXT,
-            change_src TEXT,
-            PRIMARY KEY ((username), change_time)
-        );
-        """,
-        """
-        CREATE TABLE IF NOT EXISTS post_activity (
-            username TEXT,
-            post_time TIMESTAMP,
-            email TEXT,
-            post_id UUID,
-            post_ip TEXT,
-            device TEXT,
-            post_location TEXT,
-            PRIMARY KEY ((username), post_time)
-        );
-        """,
-        """
-        CREATE TABLE IF NOT EXISTS error_logs (
-            username TEXT,
-            error_time TIMESTAMP,
-            email TEXT,
-            section TEXT,
-            error_message TEXT,
-            error_code INT,
-            PRIMARY KEY ((username), error_time)
-        );
-        """,
-        """
-        CREATE TABLE IF NOT EXISTS search_activity (
-            username TEXT,
-            search_timestamp TIMESTAMP,
-            email TEXT,
-            search_query TEXT,
-            search_location TEXT,
-            device TEXT,
-            ip TEXT,
-            PRIMARY KEY ((username), search_timestamp)
-        );
-        """,
-        """
-        CREATE TABLE IF NOT EXISTS friend_requests (
-            sender_username TEXT,
-            receiver_username TEXT,
-            request_time TIMESTAMP,
-            status TEXT,
-            request_location TEXT,
-            PRIMARY KEY ((sender_username), request_time)
-        );
-        """
-    ]
-    for query in queries:
-        session.execute(query)
+def create_tables(session, mode=None):
+    # mode: "legacy" (default) or "bucketed", see CASSANDRA_SCHEMA_MODE
+    for table in all_tables(mode):
+        session.execute(create_table_cql(table))
+    create_rollup_tables(session)
+    create_autocomplete_tables(session)
+    create_anomaly_tables(session)
+    apply_retention(session, mode)
     print("Tables created successfully.")
 
+
+def apply_retention(session, mode=None):
+    # CREATE TABLE IF NOT EXISTS leaves existing tables alone; bring their TTL
+    # and compaction in line with RETENTION when they differ
+    for table in all_tables(mode):
+        retention = RETENTION.get(logical_name(table.name))
+        if retention is None:
+            continue
+        current = session.execute(
+            "SELECT default_time_to_live, compaction FROM system_schema.tables "
+            "WHERE keyspace_name = %s AND table_name = %s;",
+            (session.keyspace, table.name),
+        ).one()
+        if current is None or (
+            current.default_time_to_live == retention.ttl_days * 24 * 3600
+            and current.compaction.get("class", "").endswith("TimeWindowCompactionStrategy")
+            and current.compaction.get("compaction_window_unit") == "DAYS"
+            and current.compaction.get("compaction_window_size") == str(retention.window_days)
+        ):
+            continue
+        session.execute(alter_retention_cql(table))
+        print(f"Retention applied to {table.name}.")
+
 # Step 3: Seed data from CSV files
 
 
 def seed_data_from_csv(session, table_name, csv_file, columns):
-    with open(csv_file, 'r') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            placeholders = ', '.join(['%s'] * len(columns))
-            query = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})"
-            # Convert post_id to UUID if present
-            values = [convert_value(col, row[col]) for col in columns]
-            session.execute(query, values)
+    targets = write_targets(table_name)
+    inserts = [prepare(session, insert_cql(table, row_columns(table, columns))) for table in targets]
+    # Values are parsed once per column and bound as typed values
+    for values in iter_csv_rows(targets[0], csv_file, columns):
+        for table, insert in zip(targets, inserts):
+            session.execute(insert, bucket_values(table, columns, values))
     print(f"Data seeded into {table_name} from {csv_file}.")
 
-
-def convert_value(col, value):
-    if col == "post_id":
-        return uuid.UUID(value)
-    elif col == "error_code":
-        return int(value)
-    # Add other column-specific conversions as needed
-    return value
-
 # Main execution
 
 
@@ -154,6 +91,10 @@ def main():
     for table, (csv_file, columns) in csv_files.items():
         seed_data_from_csv(session, table, csv_file, columns)
 
+    # Step 4: Bring the rollup counters in line with the seeded rows
+    for table in ROLLUPS:
+        recompute(table, session=session)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,215 @@
+"""
+Streaming anomaly detection for login events.
+
+Every login written through ingest.ingest_events is checked against a compact
+per-user profile: the last few IPs, a location histogram, the known devices
+and the previous login's time and location. Checks are O(1) per event and
+never read login_activity:
+
+- new_device: the device was never seen for a user with a known history
+- impossible_travel: reaching this location from the previous one would need
+  more than MAX_TRAVEL_SPEED_KMH
+
+Profiles are held in an in-memory LRU, loaded from and written back to the
+login_profiles table, so a restart or another API process picks them up.
+Their collections are frozen: rewriting a whole frozen collection replaces
+one cell, where rewriting a non-frozen one also writes a tombstone, which
+would pile up in the profile partitions with every login. Flagged logins
+are recorded in login_anomalies.
+"""
+import logging
+import math
+import threading
+from collections import OrderedDict
+
+from .connection import bind, get_session
+
+logger = logging.getLogger("login_anomalies")
+
+PROFILE_TABLE = "login_profiles"
+ANOMALY_TABLE = "login_anomalies"
+
+CREATE_TABLES = [
+    f"""
+    CREATE TABLE IF NOT EXISTS {PROFILE_TABLE} (
+        username TEXT PRIMARY KEY,
+        recent_ips FROZEN<LIST<TEXT>>,
+        locations FROZEN<MAP<TEXT, INT>>,
+        devices FROZEN<SET<TEXT>>,
+        last_login_time TIMESTAMP,
+        last_location TEXT
+    );
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS {ANOMALY_TABLE} (
+        username TEXT,
+        login_time TIMESTAMP,
+        anomaly TEXT,
+        details TEXT,
+        PRIMARY KEY ((username), login_time, anomaly)
+    ) WITH CLUSTERING ORDER BY (login_time DESC, anomaly ASC);
+    """,
+]
+
+SELECT_PROFILE = (f"SELECT recent_ips, locations, devices, last_login_time, last_location "
+                  f"FROM {PROFILE_TABLE} WHERE username = ?")
+UPSERT_PROFILE = (f"INSERT INTO {PROFILE_TABLE} "
+                  "(username, recent_ips, locations, devices, last_login_time, last_location) "
+                  "VALUES (?, ?, ?, ?, ?, ?)")
+INSERT_ANOMALY = f"INSERT INTO {ANOMALY_TABLE} (username, login_time, anomaly, details) VALUES (?, ?, ?, ?)"
+
+NEW_DEVICE = "new_device"
+IMPOSSIBLE_TRAVEL = "impossible_travel"
+
+MAX_RECENT_IPS = 10
+MAX_LOCATIONS = 20
+MAX_DEVICES = 20
+MAX_TRAVEL_SPEED_KMH = 900
+PROFILE_CACHE_SIZE = 100_000
+# Logins of the same user are handled one at a time; users are spread over this many locks
+LOCK_STRIPES = 64
+
+# Approximate centroids of the locations the app records; "lat,lon" strings
+# are accepted as well. Unknown locations skip the travel check.
+LOCATION_COORDINATES = {
+    "usa": (39.8, -98.6),
+    "canada": (56.1, -106.3),
+    "uk": (54.0, -2.0),
+    "india": (20.6, 79.0),
+    "australia": (-25.3, 133.8),
+    "mexico": (23.6, -102.6),
+    "germany": (51.2, 10.4),
+    "france": (46.2, 2.2),
+    "spain": (40.5, -3.7),
+    "brazil": (-14.2, -51.9),
+    "japan": (36.2, 138.3),
+}
+
+
+def create_anomaly_tables(session):
+    for query in CREATE_TABLES:
+        session.execute(query)
+
+
+def coordinates(location):
+    if not location:
+        return None
+    known = LOCATION_COORDINATES.get(location.strip().lower())
+    if known:
+        return known
+    try:
+        lat, lon = (float(part) for part in location.split(","))
+        return lat, lon
+    except ValueError:
+        return None
+
+
+def distance_km(a, b):
+    lat1, lon1, lat2, lon2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371 * math.asin(math.sqrt(h))
+
+
+class LoginProfile:
+    __slots__ = ("recent_ips", "locations", "devices", "last_login_time", "last_location")
+
+    def __init__(self, recent_ips=None, locations=None, devices=None, last_login_time=None, last_location=None):
+        self.recent_ips = OrderedDict.fromkeys(recent_ips or [])
+        self.locations = dict(locations or {})
+        self.devices = set(devices or [])
+        self.last_login_time = last_login_time
+        self.last_location = last_location
+
+    @property
+    def is_new(self):
+        return self.last_login_time is None
+
+    def record(self, login_time, device, ip, location):
+        if ip:
+            self.recent_ips.pop(ip, None)
+            self.recent_ips[ip] = None
+            while len(self.recent_ips) > MAX_RECENT_IPS:
+                self.recent_ips.popitem(last=False)
+        if location:
+            self.locations[location] = self.locations.get(location, 0) + 1
+            if len(self.locations) > MAX_LOCATIONS:
+                del self.locations[min(self.locations, key=self.locations.get)]
+        if device and (device in self.devices or len(self.devices) < MAX_DEVICES):
+            self.devices.add(device)
+        if self.last_login_time is None or login_time >= self.last_login_time:
+            self.last_login_time, self.last_location = login_time, location
+
+    def values(self):
+        return list(self.recent_ips), dict(self.locations), set(self.devices), self.last_login_time, self.last_location
+
+
+class LoginAnomalyDetector:
+    def __init__(self, session=None, capacity=PROFILE_CACHE_SIZE):
+        self.session = session
+        self.capacity = capacity
+        self.profiles = OrderedDict()
+        # Guards the LRU only; never held across a Cassandra read
+        self.lock = threading.Lock()
+        self.user_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    def _session(self):
+        return self.session or get_session()
+
+    def _user_lock(self, username):
+        return self.user_locks[hash(username) % len(self.user_locks)]
+
+    def _profile(self, username):
+        """The user's profile; the caller holds the user's lock."""
+        with self.lock:
+            profile = self.profiles.get(username)
+            if profile is not None:
+                self.profiles.move_to_end(username)
+                return profile
+        session = self._session()
+        row = session.execute(bind(session, SELECT_PROFILE, (username,))).one()
+        profile = LoginProfile(*row) if row else LoginProfile()
+        with self.lock:
+            self.profiles[username] = profile
+            if len(self.profiles) > self.capacity:
+                self.profiles.popitem(last=False)
+        return profile
+
+    def check(self, profile, login_time, device, location):
+        anomalies = []
+        if profile.is_new:
+            return anomalies
+        if device and device not in profile.devices:
+            anomalies.append((NEW_DEVICE, device))
+        here, there = coordinates(location), coordinates(profile.last_location)
+        if here and there and location != profile.last_location:
+            hours = abs((login_time - profile.last_login_time).total_seconds()) / 3600
+            km = distance_km(here, there)
+            if km / max(hours, 1 / 60) > MAX_TRAVEL_SPEED_KMH:
+                anomalies.append((IMPOSSIBLE_TRAVEL, f"{profile.last_location} -> {location}: {km:.0f} km in {hours:.2f} h"))
+        return anomalies
+
+    def observe(self, username, login_time, device=None, ip=None, location=None):
+        """Check one login against the user's profile, then fold it in. Returns [(anomaly, details)]."""
+        with self._user_lock(username):
+            profile = self._profile(username)
+            anomalies = self.check(profile, login_time, device, location)
+            profile.record(login_time, device, ip, location)
+            values = profile.values()
+
+        session = self._session()
+        writes = [session.execute_async(bind(session, UPSERT_PROFILE, (username,) + values))]
+        for anomaly, details in anomalies:
+            writes.append(session.execute_async(bind(session, INSERT_ANOMALY, (username, login_time, anomaly, details))))
+        for future in writes:
+            future.add_errback(lambda error: logger.error(f"Failed to save login profile: {error}"))
+        return anomalies
+
+
+_detector = None
+
+
+def get_detector():
+    global _detector
+    if _detector is None:
+        _detector = LoginAnomalyDetector()
+    return _detector
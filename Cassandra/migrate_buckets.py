@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Rewrite the legacy one-partition-per-user tables into their day-bucketed
+variants (<table>_by_day). Safe to re-run: inserts are idempotent upserts.
+
+    python -m Cassandra.migrate_buckets --tables login_activity search_activity
+"""
+import argparse
+
+from cassandra.concurrent import execute_concurrent_with_args
+from cassandra.query import SimpleStatement
+
+from . import init_db
+from .connection import prepare
+from .schema import BUCKETED, LEGACY, TABLES, active_table, bucket_values, column_names, create_table_cql, insert_cql, row_columns
+
+DEFAULT_FETCH_SIZE = 1000
+DEFAULT_CONCURRENCY = 64
+
+
+def migrate_table(session, name, fetch_size=DEFAULT_FETCH_SIZE, concurrency=DEFAULT_CONCURRENCY):
+    source = active_table(name, LEGACY)
+    target = active_table(name, BUCKETED)
+    session.execute(create_table_cql(target))
+
+    columns = column_names(source)
+    insert = prepare(session, insert_cql(target, row_columns(target, columns)))
+    select = SimpleStatement(f"SELECT {', '.join(columns)} FROM {source.name}", fetch_size=fetch_size)
+
+    result = session.execute(select)
+    copied = 0
+    while True:
+        # Write the current page concurrently, then let the driver fetch the next one
+        page = [bucket_values(target, columns, row) for row in result.current_rows]
+        if page:
+            for success, error in execute_concurrent_with_args(session, insert, page, concurrency=concurrency):
+                if not success:
+                    raise error
+            copied += len(page)
+        if not result.has_more_pages:
+            break
+        result.fetch_next_page()
+    print(f"Migrated {copied} rows from {source.name} to {target.name}.")
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate Cassandra tables to day-bucketed partitions.")
+    parser.add_argument("--keyspace", default="social_media")
+    parser.add_argument("--tables", nargs="+", default=list(TABLES), choices=list(TABLES))
+    parser.add_argument("--fetch-size", type=int, default=DEFAULT_FETCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    args = parser.parse_args()
+
+    session = init_db.connect_to_cassandra(args.keyspace)
+    for name in args.tables:
+        migrate_table(session, name, args.fetch_size, args.concurrency)
+
+
+if __name__ == "__main__":
+    main()
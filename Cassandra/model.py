@@ -1,13 +1,52 @@
-from cassandra.cluster import Cluster
 import uuid
 from datetime import datetime
+from cassandra.query import BatchStatement
+from . import connection, friend_requests, rollups
+from .buckets import BUCKET_LOOKBACK_DAYS, default_window
+from .queries import iter_rows, select_cql
+from .schema import active_table, all_tables, bucket_values, column_names, insert_cql, row_columns, write_targets
 
 # Connect to Cassandra
 def connect_to_cassandra(keyspace='social_media'):
-    cluster = Cluster(['127.0.0.1'])
-    session = cluster.connect()
-    session.set_keyspace(keyspace)
-    return session
+    return connection.get_session(keyspace)
+
+def prepare_statements(session):
+    # Prepare the statements used below once per process, up front
+    for table in all_tables():
+        columns = column_names(table)
+        connection.prepare(session, insert_cql(table, columns))
+        if table.bucket_source:
+            # Bucketed reads are always bounded on the clustering timestamp
+            connection.prepare(session, select_cql(table, columns, start=True, end=True))
+        else:
+            connection.prepare(session, select_cql(table, columns))
+
+# Shared read/write helpers; they resolve the logical table to the legacy or
+# day-bucketed variant depending on CASSANDRA_SCHEMA_MODE
+
+def write_row(session, table_name, columns, values):
+    targets = write_targets(table_name)
+    statements = [
+        connection.bind(session, insert_cql(table, row_columns(table, columns)), bucket_values(table, columns, values))
+        for table in targets
+    ]
+    if len(statements) == 1:
+        session.execute(statements[0])
+    else:
+        # Keep denormalized copies in step with the source table (logged batch)
+        batch = BatchStatement()
+        for statement in statements:
+            batch.add(statement)
+        session.execute(batch)
+    rollups.record(session, table_name, [values], columns)
+
+def read_rows(session, table_name, key):
+    # Paged, newest-first; bucketed tables are walked one day partition at a time
+    if not active_table(table_name).bucket_source:
+        return iter_rows(session, table_name, key)
+    start, end = default_window()
+    print(f"Showing the last {BUCKET_LOOKBACK_DAYS} days (CASSANDRA_BUCKET_LOOKBACK_DAYS), since {start:%Y-%m-%d}.")
+    return iter_rows(session, table_name, key, start=start, end=end)
 
 # Dynamic Insert Data Functions
 
@@ -19,17 +58,13 @@ def insert_login_record(session):
     ip = input("Enter IP address: ")
     location = input("Enter location: ")
 
-    query = """
-    INSERT INTO login_activity (username, login_time, email, device, ip, location)
-    VALUES (%s, %s, %s, %s, %s, %s);
-    """
-    session.execute(query, (username, login_time, email, device, ip, location))
+    columns = ["username", "login_time", "email", "device", "ip", "location"]
+    write_row(session, "login_activity", columns, (username, login_time, email, device, ip, location))
     print("Login record inserted.")
 
 def retrieve_login_history(session):
     username = input("Enter username to retrieve login history: ")
-    query = "SELECT * FROM login_activity WHERE username = %s;"
-    rows = session.execute(query, (username,))
+    rows = read_rows(session, "login_activity", username)
     for row in rows:
         print(row)
 
@@ -40,17 +75,13 @@ def insert_account_deactivation(session):
     action_type = input("Enter action type (e.g., deactivation): ")
     device = input("Enter device type: ")
 
-    query = """
-    INSERT INTO account_activity (username, action_time, email, action_type, device)
-    VALUES (%s, %s, %s, %s, %s);
-    """
-    session.execute(query, (username, action_time, email, action_type, device))
+    columns = ["username", "action_time", "email", "action_type", "device"]
+    write_row(session, "account_activity", columns, (username, action_time, email, action_type, device))
     print("Account deactivation inserted.")
 
 def retrieve_account_deactivation(session):
     username = input("Enter username to retrieve account deactivation logs: ")
-    query = "SELECT * FROM account_activity WHERE username = %s;"
-    rows = session.execute(query, (username,))
+    rows = read_rows(session, "account_activity", username)
     for row in rows:
         print(row)
 
@@ -63,17 +94,13 @@ def insert_profile_change(session):
     change_type = input("Enter change type (e.g., update): ")
     change_src = input("Enter change source (e.g., mobile): ")
 
-    query = """
-    INSERT INTO profile_changes (username, change_time, profile_change, old_value, new_value, change_type, change_src)
-    VALUES (%s, %s, %s, %s, %s, %s, %s);
-    """
-    session.execute(query, (username, change_time, profile_change, old_value, new_value, change_type, change_src))
+    columns = ["username", "change_time", "profile_change", "old_value", "new_value", "change_type", "change_src"]
+    write_row(session, "profile_changes", columns, (username, change_time, profile_change, old_value, new_value, change_type, change_src))
     print("Profile change inserted.")
 
 def retrieve_profile_change_history(session):
     username = input("Enter username to retrieve profile change history: ")
-    query = "SELECT * FROM profile_changes WHERE username = %s;"
-    rows = session.execute(query, (username,))
+    rows = read_rows(session, "profile_changes", username)
     for row in rows:
         print(row)
 
@@ -86,17 +113,13 @@ def insert_post_activity(session):
     device = input("Enter device type: ")
     post_location = input("Enter post location: ")
 
-    query = """
-    INSERT INTO post_activity (username, post_time, email, post_id, post_ip, device, post_location)
-    VALUES (%s, %s, %s, %s, %s, %s, %s);
-    """
-    session.execute(query, (username, post_time, email, post_id, post_ip, device, post_location))
+    columns = ["username", "post_time", "email", "post_id", "post_ip", "device", "post_location"]
+    write_row(session, "post_activity", columns, (username, post_time, email, post_id, post_ip, device, post_location))
     print("Post activity inserted.")
 
 def retrieve_post_activity(session):
     username = input("Enter username to retrieve post activity: ")
-    query = "SELECT * FROM post_activity WHERE username = %s;"
-    rows = session.execute(query, (username,))
+    rows = read_rows(session, "post_activity", username)
     for row in rows:
         print(row)
 
@@ -108,17 +131,13 @@ def insert_error_log(session):
     error_message = input("Enter error message: ")
     error_code = int(input("Enter error code: "))  # Convert to integer
 
-    query = """
-    INSERT INTO error_logs (username, error_time, email, section, error_message, error_code)
-    VALUES (%s, %s, %s, %s, %s, %s);
-    """
-    session.execute(query, (username, error_time, email, section, error_message, error_code))
+    columns = ["username", "error_time", "email", "section", "error_message", "error_code"]
+    write_row(session, "error_logs", columns, (username, error_time, email, section, error_message, error_code))
     print("Error log inserted.")
 
 def retrieve_error_logs(session):
     username = input("Enter username to retrieve error logs: ")
-    query = "SELECT * FROM error_logs WHERE username = %s;"
-    rows = session.execute(query, (username,))
+    rows = read_rows(session, "error_logs", username)
     for row in rows:
         print(row)
 
@@ -131,17 +150,13 @@ def insert_search_activity(session):
     device = input("Enter device type: ")
     ip = input("Enter IP address: ")
 
-    query = """
-    INSERT INTO search_activity (username, search_timestamp, email, search_query, search_location, device, ip)
-    VALUES (%s, %s, %s, %s, %s, %s, %s);
-    """
-    session.execute(query, (username, search_timestamp, email, search_query, search_location, device, ip))
+    columns = ["username", "search_timestamp", "email", "search_query", "search_location", "device", "ip"]
+    write_row(session, "search_activity", columns, (username, search_timestamp, email, search_query, search_location, device, ip))
     print("Search activity inserted.")
 
 def retrieve_search_activity(session):
     username = input("Enter username to retrieve search activity: ")
-    query = "SELECT * FROM search_activity WHERE username = %s;"
-    rows = session.execute(query, (username,))
+    rows = read_rows(session, "search_activity", username)
     for row in rows:
         print(row)
 
@@ -152,16 +167,19 @@ def insert_friend_request(session):
     status = input("Enter request status (e.g., pending): ")
     request_location = input("Enter request location: ")
 
-    query = """
-    INSERT INTO friend_requests (sender_username, receiver_username, request_time, status, request_location)
-    VALUES (%s, %s, %s, %s, %s);
-    """
-    session.execute(query, (sender_username, receiver_username, request_time, status, request_location))
+    columns = ["sender_username", "receiver_username", "request_time", "status", "request_location"]
+    write_row(session, "friend_requests", columns, (sender_username, receiver_username, request_time, status, request_location))
     print("Friend request inserted.")
 
 def retrieve_friend_requests(session):
     sender_username = input("Enter sender username to retrieve friend requests: ")
-    query = "SELECT * FROM friend_requests WHERE sender_username = %s;"
-    rows = session.execute(query, (sender_username,))
+    rows = read_rows(session, "friend_requests", sender_username)
     for row in rows:
-        print(row)
\ No newline at end of file
+        print(row)
+
+def retrieve_received_friend_requests(session):
+    receiver_username = input("Enter receiver username to retrieve received friend requests: ")
+    status = input("Filter by status (e.g., Pending, leave empty for all): ").strip() or None
+    page = friend_requests.fetch_inbox(session, receiver_username, status=status)
+    for row in page.rows:
+        print(row)
@@ -0,0 +1,139 @@
+"""
+Non-interactive read API for the Cassandra activity tables.
+
+Every read is scoped to one key (username / sender_username), optionally
+bounded on the table's clustering timestamp, projected to the requested
+columns and paged with `fetch_size`. Pages carry an opaque `paging_state`
+token that resumes the read exactly where the previous page stopped, across
+day buckets when CASSANDRA_SCHEMA_MODE=bucketed. A bucketed read walks one
+day partition per day of its window, so it needs an explicit `start`: there
+is no way to tell where a key's history begins, and a default lookback would
+silently drop older rows.
+
+    page = fetch_page(session, "login_activity", "user1",
+                      start=datetime.utcnow() - timedelta(days=1), fetch_size=50)
+    next_page = fetch_page(session, "login_activity", "user1", paging_state=page.paging_state)
+"""
+import base64
+import json
+from collections import namedtuple
+from datetime import date, datetime
+
+from .connection import bind
+from .schema import active_table, buckets_newest_first, column_names
+
+DEFAULT_FETCH_SIZE = 100
+
+# rows: list of named tuples with the projected columns, typed by the driver
+# paging_state: opaque token for the next page, None once the read is exhausted
+Page = namedtuple("Page", ["rows", "paging_state"])
+
+
+def time_column(table):
+    return table.clustering_key[0]
+
+
+def projection(table, columns=None):
+    if not columns:
+        return column_names(table)
+    unknown = set(columns) - set(column_names(table))
+    if unknown:
+        raise ValueError(f"Unknown columns for {table.name}: {sorted(unknown)}")
+    return list(columns)
+
+
+def select_cql(table, columns, start=None, end=None, newest_first=True):
+    where = [f"{col} = ?" for col in table.partition_key]
+    if start is not None:
+        where.append(f"{time_column(table)} >= ?")
+    if end is not None:
+        where.append(f"{time_column(table)} < ?")
+    query = f"SELECT {', '.join(columns)} FROM {table.name} WHERE {' AND '.join(where)}"
+    # Bucketed tables are already stored newest first
+    if newest_first and not table.clustering_order:
+        query += f" ORDER BY {time_column(table)} DESC"
+    return query
+
+
+# Paging tokens
+
+def encode_token(bucket=None, state=None, start=None, end=None):
+    token = {
+        "bucket": bucket.isoformat() if bucket else None,
+        "state": state.hex() if state else None,
+        "start": start.isoformat() if start else None,
+        "end": end.isoformat() if end else None,
+    }
+    return base64.urlsafe_b64encode(json.dumps(token).encode()).decode()
+
+
+def decode_token(token):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return (
+            date.fromisoformat(data["bucket"]) if data["bucket"] else None,
+            bytes.fromhex(data["state"]) if data["state"] else None,
+            datetime.fromisoformat(data["start"]) if data["start"] else None,
+            datetime.fromisoformat(data["end"]) if data["end"] else None,
+        )
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid paging_state token: {e}")
+
+
+# Reads
+
+def fetch_page(session, table_name, key, columns=None, start=None, end=None,
+               fetch_size=DEFAULT_FETCH_SIZE, paging_state=None, newest_first=True):
+    """
+    Fetch one page of rows for `key` with `start <= time < end`. `key` is a
+    tuple for tables with a composite partition key.
+
+    When resuming from `paging_state` the time window stored in the token is
+    used, so callers only need to pass the table, key and columns again.
+    `start` is required for bucketed tables; `end` defaults to now.
+    """
+    table = active_table(table_name)
+    columns = projection(table, columns)
+    key_values = key if isinstance(key, tuple) else (key,)
+    bucket, state = None, None
+    if paging_state:
+        bucket, state, start, end = decode_token(paging_state)
+
+    if not table.bucket_source:
+        params = key_values + tuple(value for value in (start, end) if value is not None)
+        statement = bind(session, select_cql(table, columns, start, end, newest_first), params, fetch_size)
+        result = session.execute(statement, paging_state=state)
+        next_state = result.paging_state
+        token = encode_token(state=next_state, start=start, end=end) if next_state else None
+        return Page(list(result.current_rows), token)
+
+    # Bucketed: fill the page from consecutive day partitions, newest first
+    if start is None:
+        raise ValueError(f"Reading {table.name} needs a start time: it is bucketed by day")
+    end = end or datetime.utcnow()
+    buckets = [b for b in buckets_newest_first(start, end) if bucket is None or b <= bucket]
+    query = select_cql(table, columns, start, end)
+    rows = []
+    for i, current in enumerate(buckets):
+        statement = bind(session, query, key_values + (current, start, end), fetch_size - len(rows))
+        result = session.execute(statement, paging_state=state)
+        rows.extend(result.current_rows)
+        state = None
+        if result.paging_state:
+            return Page(rows, encode_token(current, result.paging_state, start, end))
+        if len(rows) >= fetch_size:
+            remaining = buckets[i + 1:]
+            return Page(rows, encode_token(remaining[0], None, start, end) if remaining else None)
+    return Page(rows, None)
+
+
+def iter_rows(session, table_name, key, columns=None, start=None, end=None,
+              fetch_size=DEFAULT_FETCH_SIZE, newest_first=True):
+    """Iterate over every matching row, fetching `fetch_size` rows at a time."""
+    paging_state = None
+    while True:
+        page = fetch_page(session, table_name, key, columns, start, end, fetch_size, paging_state, newest_first)
+        yield from page.rows
+        paging_state = page.paging_state
+        if not paging_state:
+            return
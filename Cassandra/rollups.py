@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Daily counter rollups over the activity tables.
+
+activity_counts holds one counter per (metric, day, dimension, value), e.g.
+("logins", 2024-11-25, "device", "Mobile"). A dashboard reads one
+(metric, day) partition instead of scanning the raw event tables.
+Dimensions with unbounded values (every distinct search query) are sharded:
+their counters are spread over `shards` partitions whose metric is
+"<metric>#<shard>", and read_counts merges them back.
+
+Counters are incremented on ingest (ingest.ingest_events and the menu
+inserts). `python -m Cassandra.rollups` recomputes them from the raw tables
+with a parallel token-range scan and corrects any drift with delta updates.
+The correction is read-then-add, so an increment landing between the two
+would be counted twice or lost: only closed days (before today, UTC) are
+recomputed, since ingest no longer writes to them. Rows missing a dimension
+column count towards the total but not towards that dimension.
+"""
+import argparse
+import zlib
+from collections import Counter, defaultdict, namedtuple
+from datetime import date, datetime
+
+from . import search_terms
+from .connection import MAX_IN_FLIGHT, bind, execute_with_backpressure, get_session
+from .schema import TABLES, column_names, day_bucket
+from .scan import DEFAULT_SPLITS, parallel_scan
+
+ROLLUP_TABLE = "activity_counts"
+
+CREATE_ROLLUP_TABLE = f"""
+CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE} (
+    metric TEXT,
+    day DATE,
+    dimension TEXT,
+    value TEXT,
+    count COUNTER,
+    PRIMARY KEY ((metric, day), dimension, value)
+);
+"""
+
+INCREMENT = (f"UPDATE {ROLLUP_TABLE} SET count = count + ? "
+             "WHERE metric = ? AND day = ? AND dimension = ? AND value = ?")
+SELECT_DAY = f"SELECT dimension, value, count FROM {ROLLUP_TABLE} WHERE metric = ? AND day = ?"
+SELECT_DIMENSION = f"SELECT value, count FROM {ROLLUP_TABLE} WHERE metric = ? AND day = ? AND dimension = ?"
+
+# A rollup counts rows of a table per day and per value of `columns`
+# (joined with ':'); no columns means a plain daily total. `transform`, if
+# set, maps that value to the values actually counted (e.g. a search query to
+# its terms), each distinct one counted once per row. `shards` > 1 spreads
+# the dimension's counters over that many partitions per day.
+Rollup = namedtuple("Rollup", ["metric", "dimension", "columns", "transform", "shards"], defaults=(None, 1))
+
+QUERY_SHARDS = 32
+
+ROLLUPS = {
+    "login_activity": [
+        Rollup("logins", "total", ()),
+        Rollup("logins", "device", ("device",)),
+        Rollup("logins", "location", ("location",)),
+    ],
+    "error_logs": [
+        Rollup("errors", "total", ()),
+        Rollup("errors", "error_code", ("error_code",)),
+        Rollup("errors", "section", ("section",)),
+        Rollup("errors", "section_error_code", ("section", "error_code")),
+    ],
+    "search_activity": [
+        Rollup("searches", "total", ()),
+        Rollup("searches", "term", ("search_query",), search_terms.tokenize),
+        Rollup("searches", "query", ("search_query",), search_terms.completion_keys, QUERY_SHARDS),
+    ],
+}
+
+TOTAL = "all"
+
+# metric -> {dimension: shards} of the sharded rollups
+SHARDED = defaultdict(dict)
+for _rollups in ROLLUPS.values():
+    for _rollup in _rollups:
+        if _rollup.shards > 1:
+            SHARDED[_rollup.metric][_rollup.dimension] = _rollup.shards
+
+
+def stored_metric(rollup, value):
+    """The metric of the partition a counter of `rollup` is stored in."""
+    if rollup.shards == 1:
+        return rollup.metric
+    # crc32, unlike hash(), is the same in every process
+    return f"{rollup.metric}#{zlib.crc32(value.encode()) % rollup.shards}"
+
+
+def partition_metrics(rollup):
+    """The metrics of every partition `rollup` writes to on a given day."""
+    if rollup.shards == 1:
+        return [rollup.metric]
+    return [f"{rollup.metric}#{shard}" for shard in range(rollup.shards)]
+
+
+def create_rollup_tables(session):
+    session.execute(CREATE_ROLLUP_TABLE)
+
+
+def rollup_columns(table_name):
+    """Columns a rollup needs from `table_name`: the timestamp plus every dimension column."""
+    needed = {TABLES[table_name].clustering_key[0]}
+    for rollup in ROLLUPS.get(table_name, []):
+        needed.update(rollup.columns)
+    return [col for col in column_names(TABLES[table_name]) if col in needed]
+
+
+def count_rows(table_name, rows, columns=None):
+    """
+    Count rows (tuples in `columns` order) into a Counter keyed by
+    (metric, day, dimension, value).
+    """
+    columns = list(columns or column_names(TABLES[table_name]))
+    time_index = columns.index(TABLES[table_name].clustering_key[0])
+    rollups = [(rollup, [columns.index(col) for col in rollup.columns]) for rollup in ROLLUPS.get(table_name, [])]
+    counts = Counter()
+    for row in rows:
+        timestamp = row[time_index]
+        if timestamp is None:
+            continue
+        day = day_bucket(timestamp)
+        for rollup, indexes in rollups:
+            if any(row[i] is None for i in indexes):
+                continue
+            value = ":".join(str(row[i]) for i in indexes) if indexes else TOTAL
+            if rollup.transform is None:
+                counts[(stored_metric(rollup, value), day, rollup.dimension, value)] += 1
+                continue
+            raw = row[indexes[0]] if len(indexes) == 1 else value
+            for counted in set(rollup.transform(raw)):
+                counts[(stored_metric(rollup, counted), day, rollup.dimension, counted)] += 1
+    return counts
+
+
+def apply_increments(session, counts, max_in_flight=MAX_IN_FLIGHT):
+    """Add `counts` to the counters. Counter updates are not idempotent, so failures are not retried."""
+    statements = (
+        (bind(session, INCREMENT, (delta, metric, day, dimension, value)), [])
+        for (metric, day, dimension, value), delta in counts.items()
+        if delta
+    )
+    return execute_with_backpressure(session, statements, max_in_flight)
+
+
+def record(session, table_name, rows, columns=None):
+    """Incrementally count freshly written rows of `table_name`."""
+    if table_name not in ROLLUPS or not rows:
+        return []
+    return apply_increments(session, count_rows(table_name, rows, columns))
+
+
+# Dashboard reads
+
+def read_partition(session, metric, day):
+    """The counters of one stored (metric, day) partition: {dimension: {value: count}}."""
+    counts = defaultdict(dict)
+    for row in session.execute(bind(session, SELECT_DAY, (metric, day))):
+        counts[row.dimension][row.value] = row.count
+    return counts
+
+
+def read_counts(session, metric, day, dimension=None):
+    """
+    Counts for one metric and day: {dimension: {value: count}}, or
+    {value: count} when `dimension` is given. Sharded dimensions are merged
+    from all their partitions.
+    """
+    sharded = SHARDED.get(metric, {})
+    if dimension is not None:
+        metrics = [f"{metric}#{shard}" for shard in range(sharded[dimension])] if dimension in sharded else [metric]
+        counts = {}
+        for stored in metrics:
+            for row in session.execute(bind(session, SELECT_DIMENSION, (stored, day, dimension))):
+                counts[row.value] = row.count
+        return counts
+    counts = read_partition(session, metric, day)
+    for sharded_dimension, shards in sharded.items():
+        for shard in range(shards):
+            for values in read_partition(session, f"{metric}#{shard}", day).values():
+                counts[sharded_dimension].update(values)
+    return dict(counts)
+
+
+# Batch recompute
+
+def scan_counts(table_name, splits=DEFAULT_SPLITS, workers=8, days=None, session=None):
+    """Count a whole table with a parallel token-range scan, optionally only for `days`."""
+    columns = rollup_columns(table_name)
+
+    def consume(rows):
+        counts = count_rows(table_name, rows, columns)
+        if days is not None:
+            counts = Counter({key: n for key, n in counts.items() if key[1] in days})
+        return counts
+
+    total = Counter()
+    for counts in parallel_scan(table_name, consume, columns, splits, workers, session=session):
+        total.update(counts)
+    return total
+
+
+def recompute(table_name, splits=DEFAULT_SPLITS, workers=8, days=None, session=None):
+    """
+    Recompute the rollups of `table_name` and bring the counters in line by
+    adding (expected - current) for every counter of the affected days.
+    Days from today (UTC) on are still being ingested and are left alone.
+    """
+    today = datetime.utcnow().date()
+    open_days = sorted(day for day in days or () if day >= today)
+    if open_days:
+        raise ValueError(f"Only closed days can be recomputed, got {', '.join(map(str, open_days))}")
+    session = session or get_session()
+    expected = Counter({key: n for key, n in scan_counts(table_name, splits, workers, days, session).items()
+                        if key[1] < today})
+    partitions = {(metric, day) for metric, day, _, _ in expected}
+    for day in days or ():
+        partitions.update((metric, day) for rollup in ROLLUPS[table_name] for metric in partition_metrics(rollup))
+
+    deltas = Counter()
+    for metric, day in partitions:
+        current = read_partition(session, metric, day)
+        keys = {(d, v) for d, values in current.items() for v in values}
+        keys.update((d, v) for m, dd, d, v in expected if (m, dd) == (metric, day))
+        for dimension, value in keys:
+            key = (metric, day, dimension, value)
+            deltas[key] = expected.get(key, 0) - current.get(dimension, {}).get(value, 0)
+    failures = apply_increments(session, deltas)
+    print(f"Recomputed {len(partitions)} rollup partitions for {table_name} "
+          f"({sum(1 for d in deltas.values() if d)} counters corrected, {len(failures)} failed).")
+    return deltas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute activity_counts rollups from the raw tables.")
+    parser.add_argument("--keyspace", default="social_media")
+    parser.add_argument("--tables", nargs="+", default=list(ROLLUPS), choices=list(ROLLUPS))
+    parser.add_argument("--days", nargs="*", type=date.fromisoformat, help="only recompute these days (YYYY-MM-DD)")
+    parser.add_argument("--splits", type=int, default=DEFAULT_SPLITS)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    today = datetime.utcnow().date()
+    if args.days and max(args.days) >= today:
+        parser.error(f"--days must be before today ({today}, UTC); open days are still being ingested")
+
+    session = get_session(args.keyspace)
+    create_rollup_tables(session)
+    for table_name in args.tables:
+        recompute(table_name, args.splits, args.workers, set(args.days) if args.days else None, session)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+from flask import Blueprint, request, jsonify
+from . import ingest
+from .autocomplete import Suggester
+
+#create a Blueprint for the Cassandra activity routes
+events_routes = Blueprint('events', __name__)
+
+suggester = Suggester()
+
+#ingest a batch of activity events
+@events_routes.route('/events', methods=['POST'])
+def ingest_events():
+    data = request.json
+    events = data.get('events') if isinstance(data, dict) else data
+    if not isinstance(events, list) or not events:
+        return jsonify({"success": False, "error": "A non-empty list of events is required"}), 400
+    if len(events) > ingest.MAX_EVENTS_PER_REQUEST:
+        return jsonify({"success": False, "error": f"At most {ingest.MAX_EVENTS_PER_REQUEST} events per request"}), 413
+
+    try:
+        result = ingest.ingest_events(events)
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 503
+
+    success = not result["rejected"] and not result["failed"]
+    return jsonify({"success": success, **result}), 200 if success else 207
+
+#search suggestions from the precomputed autocomplete table
+@events_routes.route('/search/suggest', methods=['GET'])
+def suggest_searches():
+    prefix = request.args.get('prefix', '').strip()
+    if not prefix:
+        return jsonify({"success": False, "error": "Prefix is required"}), 400
+    try:
+        limit = int(request.args.get('limit', 10))
+    except ValueError:
+        return jsonify({"success": False, "error": "Limit must be an integer"}), 400
+    if limit <= 0:
+        return jsonify({"success": False, "error": "Limit must be greater than 0"}), 400
+
+    try:
+        suggestions = suggester.suggest(prefix, limit)
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 503
+    return jsonify({"success": True, "suggestions": suggestions}), 200
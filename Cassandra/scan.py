@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Full-table scans split over the Murmur3 token ring.
+
+The ring is cut into N contiguous (start, end] ranges, each read with
+`WHERE token(<partition key>) > ? AND token(<partition key>) <= ?` and
+paged by the driver, so ranges can be scanned concurrently: with threads
+(parallel_scan) or with a process pool feeding mergeable aggregators
+(process_scan), which scales CPU-bound aggregation with the number of cores.
+scan_batches reads a range as columnar pages (see columnar.py) instead of
+one named tuple per row; process_scan and the exporter use it.
+
+    python -m Cassandra.scan search_activity --top search_query 20 --distinct username --since 2024-11-18
+"""
+import argparse
+import copy
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime
+from multiprocessing import get_context
+
+from . import aggregators as agg
+from .connection import COLUMNAR_PROFILE, bind, get_session
+from .schema import active_table, column_names
+
+MIN_TOKEN = -2 ** 63
+MAX_TOKEN = 2 ** 63 - 1
+DEFAULT_SPLITS = 64
+DEFAULT_FETCH_SIZE = 1000
+
+
+def token_ranges(splits=DEFAULT_SPLITS):
+    """Split the whole ring into `splits` contiguous (start, end] ranges."""
+    width = (MAX_TOKEN - MIN_TOKEN) // splits
+    bounds = [MIN_TOKEN + i * width for i in range(splits)] + [MAX_TOKEN]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def scan_cql(table, columns):
+    token = "token({})".format(", ".join(table.partition_key))
+    return f"SELECT {', '.join(columns)} FROM {table.name} WHERE {token} > ? AND {token} <= ?"
+
+
+def scan_range(session, table_name, token_range, columns=None, fetch_size=DEFAULT_FETCH_SIZE):
+    """Yield every row of `table_name` whose partition token falls in `token_range`."""
+    table = active_table(table_name)
+    columns = columns or column_names(table)
+    statement = bind(session, scan_cql(table, columns), token_range, fetch_size)
+    # Iterating the result set fetches the following pages on demand
+    yield from session.execute(statement)
+
+
+def scan_batches(session, table_name, token_range, columns=None, fetch_size=DEFAULT_FETCH_SIZE):
+    """Yield the rows of a token range as one columnar.ColumnBatch per page."""
+    table = active_table(table_name)
+    columns = columns or column_names(table)
+    statement = bind(session, scan_cql(table, columns), token_range, fetch_size)
+    yield from session.execute(statement, execution_profile=COLUMNAR_PROFILE)
+
+
+def parallel_scan(table_name, consume, columns=None, splits=DEFAULT_SPLITS, workers=8,
+                  fetch_size=DEFAULT_FETCH_SIZE, session=None):
+    """
+    Scan a table with `workers` threads, calling `consume(rows)` once per token
+    range with an iterator over that range's rows. Returns the list of
+    `consume` results, one per range.
+    """
+    session = session or get_session()
+
+    def run(token_range):
+        return consume(scan_range(session, table_name, token_range, columns, fetch_size))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(run, token_ranges(splits)))
+
+
+def _aggregate_range(keyspace, table_name, token_range, columns, aggregators, fetch_size):
+    # Runs in a worker process, which opens its own cluster connection
+    session = get_session(keyspace)
+    for batch in scan_batches(session, table_name, token_range, columns, fetch_size):
+        for aggregator in aggregators:
+            aggregator.add_batch(batch)
+    return aggregators
+
+
+def process_scan(table_name, aggregators, columns=None, splits=None, processes=None,
+                 fetch_size=DEFAULT_FETCH_SIZE, keyspace='social_media'):
+    """
+    Scan a table across a pool of `processes` worker processes, one token
+    range per task, and return the merged result() of each aggregator.
+    """
+    processes = processes or os.cpu_count() or 1
+    # More ranges than workers keeps the pool busy when ranges are uneven
+    splits = splits or processes * 4
+    merged = [copy.deepcopy(aggregator) for aggregator in aggregators]
+    # spawn, not fork: the parent may hold driver threads and sockets
+    with ProcessPoolExecutor(max_workers=processes, mp_context=get_context("spawn")) as executor:
+        futures = [
+            executor.submit(_aggregate_range, keyspace, table_name, token_range, columns, aggregators, fetch_size)
+            for token_range in token_ranges(splits)
+        ]
+        for future in as_completed(futures):
+            for total, partial in zip(merged, future.result()):
+                total.merge(partial)
+    return [aggregator.result() for aggregator in merged]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate a whole Cassandra table over parallel token ranges.")
+    parser.add_argument("table")
+    parser.add_argument("--keyspace", default="social_media")
+    parser.add_argument("--count-by", action="append", default=[], metavar="COLUMN")
+    parser.add_argument("--top", nargs=2, action="append", default=[], metavar=("COLUMN", "K"))
+    parser.add_argument("--distinct", action="append", default=[], metavar="COLUMN")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="only rows at or after this time")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="only rows before this time")
+    parser.add_argument("--processes", type=int)
+    parser.add_argument("--splits", type=int)
+    args = parser.parse_args()
+
+    table = active_table(args.table)
+    time_column = table.clustering_key[0]
+    named = [("rows", agg.Count())]
+    named += [(f"count by {col}", agg.CountBy(col)) for col in args.count_by]
+    named += [(f"top {k} {col}", agg.TopK(col, int(k))) for col, k in args.top]
+    named += [(f"distinct {col}", agg.HyperLogLog(col)) for col in args.distinct]
+    if args.since or args.until:
+        named = [(name, agg.Between(time_column, a, args.since, args.until)) for name, a in named]
+
+    columns = {time_column, *args.count_by, *(col for col, _ in args.top), *args.distinct}
+    columns = [col for col in column_names(table) if col in columns]
+    results = process_scan(args.table, [a for _, a in named], columns, args.splits, args.processes,
+                           keyspace=args.keyspace)
+    for (name, _), result in zip(named, results):
+        print(f"{name}: {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+import os
+from collections import namedtuple
+from datetime import timedelta
+
+# Table definitions for the social_media keyspace. create_tables builds its
+# CQL from these, and the CSV seeding path uses the column types to convert
+# raw strings into values ready for prepared-statement binding.
+# `bucket_source` is set on day-bucketed tables and names the timestamp column
+# the `day_bucket` partition key column is derived from.
+Table = namedtuple(
+    "Table",
+    ["name", "columns", "partition_key", "clustering_key", "clustering_order", "bucket_source"],
+    defaults=(None, None),
+)
+
+# "legacy" keeps one partition per user; "bucketed" splits it per user and day
+LEGACY = "legacy"
+BUCKETED = "bucketed"
+SCHEMA_MODE = os.getenv("CASSANDRA_SCHEMA_MODE", LEGACY)
+BUCKET_COLUMN = "day_bucket"
+BUCKETED_SUFFIX = "_by_day"
+
+TABLES = {
+    "login_activity": Table(
+        "login_activity",
+        [
+            ("username", "TEXT"),
+            ("login_time", "TIMESTAMP"),
+            ("email", "TEXT"),
+            ("device", "TEXT"),
+            ("ip", "TEXT"),
+            ("location", "TEXT"),
+        ],
+        ("username",),
+        ("login_time",),
+    ),
+    "account_activity": Table(
+        "account_activity",
+        [
+            ("username", "TEXT"),
+            ("action_time", "TIMESTAMP"),
+            ("email", "TEXT"),
+            ("action_type", "TEXT"),
+            ("device", "TEXT"),
+        ],
+        ("username",),
+        ("action_time",),
+    ),
+    "profile_changes": Table(
+        "profile_changes",
+        [
+            ("username", "TEXT"),
+            ("change_time", "TIMESTAMP"),
+            ("profile_change", "TEXT"),
+            ("old_value", "TEXT"),
+            ("new_value", "TEXT"),
+            ("change_type", "TEXT"),
+            ("change_src", "TEXT"),
+        ],
+        ("username",),
+        ("change_time",),
+    ),
+    "post_activity": Table(
+        "post_activity",
+        [
+            ("username", "TEXT"),
+            ("post_time", "TIMESTAMP"),
+            ("email", "TEXT"),
+            ("post_id", "UUID"),
+            ("post_ip", "TEXT"),
+            ("device", "TEXT"),
+            ("post_location", "TEXT"),
+        ],
+        ("username",),
+        ("post_time",),
+    ),
+    "error_logs": Table(
+        "error_logs",
+        [
+            ("username", "TEXT"),
+            ("error_time", "TIMESTAMP"),
+            ("email", "TEXT"),
+            ("section", "TEXT"),
+            ("error_message", "TEXT"),
+            ("error_code", "INT"),
+        ],
+        ("username",),
+        ("error_time",),
+    ),
+    "search_activity": Table(
+        "search_activity",
+        [
+            ("username", "TEXT"),
+            ("search_timestamp", "TIMESTAMP"),
+            ("email", "TEXT"),
+            ("search_query", "TEXT"),
+            ("search_location", "TEXT"),
+            ("device", "TEXT"),
+            ("ip", "TEXT"),
+        ],
+        ("username",),
+        ("search_timestamp",),
+    ),
+    "friend_requests": Table(
+        "friend_requests",
+        [
+            ("sender_username", "TEXT"),
+            ("receiver_username", "TEXT"),
+            ("request_time", "TIMESTAMP"),
+            ("status", "TEXT"),
+            ("request_location", "TEXT"),
+        ],
+        ("sender_username",),
+        ("request_time",),
+    ),
+}
+
+
+# Denormalized copies of a table, maintained on every insert into it so that
+# other access paths stay single-partition reads. They carry the same columns
+# as the source table and are never day-bucketed.
+VIEWS = {
+    "friend_requests": [
+        # "requests sent to me", newest first
+        Table(
+            "friend_requests_by_receiver",
+            TABLES["friend_requests"].columns,
+            ("receiver_username",),
+            ("request_time", "sender_username"),
+            clustering_order={"request_time": "DESC", "sender_username": "ASC"},
+        ),
+        # "pending requests sent to me"; a status change moves the row between partitions
+        Table(
+            "friend_requests_by_receiver_status",
+            TABLES["friend_requests"].columns,
+            ("receiver_username", "status"),
+            ("request_time", "sender_username"),
+            clustering_order={"request_time": "DESC", "sender_username": "ASC"},
+        ),
+    ],
+}
+
+VIEW_TABLES = {view.name: view for views in VIEWS.values() for view in views}
+
+
+# Retention per logical table: default TTL in days (0 keeps rows forever) and,
+# for append-only time series, TimeWindowCompactionStrategy with windows of
+# `window_days` so expired data is dropped as whole SSTables. TWCS works best
+# with the bucketed schema, where a partition never spans many windows.
+# Override a TTL with CASSANDRA_TTL_<TABLE>_DAYS, e.g. CASSANDRA_TTL_ERROR_LOGS_DAYS=30.
+Retention = namedtuple("Retention", ["ttl_days", "window_days"])
+
+
+def _retention(table_name, ttl_days, window_days=1):
+    ttl_days = int(os.getenv(f"CASSANDRA_TTL_{table_name.upper()}_DAYS", str(ttl_days)))
+    return Retention(ttl_days, window_days)
+
+
+RETENTION = {
+    "login_activity": _retention("login_activity", 180),
+    "error_logs": _retention("error_logs", 90),
+    "search_activity": _retention("search_activity", 90),
+}
+
+
+def logical_name(table_name):
+    """'login_activity_by_day' -> 'login_activity'."""
+    if table_name.endswith(BUCKETED_SUFFIX) and table_name[:-len(BUCKETED_SUFFIX)] in TABLES:
+        return table_name[:-len(BUCKETED_SUFFIX)]
+    return table_name
+
+
+def retention_options(table):
+    """Table options implementing the retention of `table`, as {option: CQL literal}."""
+    retention = RETENTION.get(logical_name(table.name))
+    if retention is None:
+        return {}
+    return {
+        "default_time_to_live": str(retention.ttl_days * 24 * 3600),
+        "compaction": (
+            "{'class': 'TimeWindowCompactionStrategy', "
+            "'compaction_window_unit': 'DAYS', "
+            f"'compaction_window_size': '{retention.window_days}'}}"
+        ),
+    }
+
+
+def alter_retention_cql(table):
+    options = retention_options(table)
+    if not options:
+        return None
+    return "ALTER TABLE {} WITH {};".format(
+        table.name, " AND ".join(f"{name} = {value}" for name, value in options.items())
+    )
+
+
+def bucketed_table(table):
+    """
+    Derive the day-bucketed variant of a table: PRIMARY KEY ((<key>, day_bucket), <time>)
+    with the newest rows first in each partition.
+    """
+    time_column = table.clustering_key[0]
+    return Table(
+        table.name + BUCKETED_SUFFIX,
+        table.columns + [(BUCKET_COLUMN, "DATE")],
+        table.partition_key + (BUCKET_COLUMN,),
+        table.clustering_key,
+        clustering_order={time_column: "DESC"},
+        bucket_source=time_column,
+    )
+
+
+BUCKETED_TABLES = {name: bucketed_table(table) for name, table in TABLES.items()}
+
+
+def tables_for_mode(mode=None):
+    mode = mode or SCHEMA_MODE
+    if mode == LEGACY:
+        return TABLES
+    if mode == BUCKETED:
+        return BUCKETED_TABLES
+    raise ValueError(f"Unknown schema mode: {mode}")
+
+
+def active_table(name, mode=None):
+    """Resolve a logical table name (e.g. 'login_activity') to the table used in `mode`."""
+    if name in VIEW_TABLES:
+        return VIEW_TABLES[name]
+    return tables_for_mode(mode)[name]
+
+
+def all_tables(mode=None):
+    """Every table created in `mode`: the active tables and their views."""
+    return list(tables_for_mode(mode).values()) + list(VIEW_TABLES.values())
+
+
+def write_targets(name, mode=None):
+    """Tables an insert into logical table `name` is written to."""
+    return [active_table(name, mode)] + VIEWS.get(name, [])
+
+
+def day_bucket(timestamp):
+    return timestamp.date()
+
+
+def buckets_newest_first(start, end):
+    """Yield day buckets from `end` back to `start`, both inclusive."""
+    day, first = day_bucket(end), day_bucket(start)
+    while day >= first:
+        yield day
+        day -= timedelta(days=1)
+
+
+def row_columns(table, columns):
+    """Columns actually written for `table`, including day_bucket on bucketed tables."""
+    return list(columns) + [BUCKET_COLUMN] if table.bucket_source else list(columns)
+
+
+def bucket_values(table, columns, values):
+    """Append the day_bucket value derived from the row's timestamp on bucketed tables."""
+    if not table.bucket_source:
+        return tuple(values)
+    timestamp = values[list(columns).index(table.bucket_source)]
+    return tuple(values) + (day_bucket(timestamp),)
+
+
+def column_names(table):
+    return [name for name, _ in table.columns]
+
+
+def column_types(table):
+    return dict(table.columns)
+
+
+def create_table_cql(table):
+    columns = ",\n".join(f"    {name} {cql_type}" for name, cql_type in table.columns)
+    primary_key = "({})".format(", ".join(table.partition_key))
+    if table.clustering_key:
+        primary_key += ", " + ", ".join(table.clustering_key)
+    options = [f"{name} = {value}" for name, value in retention_options(table).items()]
+    if table.clustering_order:
+        order = ", ".join(f"{col} {direction}" for col, direction in table.clustering_order.items())
+        options.insert(0, f"CLUSTERING ORDER BY ({order})")
+    options = " WITH " + " AND ".join(options) if options else ""
+    return (
+        f"CREATE TABLE IF NOT EXISTS {table.name} (\n"
+        f"{columns},\n"
+        f"    PRIMARY KEY ({primary_key})\n"
+        f"){options};"
+    )
+
+
+def insert_cql(table, columns=None):
+    columns = columns or column_names(table)
+    placeholders = ", ".join(["?"] * len(columns))
+    return f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({placeholders})"
@@ -0,0 +1,34 @@
+"""
+Tokenization of search_activity queries.
+
+tokenize() feeds the per-day term counts and completion_keys() the per-day
+query counts that the autocomplete table is built from (see rollups.ROLLUPS
+and autocomplete.py).
+"""
+import re
+
+TERM_PATTERN = re.compile(r"\w+", re.UNICODE)
+MIN_TERM_LENGTH = 2
+MAX_QUERY_LENGTH = 100
+
+STOPWORDS = frozenset({
+    "a", "an", "and", "the", "of", "to", "in", "on", "for", "with", "is", "at", "by", "or",
+    "de", "la", "el", "en", "y", "los", "las", "un", "una", "del",
+})
+
+
+def normalize_query(query):
+    """Lowercase, collapse whitespace and cap the length of a raw query."""
+    return " ".join(str(query or "").lower().split())[:MAX_QUERY_LENGTH]
+
+
+def tokenize(query):
+    return [
+        term for term in TERM_PATTERN.findall(normalize_query(query))
+        if len(term) >= MIN_TERM_LENGTH and term not in STOPWORDS
+    ]
+
+
+def completion_keys(query):
+    normalized = normalize_query(query)
+    return [normalized] if normalized else []
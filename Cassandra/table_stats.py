@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Report partition sizes and tombstone counts for the keyspace's tables.
+
+Partition counts and mean sizes come from system.size_estimates (per node,
+refreshed every few minutes). Maximum partition size, tombstones scanned per
+read and disk usage come from the system_views virtual tables, available on
+Cassandra 4.0+; on older servers those columns are left empty.
+
+    python -m Cassandra.table_stats --keyspace social_media
+"""
+import argparse
+
+from cassandra import InvalidRequest
+
+from .connection import get_session
+from .rollups import ROLLUP_TABLE
+from .schema import all_tables
+
+VIRTUAL_TABLES = {
+    "max_partition_size": "system_views.max_partition_size",
+    "tombstones_per_read": "system_views.tombstones_per_read",
+    "disk_usage": "system_views.disk_usage",
+}
+
+
+def size_estimates(session, keyspace, table_name):
+    rows = session.execute(
+        "SELECT partitions_count, mean_partition_size FROM system.size_estimates "
+        "WHERE keyspace_name = %s AND table_name = %s;",
+        (keyspace, table_name),
+    )
+    partitions, total_bytes = 0, 0
+    for row in rows:
+        partitions += row.partitions_count
+        total_bytes += row.partitions_count * row.mean_partition_size
+    return {
+        "partitions": partitions,
+        "mean_partition_bytes": total_bytes // partitions if partitions else 0,
+    }
+
+
+def virtual_table_stats(session, keyspace, table_name):
+    stats = {}
+    for name, virtual_table in VIRTUAL_TABLES.items():
+        try:
+            row = session.execute(
+                f"SELECT * FROM {virtual_table} WHERE keyspace_name = %s AND table_name = %s;",
+                (keyspace, table_name),
+            ).one()
+        except InvalidRequest:
+            # Virtual table missing on this server version
+            row = None
+        if row is None:
+            continue
+        for column, value in row._asdict().items():
+            if column not in ("keyspace_name", "table_name"):
+                stats[f"{name}.{column}"] = value
+    return stats
+
+
+def table_stats(session, keyspace, table_names):
+    return {
+        table_name: {**size_estimates(session, keyspace, table_name),
+                     **virtual_table_stats(session, keyspace, table_name)}
+        for table_name in table_names
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report Cassandra partition sizes and tombstones per table.")
+    parser.add_argument("--keyspace", default="social_media")
+    parser.add_argument("--mode", choices=["legacy", "bucketed"], help="schema mode (default: CASSANDRA_SCHEMA_MODE)")
+    args = parser.parse_args()
+
+    session = get_session(args.keyspace)
+    table_names = [table.name for table in all_tables(args.mode)] + [ROLLUP_TABLE]
+    for table_name, stats in table_stats(session, args.keyspace, table_names).items():
+        print(table_name)
+        for key, value in stats.items():
+            print(f"    {key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
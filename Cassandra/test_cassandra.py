@@ -0,0 +1,563 @@
+"""
+Unit tests for the Cassandra helpers. None of them needs a running cluster
+(or Mongo): sessions are replaced by fakes where a helper executes statements.
+
+    python -m pytest Cassandra
+"""
+import datetime
+import gzip
+import io
+import os
+import sys
+import uuid
+from collections import Counter, namedtuple
+
+import pandas as pd
+import pytest
+from cassandra.query import UNSET_VALUE
+from cassandra.util import Date
+
+# The package is imported by name, as app.py does, whichever directory pytest runs from
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Cassandra import aggregators as agg
+from Cassandra import friend_requests, queries, rollups, schema
+from Cassandra.columnar import ColumnBatch, between
+from Cassandra.convert import convert_frame, iter_csv_rows, row_converter
+from Cassandra.export import CsvPartWriter, ParquetPartWriter
+from Cassandra.ingest import InvalidEvent, partition_rows, validate_event
+from Cassandra.login_anomalies import IMPOSSIBLE_TRAVEL, NEW_DEVICE, LoginAnomalyDetector, LoginProfile
+from Cassandra.schema import BUCKETED, BUCKETED_TABLES, TABLES, buckets_newest_first, column_names
+
+
+# Fake sessions: prepared statements bind to (query, values), execute() is
+# answered by `respond` and every executed statement is kept
+
+class FakeBound:
+    def __init__(self, query, values):
+        self.query = query
+        self.values = tuple(values)
+        self.fetch_size = None
+
+
+class FakePrepared:
+    def __init__(self, query):
+        self.query = query
+
+    def bind(self, values):
+        return FakeBound(self.query, values)
+
+
+class FakeResult:
+    def __init__(self, rows=(), paging_state=None):
+        self.current_rows = list(rows)
+        self.paging_state = paging_state
+
+    def __iter__(self):
+        return iter(self.current_rows)
+
+    def one(self):
+        return self.current_rows[0] if self.current_rows else None
+
+
+class FakeSession:
+    def __init__(self, respond=None):
+        self.respond = respond or (lambda statement, paging_state: FakeResult())
+        self.executed = []
+
+    def prepare(self, query):
+        return FakePrepared(query)
+
+    def execute(self, statement, paging_state=None):
+        self.executed.append(statement)
+        return self.respond(statement, paging_state)
+
+
+
+# convert
+
+POST_ID = uuid.UUID("6f1c1f5e-0d4f-4b5e-9a35-0c2f0b6f1a11")
+
+
+def test_convert_frame_matches_the_scalar_parsers():
+    table = TABLES["post_activity"]
+    columns = ["username", "post_time", "post_id", "device"]
+    raw = [
+        {"username": "user1", "post_time": "2024-11-25T08:30:00Z", "post_id": str(POST_ID), "device": "Mobile"},
+        {"username": "user2", "post_time": "2024-11-25T10:30:00+01:00", "post_id": "", "device": ""},
+    ]
+
+    rows = convert_frame(table, pd.DataFrame(raw, dtype=str), columns)
+
+    assert rows == [row_converter(table, columns)(row) for row in raw]
+    assert rows[0] == ("user1", datetime.datetime(2024, 11, 25, 8, 30), POST_ID, "Mobile")
+    # Aware timestamps become naive UTC
+    assert rows[1][1] == datetime.datetime(2024, 11, 25, 9, 30)
+    assert rows[1][2] is None
+
+
+def test_iter_csv_rows_reads_the_requested_columns_across_chunks():
+    csv_file = io.StringIO(
+        "username,error_time,email,section,error_message,error_code\n"
+        "user1,2024-11-25T08:30:00,a@b.c,feed,Timeout,504\n"
+        "user2,2024-11-25T09:00:00,,profile,Not found,\n"
+        "user3,,,feed,NA,404\n"
+    )
+    columns = ["error_code", "username", "error_time", "error_message"]
+
+    rows = list(iter_csv_rows(TABLES["error_logs"], csv_file, columns, chunksize=2))
+
+    assert rows == [
+        (504, "user1", datetime.datetime(2024, 11, 25, 8, 30), "Timeout"),
+        (None, "user2", datetime.datetime(2024, 11, 25, 9, 0), "Not found"),
+        # "NA" is text, not a missing value
+        (404, "user3", None, "NA"),
+    ]
+    assert all(type(row[0]) is int for row in rows if row[0] is not None)
+
+
+
+@pytest.fixture
+def bucketed(monkeypatch):
+    monkeypatch.setattr(schema, "SCHEMA_MODE", BUCKETED)
+
+
+# ingest
+
+def test_validate_event_fills_defaults():
+    table_name, values = validate_event({"type": "login", "username": "user1", "device": "Mobile"})
+
+    assert table_name == "login_activity"
+    username, login_time, email, device = values[:4]
+    assert (username, email, device) == ("user1", None, "Mobile")
+    assert isinstance(login_time, datetime.datetime)
+
+
+@pytest.mark.parametrize("event_type", [["login"], {"login": 1}, None, 3])
+def test_validate_event_rejects_non_string_types(event_type):
+    with pytest.raises(InvalidEvent):
+        validate_event({"type": event_type, "username": "user1"})
+
+
+@pytest.mark.parametrize("missing", ["receiver_username", "status"])
+def test_validate_event_requires_the_key_columns_of_every_write_target(missing):
+    event = {"type": "friend_request", "sender_username": "user1", "receiver_username": "user2", "status": "Pending"}
+    del event[missing]
+
+    # friend_requests itself is keyed by sender only; its views need the receiver and status
+    with pytest.raises(InvalidEvent, match=missing):
+        validate_event(event)
+
+
+def test_partition_rows_groups_by_partition_and_leaves_missing_values_unset():
+    rows = [
+        (0, *validate_event({"type": "login", "username": "user1"})),
+        (1, *validate_event({"type": "login", "username": "user1", "device": "Mobile"})),
+        (2, *validate_event({"type": "login", "username": "user2"})),
+    ]
+    partitions = list(partition_rows(rows))
+
+    assert len(partitions) == 2
+    table, columns, members = partitions[0]
+    assert [index for index, _ in members] == [0, 1]
+    assert dict(zip(columns, members[0][1]))["device"] is UNSET_VALUE
+    assert dict(zip(columns, members[1][1]))["device"] == "Mobile"
+
+
+
+
+# day buckets
+
+def test_buckets_newest_first_cover_both_ends_across_a_month():
+    buckets = list(buckets_newest_first(datetime.datetime(2024, 11, 29, 23, 59), datetime.datetime(2024, 12, 2, 0, 1)))
+
+    assert buckets == [datetime.date(2024, 12, d) for d in (2, 1)] + [datetime.date(2024, 11, d) for d in (30, 29)]
+
+
+def test_buckets_newest_first_of_one_day_and_of_an_empty_window():
+    day = datetime.datetime(2024, 11, 25)
+
+    assert list(buckets_newest_first(day, day.replace(hour=23))) == [day.date()]
+    assert list(buckets_newest_first(day, day - datetime.timedelta(days=1))) == []
+
+
+def test_bucketed_read_needs_a_start(bucketed):
+    session = FakeSession()
+
+    # No default lookback: it would silently drop older rows
+    with pytest.raises(ValueError, match="needs a start time"):
+        queries.fetch_page(session, "login_activity", "user1")
+    assert session.executed == []
+
+
+def test_legacy_read_needs_no_start():
+    session = FakeSession(lambda statement, paging_state: FakeResult([("user1",)]))
+
+    page = queries.fetch_page(session, "login_activity", "user1", ["username"])
+
+    assert page == queries.Page([("user1",)], None)
+    assert session.executed[0].values == ("user1",)
+
+
+
+# paging
+
+def test_paging_token_round_trip():
+    start, end = datetime.datetime(2024, 11, 1), datetime.datetime(2024, 11, 25, 8, 30)
+    token = queries.encode_token(datetime.date(2024, 11, 20), b"\x00\x01state", start, end)
+
+    assert queries.decode_token(token) == (datetime.date(2024, 11, 20), b"\x00\x01state", start, end)
+    assert queries.decode_token(queries.encode_token()) == (None, None, None, None)
+
+
+@pytest.mark.parametrize("token", ["not-a-token", queries.encode_token()[:-4], "e30="])
+def test_decode_token_rejects_garbage(token):
+    with pytest.raises(ValueError, match="Invalid paging_state token"):
+        queries.decode_token(token)
+
+
+def paged_days(rows_by_day):
+    """A session answering bucketed reads from `rows_by_day`, with the row offset as paging state."""
+    def respond(statement, paging_state):
+        rows = rows_by_day.get(statement.values[1], [])
+        offset = int(paging_state or b"0")
+        stop = offset + statement.fetch_size
+        return FakeResult(rows[offset:stop], str(stop).encode() if stop < len(rows) else None)
+    return FakeSession(respond)
+
+
+def test_bucketed_fetch_page_walks_the_days_with_its_token(bucketed):
+    days = [datetime.date(2024, 11, d) for d in (25, 24, 23)]
+    session = paged_days({days[0]: ["a", "b"], days[2]: ["c", "d", "e"]})
+    start, end = datetime.datetime(2024, 11, 23), datetime.datetime(2024, 11, 25, 12)
+
+    first = queries.fetch_page(session, "login_activity", "user1", start=start, end=end, fetch_size=2)
+    # Resuming needs no window: it is in the token
+    second = queries.fetch_page(session, "login_activity", "user1", fetch_size=2, paging_state=first.paging_state)
+    third = queries.fetch_page(session, "login_activity", "user1", fetch_size=2, paging_state=second.paging_state)
+
+    assert (first.rows, second.rows, third.rows) == (["a", "b"], ["c", "d"], ["e"])
+    assert queries.decode_token(first.paging_state) == (days[1], None, start, end)
+    assert queries.decode_token(second.paging_state) == (days[2], b"2", start, end)
+    assert third.paging_state is None
+    assert [statement.values[1] for statement in session.executed] == [days[0], days[1], days[2], days[2]]
+    assert all(statement.values[2:] == (start, end) for statement in session.executed)
+
+
+# friend requests
+
+StoredRequest = namedtuple("StoredRequest", ["status", "request_location"])
+
+
+class FakeBatch(list):
+    add = list.append
+
+
+def test_update_status_moves_the_request_between_status_partitions(monkeypatch):
+    monkeypatch.setattr(friend_requests, "BatchStatement", FakeBatch)
+    session = FakeSession(lambda statement, paging_state: FakeResult([StoredRequest("Pending", "USA")]))
+    sent = datetime.datetime(2024, 11, 25, 8, 30)
+
+    assert friend_requests.update_status(session, "user1", "user2", sent, "Accepted")
+
+    select, batch = session.executed
+    assert select.values == ("user2", sent, "user1")
+    statements = [(statement.query.split()[0], statement.values) for statement in batch]
+    assert statements == [
+        ("UPDATE", ("Accepted", "user1", sent)),
+        ("UPDATE", ("Accepted", "user2", sent, "user1")),
+        ("DELETE", ("user2", "Pending", sent, "user1")),
+        ("INSERT", ("user1", "user2", sent, "Accepted", "USA")),
+    ]
+
+
+def test_update_status_of_a_missing_request_writes_nothing():
+    session = FakeSession()
+
+    assert not friend_requests.update_status(session, "user1", "user2", datetime.datetime(2024, 11, 25), "Accepted")
+    assert len(session.executed) == 1
+
+
+def test_update_status_to_the_current_status_writes_nothing():
+    # A DELETE and INSERT of the same row in one batch would leave only the tombstone
+    session = FakeSession(lambda statement, paging_state: FakeResult([StoredRequest("Pending", "USA")]))
+
+    assert friend_requests.update_status(session, "user1", "user2", datetime.datetime(2024, 11, 25), "Pending")
+    assert len(session.executed) == 1
+
+
+
+
+# login anomalies
+
+LAST_LOGIN = datetime.datetime(2024, 11, 25, 8)
+
+
+def known_profile(location="USA"):
+    profile = LoginProfile(devices=["Mobile"])
+    profile.record(LAST_LOGIN, "Mobile", "10.0.0.1", location)
+    return profile
+
+
+def test_check_ignores_users_without_history():
+    anomalies = LoginAnomalyDetector().check(LoginProfile(), LAST_LOGIN, "Tablet", "Japan")
+
+    assert anomalies == []
+
+
+@pytest.mark.parametrize("device, location, hours, expected", [
+    ("Mobile", "USA", 1, []),
+    ("Tablet", "USA", 1, [NEW_DEVICE]),
+    (None, "Japan", 2, [IMPOSSIBLE_TRAVEL]),
+    ("Tablet", "Japan", 2, [NEW_DEVICE, IMPOSSIBLE_TRAVEL]),
+    # About 10,000 km takes a flight of more than 11 hours at 900 km/h
+    ("Mobile", "Japan", 14, []),
+    ("Mobile", "Canada", 24, []),
+    # Unknown locations skip the travel check
+    ("Mobile", "Atlantis", 0.1, []),
+    ("Mobile", "35.7,139.7", 2, [IMPOSSIBLE_TRAVEL]),
+])
+def test_check_flags_new_devices_and_impossible_travel(device, location, hours, expected):
+    login_time = LAST_LOGIN + datetime.timedelta(hours=hours)
+
+    anomalies = LoginAnomalyDetector().check(known_profile(), login_time, device, location)
+
+    assert [anomaly for anomaly, _ in anomalies] == expected
+
+
+def test_check_handles_logins_at_the_same_instant():
+    # Two logins at the same instant must not divide by zero
+    anomalies = LoginAnomalyDetector().check(known_profile("Germany"), LAST_LOGIN, "Mobile", "France")
+
+    assert anomalies == [(IMPOSSIBLE_TRAVEL, "Germany -> France: 818 km in 0.00 h")]
+
+
+# rollups
+
+def test_count_rows_counts_totals_and_dimensions_per_day():
+    nov_24, nov_25 = datetime.date(2024, 11, 24), datetime.date(2024, 11, 25)
+    rows = [
+        ("user1", datetime.datetime(2024, 11, 25, 8), None, "feed", "Timeout", 504),
+        ("user2", datetime.datetime(2024, 11, 25, 9), None, None, "Timeout", 504),
+        ("user3", datetime.datetime(2024, 11, 24, 23), None, "feed", "Unknown", None),
+        ("user4", None, None, "feed", "Unknown", 500),
+    ]
+
+    counts = rollups.count_rows("error_logs", rows)
+
+    # A missing dimension counts towards the total only, never as "None"
+    assert counts == Counter({
+        ("errors", nov_25, "total", "all"): 2,
+        ("errors", nov_25, "error_code", "504"): 2,
+        ("errors", nov_25, "section", "feed"): 1,
+        ("errors", nov_25, "section_error_code", "feed:504"): 1,
+        ("errors", nov_24, "total", "all"): 1,
+        ("errors", nov_24, "section", "feed"): 1,
+    })
+
+
+def test_count_rows_counts_each_search_term_once_per_row_in_its_shard():
+    columns = rollups.rollup_columns("search_activity")
+    day = datetime.date(2024, 11, 25)
+    row = {"search_timestamp": datetime.datetime(2024, 11, 25, 8), "search_query": "Mongo mongo indexes"}
+
+    counts = rollups.count_rows("search_activity", [tuple(row[col] for col in columns)], columns)
+
+    assert counts[("searches", day, "term", "mongo")] == 1
+    [(metric, _, _, query)] = [key for key in counts if key[2] == "query"]
+    assert metric == rollups.stored_metric(rollups.ROLLUPS["search_activity"][2], query)
+    assert metric.startswith("searches#")
+
+
+def fake_recompute(monkeypatch, expected, current):
+    """Stub the scan and the counters around recompute; returns the increments it applies."""
+    applied = Counter()
+    monkeypatch.setattr(rollups, "scan_counts", lambda *args, **kwargs: Counter(expected))
+    monkeypatch.setattr(rollups, "read_partition", lambda session, metric, day: current.get((metric, day), {}))
+    monkeypatch.setattr(rollups, "apply_increments", lambda session, deltas: applied.update(deltas) or [])
+    return applied
+
+
+def test_recompute_corrects_the_counters_of_closed_days(monkeypatch):
+    day = datetime.date(2024, 11, 24)
+    today = datetime.datetime.utcnow().date()
+    applied = fake_recompute(
+        monkeypatch,
+        expected={("errors", day, "total", "all"): 2, ("errors", day, "section", "feed"): 2,
+                  ("errors", today, "total", "all"): 5},
+        current={("errors", day): {"total": {"all": 3}, "error_code": {"500": 1}, "section": {"feed": 2}}},
+    )
+
+    rollups.recompute("error_logs", session=FakeSession())
+
+    # Today is still being ingested: not corrected
+    assert {key: delta for key, delta in applied.items() if delta} == {
+        ("errors", day, "total", "all"): -1,
+        ("errors", day, "error_code", "500"): -1,
+    }
+
+
+def test_recompute_rejects_open_days(monkeypatch):
+    applied = fake_recompute(monkeypatch, expected={}, current={})
+    today = datetime.datetime.utcnow().date()
+
+    with pytest.raises(ValueError, match="Only closed days"):
+        rollups.recompute("error_logs", days={today - datetime.timedelta(days=1), today}, session=FakeSession())
+    assert not applied
+
+
+# columnar
+
+def test_column_batch_types_timestamp_and_int_columns():
+    columns = ["username", "error_time", "error_code"]
+    page = ColumnBatch.from_rows(columns, [
+        ("user1", datetime.datetime(2024, 11, 25, 8, 30), 500),
+        ("user2", None, 404),
+    ])
+    with_null = ColumnBatch.from_rows(columns, [("user3", datetime.datetime(2024, 11, 26), None)])
+
+    assert page["error_time"].dtype == "datetime64[ms]"
+    assert page["error_code"].dtype == "int64"
+    assert page["username"].dtype == object
+    assert list(ColumnBatch.concat([page, with_null]).tuples()) == [
+        ("user1", datetime.datetime(2024, 11, 25, 8, 30), 500),
+        ("user2", None, 404),
+        ("user3", datetime.datetime(2024, 11, 26), None),
+    ]
+
+
+
+@pytest.mark.filterwarnings("error")
+def test_between_normalizes_aware_bounds_to_utc():
+    times = ColumnBatch.from_rows(["error_time"], [
+        (datetime.datetime(2024, 11, 25, 7, 0),),
+        (datetime.datetime(2024, 11, 25, 9, 0),),
+        (None,),
+    ])["error_time"]
+    cet = datetime.timezone(datetime.timedelta(hours=1))
+
+    # 09:00+01:00 is 08:00 UTC
+    mask = between(times, start=datetime.datetime(2024, 11, 25, 9, 0, tzinfo=cet), end="2024-11-25T10:00:00Z")
+
+    assert mask.tolist() == [False, True, False]
+
+
+
+# aggregators
+
+def error_page(count, offset=0):
+    start = datetime.datetime(2024, 11, 25)
+    return ColumnBatch.from_rows(["username", "error_time", "error_code"], [
+        (f"user{(offset + i) % 7}" if i % 5 else None, start + datetime.timedelta(hours=offset + i), 500 + i % 3)
+        for i in range(count)
+    ])
+
+
+@pytest.mark.parametrize("make", [
+    agg.Count,
+    lambda: agg.CountBy("username"),
+    lambda: agg.TopK("error_code", k=2),
+    lambda: agg.HyperLogLog("username", precision=12),
+    lambda: agg.Between("error_time", agg.CountBy("error_code"),
+                        datetime.datetime(2024, 11, 25, 3), datetime.datetime(2024, 11, 25, 20)),
+])
+def test_aggregators_agree_row_by_row_batched_and_merged(make):
+    pages = [error_page(30), error_page(20, offset=30)]
+    by_row, batched, merged = make(), make(), make()
+    for page in pages:
+        for row in page.rows():
+            by_row.add(row)
+        batched.add_batch(page)
+    for page in pages:
+        partial = make()
+        partial.add_batch(page)
+        merged.merge(partial)
+
+    assert by_row.result() == batched.result() == merged.result()
+
+
+def test_aggregator_results():
+    page = error_page(10)
+    counts, top, window = agg.CountBy("error_code"), agg.TopK("error_code", k=1), agg.Between(
+        "error_time", agg.Count(), datetime.datetime(2024, 11, 25, 2), datetime.datetime(2024, 11, 25, 5))
+    for aggregator in (counts, top, window):
+        aggregator.add_batch(page)
+
+    assert counts.result() == {500: 4, 501: 3, 502: 3}
+    assert top.result() == [(500, 4)]
+    # end is exclusive
+    assert window.result() == 3
+
+
+@pytest.mark.parametrize("precision", [8, 14])
+def test_hyperloglog_batches_set_the_same_registers_as_single_values(precision):
+    values = [f"user{i}" for i in range(5000)] + [None]
+    by_value, batched = agg.HyperLogLog("username", precision), agg.HyperLogLog("username", precision)
+    for value in values[:-1]:
+        by_value.add_value(value)
+    batched.add_batch(ColumnBatch.from_rows(["username"], [(value,) for value in values]))
+
+    assert batched.registers == by_value.registers
+
+
+def test_hyperloglog_estimates_distinct_values():
+    small, large = agg.HyperLogLog("username"), agg.HyperLogLog("username")
+    for i in range(100):
+        small.add_value(f"user{i % 10}")
+    halves = [agg.HyperLogLog("username"), agg.HyperLogLog("username")]
+    for i in range(50_000):
+        halves[i % 2].add_value(f"user{i}")
+        if i % 10 == 0:
+            # Overlapping halves: the merge must not count a value twice
+            halves[(i + 1) % 2].add_value(f"user{i}")
+    large.merge(halves[0])
+    large.merge(halves[1])
+
+    # Linear counting is exact at this size
+    assert small.result() == 10
+    # Standard error is 0.8% at precision 14
+    assert abs(large.result() - 50_000) < 50_000 * 0.03
+
+
+# export
+
+def bucketed_error_batch():
+    table = BUCKETED_TABLES["error_logs"]
+    columns = column_names(table)
+    rows = [
+        ("user1", datetime.datetime(2024, 11, 25, 8, 30), None, "feed", "Timeout", 504,
+         Date(datetime.date(2024, 11, 25))),
+        ("user1", datetime.datetime(2024, 11, 24, 23, 0), "a@b.c", "feed", "Not found", 404,
+         Date(datetime.date(2024, 11, 24))),
+    ]
+    return table, columns, ColumnBatch.from_rows(columns, rows)
+
+
+def test_parquet_writer_exports_bucketed_date_column(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    table, columns, batch = bucketed_error_batch()
+    path = str(tmp_path / "part.parquet")
+
+    writer = ParquetPartWriter(path, table, columns)
+    writer.write(batch)
+    writer.close()
+
+    exported = pq.read_table(path).to_pylist()
+    assert [row["day_bucket"] for row in exported] == [datetime.date(2024, 11, 25), datetime.date(2024, 11, 24)]
+    assert exported[0]["error_time"] == datetime.datetime(2024, 11, 25, 8, 30)
+    assert exported[0]["email"] is None
+    assert exported[1]["error_code"] == 404
+
+
+def test_csv_writer_exports_bucketed_date_column(tmp_path):
+    table, columns, batch = bucketed_error_batch()
+    path = str(tmp_path / "part.csv.gz")
+
+    writer = CsvPartWriter(path, table, columns)
+    writer.write(batch)
+    writer.close()
+
+    with gzip.open(path, "rt") as file:
+        lines = file.read().splitlines()
+    assert lines[0] == ",".join(columns)
+    assert lines[1].endswith(",504,2024-11-25")